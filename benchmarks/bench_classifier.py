@@ -0,0 +1,55 @@
+"""
+Benchmark for the body type classifier on CPU.
+
+Runs the configured backend (or the ONNX model given with --model) over
+synthetic photos at several batch sizes and reports per-batch latency
+(p50/p95) and throughput in images per second, including preprocessing.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_classifier [--model models/body_type.onnx] [--batch-sizes 1 4 16 32]
+"""
+import argparse
+import statistics
+import time
+from PIL import Image
+from src.config import get_config
+from src.image_classifier import OnnxBackend, get_classifier_backend
+
+def synthetic_images(count: int, size: tuple[int, int]) -> list[Image.Image]:
+    """Phone-camera sized RGB images with varying content."""
+    return [Image.new("RGB", size, ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256)) for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="ONNX model to benchmark (default: configured backend)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--rounds", type=int, default=20, help="timed batches per batch size")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[1600, 1200], metavar=("W", "H"))
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0 = all cores)")
+    args = parser.parse_args()
+
+    classifier_config = get_config().classifier
+    if args.model:
+        backend = OnnxBackend(args.model, classifier_config.labels, input_size=classifier_config.input_size,
+                              batch_size=max(args.batch_sizes), preprocess_workers=classifier_config.preprocess_workers,
+                              intra_op_threads=args.threads)
+    else:
+        backend = get_classifier_backend()
+    backend.warmup()
+    print(f"backend: {type(backend).__name__}, image size: {args.image_size[0]}x{args.image_size[1]}")
+
+    for batch_size in args.batch_sizes:
+        images = synthetic_images(batch_size, tuple(args.image_size))
+        latencies = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            backend.predict(images)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        throughput = batch_size * len(latencies) / sum(latencies)
+        print(f"batch {batch_size:>3}: p50 {p50 * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms  {throughput:8.1f} images/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark for the photo optimization stage.
+
+For each photo, reports the original and optimized attachment size, the
+bytes saved, and the time spent decoding, resizing and re-encoding. Without
+--images, synthetic 12 MP camera-like photos (JPEG with EXIF, PNG) are used.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_images [--images a.jpg b.png] [--format jpeg] [--quality 82] [--repeat 3]
+"""
+import argparse
+import io
+import time
+from pathlib import Path
+from PIL import Image, ImageFilter
+from src.config import get_config
+from src.image_payload import optimize_photo
+
+def synthetic_photos(size: tuple[int, int] = (4000, 3000)) -> dict[str, bytes]:
+    """Smooth gradients plus sensor-like noise, which compress roughly like real photos."""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 24).filter(ImageFilter.GaussianBlur(1))
+    photo = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"
+    exif[0x0112] = 1
+    photos = {}
+    for name, save_format, params in (("camera.jpg", "JPEG", {"quality": 95, "exif": exif}), ("screenshot.png", "PNG", {})):
+        buffer = io.BytesIO()
+        photo.save(buffer, format=save_format, **params)
+        photos[name] = buffer.getvalue()
+    return photos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="+", help="photos to optimize (default: synthetic 12 MP photos)")
+    parser.add_argument("--format", help="output format override: jpeg, webp or keep")
+    parser.add_argument("--quality", type=int, help="quality override")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per photo; the fastest is reported")
+    args = parser.parse_args()
+
+    optimization = get_config().image_optimization
+    overrides = {key: value for key, value in (("format", args.format), ("quality", args.quality)) if value is not None}
+    optimization = optimization.model_copy(update={"enabled": True, **overrides})
+
+    if args.images:
+        photos = {Path(path).name: Path(path).read_bytes() for path in args.images}
+    else:
+        photos = synthetic_photos()
+
+    print(f"max {optimization.max_width}x{optimization.max_height}, format {optimization.format}, quality {optimization.quality}")
+    total_before = total_after = 0
+    for name, data in photos.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            optimized, optimized_name = optimize_photo(data, name, optimization)
+            timings.append(time.perf_counter() - start)
+        total_before += len(data)
+        total_after += len(optimized)
+        saved = 1 - len(optimized) / len(data)
+        print(f"{name:>20} -> {optimized_name:<20} {len(data) / 1024:9.0f} KiB -> {len(optimized) / 1024:7.0f} KiB "
+              f"({saved:6.1%} saved)  {min(timings) * 1000:7.1f} ms")
+    print(f"{'total':>20}    {'':<20} {total_before / 1024:9.0f} KiB -> {total_after / 1024:7.0f} KiB "
+          f"({1 - total_after / total_before:6.1%} saved)")
+
+if __name__ == "__main__":
+    main()
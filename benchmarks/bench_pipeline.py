@@ -0,0 +1,197 @@
+"""
+End-to-end benchmark of the web request pipeline (process_and_send).
+
+Starts a fake Azure OpenAI server with a configurable latency and a local
+SMTP sink. The app is pointed at both through a generated config file, and
+the full pipeline runs at several concurrency levels: sanitize, streamed
+extraction, classification and SMTP send. For each level it reports
+throughput, p50/p95/p99 request latency, time to the first streamed
+summary, and the mean time per instrumented stage. With --deployments N the
+app routes across N fake deployments (optionally hedging slow calls).
+
+Results are written to benchmarks/results/ as JSON. Pass an earlier result
+with --compare to fail (exit code 1) when p95 latency regresses by more than
+--threshold percent.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline [--latency 0.2] [--concurrency 1 4 16] [--requests 40] [--image]
+    python -m benchmarks.bench_pipeline --deployments 2 --jitter 0.4 --hedge
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+import yaml
+from tests.fakes import FakeOpenAIServer, FakeSMTPServer
+
+RESULTS_DIR = Path(__file__).parent / "results"
+STAGES = ("sanitize", "llm", "classification", "image_encode", "email_build", "smtp_connect", "smtp_send")
+
+def bench_config(apis: list[FakeOpenAIServer], smtp: FakeSMTPServer, concurrency: int, cache: bool,
+                 hedge: bool = False) -> dict:
+    """App config pointing at the local fakes; caches are off so every request does the full work."""
+    api = apis[0]
+    config = {
+        "smtp": {
+            "server": "127.0.0.1", "port": smtp.port, "username": "bench@example.com", "password": "bench",
+            "use_tls": False, "pool": {"size": max(4, concurrency)}
+        },
+        "llm": {
+            "azure_endpoint": api.url, "deployment_name": "bench", "api_version": "2024-08-01-preview",
+            "api_key": "bench", "pool": {"max_connections": max(20, concurrency), "max_retries": 0}
+        },
+        "classifier": {"backend": "stub", "warmup": False},
+        "cache": {"extraction": {"enabled": cache}, "classification": {"enabled": cache}},
+        "email_queue": {"enabled": False}
+    }
+    if len(apis) > 1:
+        config["llm"]["deployments"] = [{"name": f"fake-{i}", "azure_endpoint": other.url} for i, other in enumerate(apis)]
+        config["llm"]["routing"] = {"hedge": hedge}
+    return config
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def run_level(concurrency: int, requests: int, with_image: bool) -> dict:
+    """Run `requests` pipeline requests with at most `concurrency` in flight."""
+    from PIL import Image
+    from src.gradio import process_and_send
+    from src.metrics import STAGE_SECONDS
+
+    stage_before = {name: (STAGE_SECONDS.count(stage=name), STAGE_SECONDS.sum(stage=name)) for name in STAGES}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, first_updates, failures = [], [], 0
+
+    async def one(i: int):
+        nonlocal failures
+        image = Image.new("RGB", (1600, 1200), (i % 256, 90, 160)) if with_image else None
+        # Unique descriptions so that nothing is served from a cache
+        description = f"Toyota Corolla {2010 + i % 14}, silver sedan, {40000 + i} km, listing #{i}, asking 15000 USD"
+        async with semaphore:
+            start = time.perf_counter()
+            first, status = None, ""
+            async for status, details in process_and_send(description, f"buyer{i}@example.com", image):
+                if first is None and details:
+                    first = time.perf_counter() - start
+            latencies.append(time.perf_counter() - start)
+            first_updates.append(first if first is not None else latencies[-1])
+            if not status.startswith("Email sent successfully"):
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    first_updates.sort()
+    stages = {}
+    for name, (count_before, sum_before) in stage_before.items():
+        count = STAGE_SECONDS.count(stage=name) - count_before
+        if count:
+            stages[name] = (STAGE_SECONDS.sum(stage=name) - sum_before) / count
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "failures": failures,
+        "throughput_rps": requests / elapsed,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "first_update_p50": percentile(first_updates, 50),
+        "stage_mean_seconds": stages
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Print the change against a baseline result file; returns False on a p95 regression above `threshold` %."""
+    baseline = {level["concurrency"]: level for level in json.loads(Path(baseline_path).read_text())["levels"]}
+    ok = True
+    print(f"\ncompared with {baseline_path}:")
+    for level in results["levels"]:
+        before = baseline.get(level["concurrency"])
+        if before is None:
+            continue
+        p95_change = (level["latency_p95"] / before["latency_p95"] - 1) * 100
+        rps_change = (level["throughput_rps"] / before["throughput_rps"] - 1) * 100
+        regressed = p95_change > threshold
+        ok = ok and not regressed
+        print(f"  concurrency {level['concurrency']:>3}: p95 {p95_change:+6.1f}%  throughput {rps_change:+6.1f}%"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random LLM latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, help="requests per level (default: 5 per concurrent slot, at least 20)")
+    parser.add_argument("--image", action="store_true", help="attach a 1600x1200 photo to every request")
+    parser.add_argument("--cache", action="store_true", help="leave the extraction/classification caches on")
+    parser.add_argument("--deployments", type=int, default=1, help="fake LLM deployments to route across")
+    parser.add_argument("--hedge", action="store_true", help="hedge slow LLM calls (needs --deployments 2 or more)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/pipeline-<time>-<revision>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed p95 regression in percent")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        apis = [stack.enter_context(FakeOpenAIServer(latency=args.latency, jitter=args.jitter))
+                for _ in range(max(1, args.deployments))]
+        smtp = stack.enter_context(FakeSMTPServer())
+        workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        config_path = Path(workdir) / "config.yaml"
+        config_path.write_text(yaml.safe_dump(bench_config(apis, smtp, max(args.concurrency), args.cache, args.hedge)))
+        # Must be set before the app modules load their config
+        os.environ["AUTOLISTER_CONFIG"] = str(config_path)
+
+        # Pay the one-off costs (lazy imports, chain build, connection pools) before timing
+        asyncio.run(run_level(1, 1, args.image))
+        levels = []
+        for concurrency in args.concurrency:
+            requests = args.requests or max(20, concurrency * 5)
+            level = asyncio.run(run_level(concurrency, requests, args.image))
+            levels.append(level)
+            print(f"concurrency {concurrency:>3}: {level['throughput_rps']:7.2f} req/s  "
+                  f"p50 {level['latency_p50'] * 1000:7.1f} ms  p95 {level['latency_p95'] * 1000:7.1f} ms  "
+                  f"p99 {level['latency_p99'] * 1000:7.1f} ms  first update {level['first_update_p50'] * 1000:7.1f} ms  "
+                  f"failures {level['failures']}")
+        llm_requests, emails = sum(api.requests for api in apis), smtp.messages
+
+    results = {
+        "benchmark": "pipeline",
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "parameters": {"latency": args.latency, "jitter": args.jitter, "image": args.image, "cache": args.cache,
+                       "deployments": args.deployments, "hedge": args.hedge},
+        "llm_requests": llm_requests,
+        "emails": emails,
+        "levels": levels
+    }
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"pipeline-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"results written to {output}")
+
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Micro-benchmark for listing rendering.
+
+Reports the per-listing cost of each output format (HTML email, plain-text
+alternative, Markdown summary) and of building the full MIME message.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_rendering [--number 20000]
+"""
+import argparse
+import timeit
+from src.email_sender import build_car_listing_message
+from src.rendering import render_html_email, render_text_email, render_markdown_summary
+
+SAMPLE_LISTING = {
+    "car": {
+        "body_type": "Sedan",
+        "color": "Silver",
+        "brand": "Toyota",
+        "model": "Camry",
+        "manufactured_year": 2020,
+        "motor_size_cc": 2500,
+        "tires": {"type": "All-season", "manufactured_year": 2022},
+        "windows": "Tinted, electrical",
+        "notices": [
+            {"type": "Collision", "description": "Minor scratch on rear bumper"},
+            {"type": "Maintenance", "description": "Oil changed in 2024"}
+        ],
+        "price": {"amount": 22000.0, "currency": "USD"},
+        "estimated_price": None
+    }
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="renders per measurement")
+    args = parser.parse_args()
+
+    cases = {
+        "html email": lambda: render_html_email(SAMPLE_LISTING, include_photo=True),
+        "text email": lambda: render_text_email(SAMPLE_LISTING, include_photo=True),
+        "markdown summary": lambda: render_markdown_summary(SAMPLE_LISTING["car"]),
+        "mime message": lambda: build_car_listing_message(SAMPLE_LISTING, "dealer@example.com").as_bytes(),
+    }
+    print(f"{'case':<20}{'us/listing':>12}{'listings/s':>14}")
+    for name, func in cases.items():
+        number = args.number if name != "mime message" else max(1, args.number // 10)
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f"{name:<20}{best * 1e6:>12.2f}{1 / best:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Fuzz/benchmark suite for the sanitizer threat patterns.
+
+Every pattern is run on its own against inputs built to make a
+backtracking engine work hard: repeated partial matches (a pattern's
+keywords with the final part missing), unclosed tags, long whitespace and
+separator runs, and seeded random text drawn from the characters the
+patterns care about. The report lists the worst input and time per
+pattern, plus the combined single-pass sanitizer on the same inputs.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sanitizer_redos [--length 5000] [--fuzz 20] [--limit-ms 50]
+Exits non-zero if any pattern exceeds --limit-ms.
+"""
+import argparse
+import logging
+import random
+import re
+import sys
+import time
+from src.sanitizer import HIGH_THREAT_PATTERNS, MEDIUM_THREAT_PATTERNS, PATTERN_FLAGS, Sanitizer
+
+FUZZ_ALPHABET = "<>/=-*#`:(),. \t\n" + "abceilmnoprstuvy_"
+
+def all_patterns() -> list[tuple[str, str, str]]:
+    """(level, category, pattern) for every sanitizer pattern."""
+    return [
+        (level, category, pattern)
+        for level, table in (("HIGH", HIGH_THREAT_PATTERNS), ("MEDIUM", MEDIUM_THREAT_PATTERNS))
+        for category, patterns in table.items()
+        for pattern in patterns
+    ]
+
+def _fill(chunk: str, length: int) -> str:
+    return (chunk * (length // max(len(chunk), 1) + 1))[:length]
+
+def pathological_inputs(pattern: str, length: int = 5000, fuzz: int = 20, seed: int = 0) -> dict[str, str]:
+    """Adversarial inputs for one pattern, keyed by a short description."""
+    words = re.findall(r"[a-z_]{2,}", pattern.replace(r"\s", " ").replace(r"\b", " "))
+    inputs = {
+        "partial keywords": _fill(" ".join(words[:-1] or words) + " ", length),
+        "keywords no separator": _fill("".join(words), length),
+        "unclosed script": _fill("<script>a ", length),
+        "unclosed iframe attrs": _fill("<iframe src=x ", length),
+        "nested openers": _fill("<script><", length),
+        "whitespace run": "system" + " " * (length - 12) + "you ar",
+        "mixed whitespace": _fill(" \t\n", length),
+        "separator runs": _fill("=========-", length),
+        "code fences": _fill("```  ", length),
+        "call openers": _fill("eval \t exec  __import__ ", length),
+    }
+    rng = random.Random(f"{seed}:{pattern}")
+    for i in range(fuzz):
+        inputs[f"fuzz {i}"] = "".join(rng.choice(FUZZ_ALPHABET) for _ in range(length))
+    return inputs
+
+def time_pattern(regex: re.Pattern, text: str) -> float:
+    started = time.perf_counter()
+    for _ in regex.finditer(text):
+        pass
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--length", type=int, default=5000, help="input length (max_input_length)")
+    parser.add_argument("--fuzz", type=int, default=20, help="random inputs per pattern")
+    parser.add_argument("--limit-ms", type=float, default=50.0, help="fail if any pattern is slower than this")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    worst_overall = 0.0
+    print(f"{'level':<7}{'category':<22}{'worst ms':>10}  worst input / pattern")
+    for level, category, pattern in all_patterns():
+        regex = re.compile(pattern, PATTERN_FLAGS)
+        timings = {name: time_pattern(regex, text) for name, text in pathological_inputs(pattern, args.length, args.fuzz).items()}
+        worst_input = max(timings, key=timings.get)
+        worst_overall = max(worst_overall, timings[worst_input])
+        print(f"{level:<7}{category:<22}{timings[worst_input] * 1000:>10.3f}  {worst_input} / {pattern}")
+
+    sanitizer = Sanitizer()
+    combined = 0.0
+    for _, _, pattern in all_patterns():
+        for text in pathological_inputs(pattern, args.length, fuzz=2).values():
+            result = sanitizer.sanitize(text, args.length, strict_mode=True, log_threats=False)
+            combined = max(combined, result.elapsed)
+    print(f"\nworst single pattern: {worst_overall * 1000:.3f} ms, worst full sanitize: {combined * 1000:.3f} ms")
+    if worst_overall * 1000 > args.limit_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Startup benchmark: cold import time of the app modules, measured with
+`python -X importtime` in a fresh interpreter per run.
+
+For each module it reports the median cumulative import time, the
+heaviest direct imports, and any heavy dependency (UI, LangChain, HTTP
+client, ONNX Runtime) that got loaded although the module does not need it
+at import. Modules with a target fail the run when they exceed it, so
+import-time regressions show up like test failures.
+
+Results are written to benchmarks/results/ as JSON. Pass an earlier result
+with --compare to see the change per module.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [--modules src.text_processor src.email_sender] [--repeat 5]
+    python -m benchmarks.bench_startup --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from benchmarks.bench_pipeline import RESULTS_DIR, git_revision
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("src.config", "src.text_processor", "src.email_sender", "src.bulk", "src.gradio")
+# Cumulative import time budget in milliseconds
+TARGETS_MS = {"src.text_processor": 200, "src.email_sender": 200}
+# Only needed once a request is actually served
+HEAVY_MODULES = ("gradio", "langchain_core", "langchain_openai", "httpx", "openai", "onnxruntime")
+
+def parse_importtime(stderr: str) -> list[tuple[int, int, int, str]]:
+    """Parse `-X importtime` output into (depth, self_us, cumulative_us, module) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+def measure(module: str) -> dict:
+    """Import `module` in a fresh interpreter; return its import time, top imports and loaded heavy modules."""
+    code = f"import {module}, sys; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True,
+                               text=True, check=True)
+    rows = parse_importtime(completed.stderr)
+    index = next(i for i, row in enumerate(rows) if row[3] == module and row[0] == 0)
+    # Direct imports of the module are listed (one level deeper) right before it
+    children = []
+    for depth, _, cumulative_us, name in reversed(rows[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, cumulative_us))
+    return {
+        "cumulative_ms": rows[index][2] / 1000,
+        "top_imports": [(name, us / 1000) for name, us in sorted(children, key=lambda child: -child[1])[:5]],
+        "heavy_loaded": completed.stdout.split()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=list(MODULES))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module; the median is reported")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/startup-<time>-<revision>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "startup",
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "modules": {}
+    }
+    failed = []
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        median_ms = statistics.median(run["cumulative_ms"] for run in runs)
+        target = TARGETS_MS.get(module)
+        heavy = runs[-1]["heavy_loaded"]
+        results["modules"][module] = {"median_ms": median_ms, "target_ms": target, "heavy_loaded": heavy,
+                                      "top_imports": runs[-1]["top_imports"]}
+        over_target = target is not None and median_ms > target
+        if over_target or (target is not None and heavy):
+            failed.append(module)
+        status = "" if target is None else ("  OVER TARGET" if over_target else f"  (target {target} ms)")
+        print(f"{module:>20}: {median_ms:7.1f} ms{status}")
+        print(f"{'':>20}  top: " + ", ".join(f"{name} {ms:.1f}" for name, ms in runs[-1]["top_imports"]))
+        if heavy:
+            print(f"{'':>20}  heavy modules loaded: {', '.join(heavy)}")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"results written to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["modules"]
+        print(f"\ncompared with {args.compare}:")
+        for module, result in results["modules"].items():
+            if module in baseline:
+                change = (result["median_ms"] / baseline[module]["median_ms"] - 1) * 100
+                print(f"{module:>20}: {baseline[module]['median_ms']:7.1f} ms -> {result['median_ms']:7.1f} ms ({change:+.1f}%)")
+
+    if failed:
+        print(f"\nstartup targets missed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+A/B evaluation of extraction prompt variants on a labelled fixture set.
+
+Every fixture description is extracted with each registered prompt variant
+(see src/templates.py). The run reports field accuracy against the expected
+values, together with the tokens per request: prompt, schema and completion
+counted locally, plus the prompt/completion usage the API reports. Only the
+LLM is compared; the rule-based fast path is not used.
+
+With --fake the run goes against the local fake Azure OpenAI server. This
+checks the wiring and token accounting, but its answers do not depend on the
+prompt, so accuracy is meaningless there.
+
+Usage (from the repository root):
+    python -m benchmarks.eval_prompts [--variants default compact] [--fixtures benchmarks/fixtures/extraction.jsonl]
+    python -m benchmarks.eval_prompts --fake
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from benchmarks.bench_pipeline import RESULTS_DIR, git_revision
+
+FIXTURES = Path(__file__).parent / "fixtures" / "extraction.jsonl"
+
+def flatten(car: dict, prefix: str = "") -> dict:
+    """{"price": {"amount": 1}} -> {"price.amount": 1}"""
+    flat = {}
+    for key, value in (car or {}).items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def matches(expected, actual) -> bool:
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return abs(expected - actual) <= abs(expected) * 0.01
+    return str(expected).strip().lower() == str(actual).strip().lower()
+
+def evaluate(variant_name: str, fixtures: list[dict], llm) -> dict:
+    """Extract every fixture with one prompt variant; return accuracy, token and latency figures."""
+    from langchain_core.callbacks import BaseCallbackHandler
+    from src.templates import get_prompt_variant
+    from src.text_processor import get_extraction_chain, prepare_description
+    from src.tokens import count_tokens, schema_tokens
+    from src.utils import CarListing
+
+    class UsageCapture(BaseCallbackHandler):
+        def __init__(self):
+            self.usage = []
+
+        def on_llm_end(self, response, **kwargs):
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        self.usage.append(usage)
+
+    variant = get_prompt_variant(variant_name)
+    chain = get_extraction_chain(llm, CarListing, variant.full)
+    capture = UsageCapture()
+    correct = total = failures = 0
+    per_field: dict[str, list[bool]] = {}
+    prompt_tokens, completion_tokens, latencies = [], [], []
+    for fixture in fixtures:
+        description = prepare_description(fixture["description"])
+        prompt_tokens.append(count_tokens(variant.full.format(description=description)))
+        start = time.perf_counter()
+        try:
+            output = chain.invoke({"description": description}, config={"callbacks": [capture]})
+        except Exception as e:
+            print(f"  [{variant_name}] extraction failed: {str(e)}", file=sys.stderr)
+            failures += 1
+            output = None
+        latencies.append(time.perf_counter() - start)
+        actual = flatten(output.model_dump()["car"]) if output is not None else {}
+        if output is not None:
+            completion_tokens.append(count_tokens(output.model_dump_json()))
+        for field, expected in fixture["expected"].items():
+            ok = matches(expected, actual.get(field))
+            per_field.setdefault(field.split(".")[0], []).append(ok)
+            correct += ok
+            total += 1
+
+    reported = capture.usage
+    return {
+        "variant": variant_name,
+        "fixtures": len(fixtures),
+        "failures": failures,
+        "accuracy": correct / total if total else 0.0,
+        "field_accuracy": {field: sum(oks) / len(oks) for field, oks in sorted(per_field.items())},
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "schema_tokens": schema_tokens(CarListing),
+        "completion_tokens": statistics.mean(completion_tokens) if completion_tokens else 0.0,
+        "reported_prompt_tokens": statistics.mean(u.get("input_tokens", 0) for u in reported) if reported else None,
+        "reported_completion_tokens": statistics.mean(u.get("output_tokens", 0) for u in reported) if reported else None,
+        "latency_p50": statistics.median(latencies)
+    }
+
+def main():
+    from src.templates import PROMPT_VARIANTS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=list(PROMPT_VARIANTS), help="prompt variants to compare")
+    parser.add_argument("--fixtures", default=str(FIXTURES), help="JSONL with description and expected fields")
+    parser.add_argument("--fake", action="store_true", help="use the local fake Azure OpenAI server")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/prompts-<time>-<revision>.json)")
+    args = parser.parse_args()
+
+    from src.config import get_config, LlmConfig
+    from src.llm_client import get_llm
+
+    fixtures = [json.loads(line) for line in Path(args.fixtures).read_text(encoding="utf-8").splitlines() if line.strip()]
+    with ExitStack() as stack:
+        if args.fake:
+            from tests.fakes import FakeOpenAIServer
+            api = stack.enter_context(FakeOpenAIServer(latency=0.0))
+            llm = get_llm(LlmConfig(azure_endpoint=api.url, deployment_name="eval", api_version="2024-08-01-preview",
+                                    api_key="eval"))
+        else:
+            llm = get_llm(get_config().llm)
+        variants = [evaluate(name, fixtures, llm) for name in args.variants]
+
+    print(f"{'variant':>12} {'accuracy':>9} {'prompt':>7} {'schema':>7} {'compl.':>7} {'p50 ms':>8}")
+    for result in variants:
+        print(f"{result['variant']:>12} {result['accuracy']:>9.1%} {result['prompt_tokens']:>7.0f} "
+              f"{result['schema_tokens']:>7} {result['completion_tokens']:>7.0f} {result['latency_p50'] * 1000:>8.1f}")
+    for result in variants:
+        weak = {field: accuracy for field, accuracy in result["field_accuracy"].items() if accuracy < 1.0}
+        if weak:
+            print(f"{result['variant']:>12} misses: " + ", ".join(f"{field} {accuracy:.0%}" for field, accuracy in weak.items()))
+
+    results = {
+        "benchmark": "prompts",
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "fixtures": args.fixtures,
+        "fake": args.fake,
+        "variants": variants
+    }
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"prompts-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"results written to {output}")
+
+if __name__ == "__main__":
+    main()
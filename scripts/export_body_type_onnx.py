@@ -0,0 +1,44 @@
+"""
+Export a body type classifier to ONNX for the "onnx" classifier backend.
+
+Builds a MobileNetV3-Small with a 3-way head (Sedan, SUV, Truck, in that
+order) and optionally loads fine-tuned weights from a PyTorch state dict.
+Without --weights the head is untrained, which is only useful for
+benchmarking. Requires torch and torchvision, which are not runtime
+dependencies of the app.
+
+Usage (from the repository root):
+    python scripts/export_body_type_onnx.py [--weights body_type.pt] [--output models/body_type.onnx]
+"""
+import argparse
+from pathlib import Path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", help="state dict of a fine-tuned model (default: untrained head)")
+    parser.add_argument("--output", default="models/body_type.onnx")
+    parser.add_argument("--num-classes", type=int, default=3)
+    parser.add_argument("--input-size", type=int, default=224)
+    args = parser.parse_args()
+
+    import torch
+    from torchvision.models import mobilenet_v3_small
+
+    model = mobilenet_v3_small(num_classes=args.num_classes)
+    if args.weights:
+        model.load_state_dict(torch.load(args.weights, map_location="cpu"))
+    model.eval()
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    dummy = torch.zeros(1, 3, args.input_size, args.input_size)
+    torch.onnx.export(
+        model, dummy, str(output),
+        input_names=["image"], output_names=["logits"],
+        dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17
+    )
+    print(f"Exported {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Headless bulk listing: stream a CSV or JSONL file of car descriptions
+through extraction, classification and email delivery.
+
+Each input row has a `description`, a `recipient` and an optional `image`
+path (and optionally an `id`; the row number is used otherwise). Rows are
+read lazily and processed one chunk at a time, so memory stays bounded
+regardless of the input size. Every finished row is appended to the JSONL
+result file, which doubles as the checkpoint: rerunning with --resume skips
+the rows already recorded as successful. Queued emails are keyed by input
+file and row id, so rows that were queued but not yet checkpointed when a run
+crashed are not queued twice on --resume.
+
+Usage (from the repository root):
+    python -m src.bulk stock.csv --output results.jsonl [--workers 8] [--resume] [--queue] [--no-send]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+from src.config import setup_logging, get_config
+from src.email_sender import send_car_listing_email
+from src.image_classifier import classify_car_images
+from src.llm_client import get_llm
+from src.text_processor import process_texts
+
+logger = logging.getLogger(__name__)
+
+def read_rows(path: str | Path) -> Iterator[dict]:
+    """
+    Lazily read input rows from a .csv or .jsonl file.
+    Args:
+        path (str | Path): Input file; the format is chosen by extension.
+    Returns:
+        Iterator[dict]: Rows with `id`, `description`, `recipient` and `image` keys.
+    """
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for number, record in enumerate(records, start=1):
+            yield {
+                "id": str(record.get("id") or number),
+                "description": record.get("description") or "",
+                "recipient": (record.get("recipient") or "").strip(),
+                "image": (record.get("image") or "").strip() or None
+            }
+
+def completed_ids(output_path: str | Path, statuses: tuple[str, ...] = ("sent", "queued")) -> set[str]:
+    """Return the ids recorded with one of `statuses` in an existing result file (the checkpoint)."""
+    done = set()
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partially written last line
+                continue
+            if record.get("status") in statuses:
+                done.add(record["id"])
+    return done
+
+def _ends_with_newline(path: str | Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def skip_completed(rows: Iterable[dict], done: set[str]) -> Iterator[dict]:
+    """Drop rows that already succeeded in a previous run."""
+    for row in rows:
+        if row["id"] in done:
+            continue
+        yield row
+
+def chunked(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    """Group rows into lists of at most `size`."""
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+def idempotency_key(input_path: str | Path, row: dict) -> str:
+    """Outbound queue key of a row: the same for every run over the same input file."""
+    return f"bulk:{Path(input_path).resolve()}:{row['id']}"
+
+def process_chunk(chunk: list[dict], llm, executor: ThreadPoolExecutor, max_concurrency: int, send: bool = True,
+                  use_queue: bool = False, input_path: str | Path | None = None) -> list[dict]:
+    """
+    Extract, classify and send one chunk of rows.
+    Args:
+        chunk (list[dict]): Rows from read_rows().
+        llm: LLM client to extract with.
+        executor (ThreadPoolExecutor): Workers for sending.
+        max_concurrency (int): Maximum in-flight LLM calls.
+        send (bool): Whether to send emails, or only extract.
+        use_queue (bool): Hand emails to the durable outbound queue instead of sending inline.
+        input_path (str | Path | None): Input file the rows come from, used to key queued emails.
+    Returns:
+        list[dict]: One result record per row, in input order.
+    """
+    listings = process_texts([row["description"] for row in chunk], llm, max_concurrency=max_concurrency)
+
+    # Classify every photo of the chunk in one batch
+    missing_images = {i for i, row in enumerate(chunk) if row["image"] and not os.path.exists(row["image"])}
+    with_images = [i for i, row in enumerate(chunk) if row["image"] and i not in missing_images]
+    body_types = dict(zip(with_images, classify_car_images([chunk[i]["image"] for i in with_images]))) if with_images else {}
+
+    def finish(index: int) -> dict:
+        row, car_data = chunk[index], listings[index]
+        record = {"id": row["id"], "recipient": row["recipient"], "image": row["image"]}
+        if index in missing_images:
+            return {**record, "status": "failed", "error": f"Image file not found: {row['image']}"}
+        body_type = body_types.get(index)
+        if body_type and body_type != 'Unknown':
+            car_data['car']['body_type'] = body_type
+        record["car"] = car_data.get('car')
+        if not send:
+            return {**record, "status": "extracted"}
+        key = idempotency_key(input_path, row) if use_queue and input_path else None
+        if not send_car_listing_email(car_data, row["recipient"], photo_path=row["image"], use_queue=use_queue,
+                                      idempotency_key=key):
+            return {**record, "status": "failed", "error": "send failed (see log)"}
+        return {**record, "status": "queued" if use_queue else "sent"}
+
+    return list(executor.map(finish, range(len(chunk))))
+
+def run(input_path: str | Path, output_path: str | Path, workers: int = 4, chunk_size: int | None = None,
+        resume: bool = False, send: bool = True, use_queue: bool = False, llm=None) -> dict:
+    """
+    Stream an input file through the listing pipeline, appending results to `output_path`.
+    Args:
+        input_path (str | Path): CSV or JSONL input.
+        output_path (str | Path): JSONL result file (and checkpoint).
+        workers (int): Concurrent LLM calls and sends.
+        chunk_size (int | None): Rows held in memory at once (default: 4 per worker).
+        resume (bool): Skip rows already recorded as successful in `output_path`.
+        send (bool): Whether to send emails, or only extract.
+        use_queue (bool): Hand emails to the durable outbound queue.
+        llm: LLM client (default: the shared configured client).
+    Returns:
+        dict: Counts per status plus elapsed time and rows/s.
+    """
+    llm = llm or get_llm()
+    chunk_size = chunk_size or workers * 4
+    done = completed_ids(output_path, ("sent", "queued") if send else ("extracted",)) if resume else set()
+    if done:
+        logger.info(f"Resuming: {len(done)} rows already completed")
+    rows = skip_completed(read_rows(input_path), done)
+
+    started = time.perf_counter()
+    counts = {"skipped": len(done)}
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") as executor:
+        if resume and out.tell() and not _ends_with_newline(output_path):
+            # Terminate a line left half-written by a crash so the next record starts cleanly
+            out.write("\n")
+        for chunk in chunked(rows, chunk_size):
+            for record in process_chunk(chunk, llm, executor, workers, send=send, use_queue=use_queue,
+                                        input_path=input_path):
+                out.write(json.dumps(record) + "\n")
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            # Make the chunk durable before starting the next one
+            out.flush()
+            os.fsync(out.fileno())
+            processed = sum(counts.values()) - counts["skipped"]
+            logger.info(f"Bulk progress: {processed} rows processed ({counts})")
+
+    elapsed = time.perf_counter() - started
+    processed = sum(counts.values()) - counts["skipped"]
+    return {**counts, "elapsed_seconds": elapsed, "rows_per_second": processed / elapsed if elapsed > 0 else 0.0}
+
+def main(argv: list[str] | None = None):
+    """Command-line entry point."""
+    setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL file with description, recipient and optional image/id columns")
+    parser.add_argument("--output", default="bulk_results.jsonl", help="JSONL result file, also used as the checkpoint")
+    parser.add_argument("--workers", type=int, default=get_config().extraction.max_concurrency)
+    parser.add_argument("--chunk-size", type=int, help="rows held in memory at once (default: 4 per worker)")
+    parser.add_argument("--resume", action="store_true", help="skip rows already successful in --output")
+    parser.add_argument("--queue", action="store_true", help="store emails in the outbound queue for the app's queue workers")
+    parser.add_argument("--no-send", action="store_true", help="only extract and classify")
+    args = parser.parse_args(argv)
+
+    summary = run(args.input, args.output, workers=args.workers, chunk_size=args.chunk_size, resume=args.resume,
+                  send=not args.no_send, use_queue=args.queue)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
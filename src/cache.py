@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+from src.metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a content-addressed cache key from the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class TTLCache:
+    """
+    Two-tier cache for JSON-serializable values.
+
+    The in-memory tier is an LRU bounded by `max_entries`. The optional on-disk
+    tier is a SQLite file bounded by `max_disk_entries`. Both tiers expire
+    entries older than `ttl_seconds`. Values are stored serialized, so callers
+    always receive a fresh copy they are free to mutate.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 persist_path: str | Path | None = None, max_disk_entries: int = 100_000):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._db = None
+        if persist_path:
+            persist_path = Path(persist_path)
+            persist_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(persist_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._db.commit()
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def get(self, key: str) -> Any:
+        """Return the cached value for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._is_expired(created, now):
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                    return json.loads(value)
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self._is_expired(created, now):
+                        self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._store_memory(key, created, value)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                        return json.loads(value)
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            return None
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value under `key`."""
+        now = time.time()
+        serialized = json.dumps(value)
+        with self._lock:
+            self._store_memory(key, now, serialized)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, serialized, now, now)
+                )
+                overflow = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                        (overflow,)
+                    )
+                self._db.commit()
+
+    def _store_memory(self, key: str, created: float, serialized: str):
+        self._memory[key] = (created, serialized)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current in-memory size."""
+        with self._lock:
+            return {**self._stats, "size": len(self._memory)}
+
+    def clear(self):
+        """Remove all entries from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    def close(self):
+        """Close the on-disk tier, if any."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class PerceptualHashCache:
+    """
+    Cache keyed by 64-bit perceptual image hashes, with near-duplicate lookup.
+
+    A lookup hits when a stored hash lies within `max_distance` bits (Hamming
+    distance) of the query. The hash is split into `max_distance + 1` bands,
+    and any hash that close must match the query exactly in at least one
+    band. Only entries sharing a band are compared, instead of scanning the
+    whole cache. The in-memory tier is an LRU bounded by `max_entries`. The
+    optional SQLite tier keeps entries across restarts; the most recently
+    used ones are loaded into memory on start and are searched for near
+    duplicates, while the rest only serve exact matches. Entries are scoped
+    by `namespace`, so that a different model does not reuse old predictions.
+    """
+
+    def __init__(self, name: str, namespace: str = "", max_entries: int = 4096, max_distance: int = 4,
+                 persist_path: str | Path | None = None, max_disk_entries: int = 100_000):
+        self.name = name
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_disk_entries = max_disk_entries
+        bands = max_distance + 1
+        self._bands = [(64 * i // bands, (1 << (64 * (i + 1) // bands - 64 * i // bands)) - 1) for i in range(bands)]
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[int, Any] = OrderedDict()
+        self._index: dict[tuple[int, int], set[int]] = {}
+        self._stats = {"hits": 0, "near_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        if persist_path:
+            persist_path = Path(persist_path)
+            persist_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(persist_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (namespace TEXT NOT NULL, hash TEXT NOT NULL, value TEXT NOT NULL, "
+                "accessed REAL NOT NULL, PRIMARY KEY (namespace, hash))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS hashes_accessed ON hashes (accessed)")
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT hash, value FROM hashes WHERE namespace = ? ORDER BY accessed DESC LIMIT ?",
+                (namespace, max_entries)
+            ).fetchall()
+            for hash_hex, value in reversed(rows):
+                self._store_memory(int(hash_hex, 16), json.loads(value))
+
+    def _band_keys(self, image_hash: int):
+        return [(i, (image_hash >> shift) & mask) for i, (shift, mask) in enumerate(self._bands)]
+
+    def _store_memory(self, image_hash: int, value: Any):
+        if image_hash not in self._memory:
+            for band_key in self._band_keys(image_hash):
+                self._index.setdefault(band_key, set()).add(image_hash)
+        self._memory[image_hash] = value
+        self._memory.move_to_end(image_hash)
+        while len(self._memory) > self.max_entries:
+            evicted, _ = self._memory.popitem(last=False)
+            for band_key in self._band_keys(evicted):
+                bucket = self._index[band_key]
+                bucket.discard(evicted)
+                if not bucket:
+                    del self._index[band_key]
+            self._stats["evictions"] += 1
+
+    def _nearest(self, image_hash: int) -> int | None:
+        best, best_distance = None, self.max_distance + 1
+        for band_key in self._band_keys(image_hash):
+            for candidate in self._index.get(band_key, ()):
+                distance = (candidate ^ image_hash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def get(self, image_hash: int) -> Any:
+        """Return the value stored for `image_hash` or a near duplicate of it, or None on a miss."""
+        with self._lock:
+            if image_hash in self._memory:
+                self._memory.move_to_end(image_hash)
+                self._stats["hits"] += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return self._memory[image_hash]
+            match = self._nearest(image_hash)
+            if match is not None:
+                self._memory.move_to_end(match)
+                self._stats["hits"] += 1
+                self._stats["near_hits"] += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return self._memory[match]
+            if self._db is not None:
+                key = (self.namespace, f"{image_hash:016x}")
+                row = self._db.execute("SELECT value FROM hashes WHERE namespace = ? AND hash = ?", key).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE hashes SET accessed = ? WHERE namespace = ? AND hash = ?", (time.time(), *key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._store_memory(image_hash, value)
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                    return value
+            self._stats["misses"] += 1
+            CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+            return None
+
+    def set(self, image_hash: int, value: Any):
+        """Store a JSON-serializable value under `image_hash`."""
+        with self._lock:
+            self._store_memory(image_hash, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO hashes (namespace, hash, value, accessed) VALUES (?, ?, ?, ?)",
+                    (self.namespace, f"{image_hash:016x}", json.dumps(value), time.time())
+                )
+                overflow = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM hashes ORDER BY accessed LIMIT ?)",
+                        (overflow,)
+                    )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current in-memory size."""
+        with self._lock:
+            return {**self._stats, "size": len(self._memory)}
+
+    def clear(self):
+        """Remove all entries of this namespace from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._index.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM hashes WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def close(self):
+        """Close the on-disk tier, if any."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,44 +1,387 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
+from typing import Literal, Optional, Tuple
 import yaml
 import os
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from src.metrics import LOG_RECORDS_DROPPED, stage
 
-def load_config():
+# AUTOLISTER_CONFIG points the app at another config file (e.g. for benchmarks)
+CONFIG_PATH = Path(os.environ.get("AUTOLISTER_CONFIG", "config.yaml"))
+
+# Minimum number of seconds between two mtime checks of config.yaml
+CONFIG_CHECK_INTERVAL = 1.0
+
+class _FrozenModel(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", defer_build=True)
+
+class SmtpPoolConfig(_FrozenModel):
+    size: int = 4
+    idle_timeout: float = 60.0
+    health_check_interval: float = 10.0
+    timeout: float = 30.0
+
+class SmtpConfig(_FrozenModel):
+    server: str
+    port: int
+    username: str
+    password: str
+    use_tls: bool = True
+    pool: SmtpPoolConfig = Field(default_factory=SmtpPoolConfig)
+
+class EmailQueueConfig(_FrozenModel):
+    enabled: bool = False
+    path: str = "data/outbox.sqlite3"
+    workers: int = 2
+    poll_interval: float = 1.0
+    max_attempts: int = 5
+    base_delay: float = 30.0
+    max_delay: float = 3600.0
+    retention_days: float = 7.0
+
+class LlmPoolConfig(_FrozenModel):
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    max_retries: int = 2
+
+# A routed deployment; fields left unset are taken from the top-level llm settings
+class LlmDeploymentConfig(_FrozenModel):
+    name: Optional[str] = None
+    azure_endpoint: Optional[str] = None
+    deployment_name: Optional[str] = None
+    api_version: Optional[str] = None
+    api_key: Optional[str] = None
+    weight: float = Field(default=1.0, gt=0)
+
+class LlmRoutingConfig(_FrozenModel):
+    failure_threshold: int = 3
+    slow_call_seconds: Optional[float] = None
+    open_seconds: float = 30.0
+    latency_window: int = 200
+    hedge: bool = False
+    hedge_delay: Optional[float] = None
+    hedge_min_samples: int = 20
+    max_attempts: int = 2
+
+class LlmConfig(_FrozenModel):
+    azure_endpoint: str
+    deployment_name: str
+    api_version: str
+    api_key: str
+    temperature: float = 0
+    pool: LlmPoolConfig = Field(default_factory=LlmPoolConfig)
+    deployments: Tuple[LlmDeploymentConfig, ...] = ()
+    routing: LlmRoutingConfig = Field(default_factory=LlmRoutingConfig)
+
+    def routed_deployments(self) -> list[tuple[str, float, "LlmConfig"]]:
+        """(name, weight, single-deployment config) per routed deployment; empty when routing is off."""
+        routed = []
+        for index, deployment in enumerate(self.deployments):
+            overrides = deployment.model_dump(exclude={"name", "weight"}, exclude_none=True)
+            llm_config = self.model_copy(update={**overrides, "deployments": ()})
+            name = deployment.name or llm_config.deployment_name
+            if any(name == other for other, _, _ in routed):
+                name = f"{name}-{index}"
+            routed.append((name, deployment.weight, llm_config))
+        return routed
+
+class LoggingConfig(_FrozenModel):
+    level: str = "INFO"
+    directory: str = "logs"
+    filename: str = "autolister360.log"
+    format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    json_lines: bool = False
+    console: bool = True
+    rotation: Literal["size", "time", "none"] = "size"
+    max_bytes: int = 10 * 1024 * 1024
+    when: str = "midnight"
+    backup_count: int = 7
+    queue_size: int = 10000
+
+class ApplicationConfig(_FrozenModel):
+    max_input_length: int = 5000
+    strict_sanitization: bool = True
+    log_threats: bool = True
+    temp_directory: str = "temp"
+    allowed_image_formats: Tuple[str, ...] = ("jpg", "jpeg", "png", "gif")
+    image_spill_bytes: int = 8 * 1024 * 1024
+
+class ImageOptimizationConfig(_FrozenModel):
+    enabled: bool = True
+    max_width: int = 1600
+    max_height: int = 1600
+    # Output format, or "keep" to re-encode in the upload's own format
+    format: Literal["jpeg", "jpg", "webp", "png", "keep"] = "jpeg"
+    quality: int = 82
+    strip_exif: bool = True
+
+class ClassifierConfig(_FrozenModel):
+    backend: str = "stub"
+    model_path: str = "models/body_type.onnx"
+    labels: Tuple[str, ...] = ("Sedan", "SUV", "Truck")
+    input_size: int = 224
+    batch_size: int = 16
+    preprocess_workers: int = 4
+    intra_op_threads: int = 0
+    warmup: bool = True
+
+class SanitizationConfig(_FrozenModel):
+    time_budget_ms: Optional[float] = 50.0
+    profile: bool = False
+
+    @property
+    def time_budget(self) -> Optional[float]:
+        """Budget in seconds, or None when unbounded."""
+        return self.time_budget_ms / 1000 if self.time_budget_ms else None
+
+class MetricsConfig(_FrozenModel):
+    enabled: bool = True
+    path: str = "/metrics"
+
+class GradioConfig(_FrozenModel):
+    server_name: str = "127.0.0.1"
+    server_port: int = 7860
+    share: bool = False
+    theme: str = "soft"
+    concurrency_limit: int = 16
+
+class RuleExtractionConfig(_FrozenModel):
+    enabled: bool = True
+    min_confidence: float = 0.8
+    required_fields: Tuple[str, ...] = ("brand", "model", "manufactured_year", "price")
+
+class ExtractionConfig(_FrozenModel):
+    max_concurrency: int = 8
+    retry_attempts: int = 3
+    prompt_variant: str = "default"
+    max_input_tokens: Optional[int] = 1000
+    token_encoding: str = "o200k_base"
+    rules: RuleExtractionConfig = Field(default_factory=RuleExtractionConfig)
+
+class CacheSettings(_FrozenModel):
+    enabled: bool = True
+    max_entries: int = 1024
+    ttl_seconds: Optional[float] = 86400
+    persist_path: Optional[str] = None
+    max_disk_entries: int = 100_000
+
+class PerceptualCacheSettings(_FrozenModel):
+    enabled: bool = True
+    max_entries: int = 4096
+    max_distance: int = 4
+    persist_path: Optional[str] = None
+    max_disk_entries: int = 100_000
+
+class CacheConfig(_FrozenModel):
+    extraction: CacheSettings = Field(default_factory=CacheSettings)
+    classification: PerceptualCacheSettings = Field(default_factory=PerceptualCacheSettings)
+
+class AppConfig(_FrozenModel):
+    """Typed, immutable view of config.yaml."""
+    smtp: SmtpConfig
+    llm: LlmConfig
+    logging: LoggingConfig = Field(default_factory=LoggingConfig)
+    application: ApplicationConfig = Field(default_factory=ApplicationConfig)
+    sanitization: SanitizationConfig = Field(default_factory=SanitizationConfig)
+    image_optimization: ImageOptimizationConfig = Field(default_factory=ImageOptimizationConfig)
+    classifier: ClassifierConfig = Field(default_factory=ClassifierConfig)
+    gradio: GradioConfig = Field(default_factory=GradioConfig)
+    extraction: ExtractionConfig = Field(default_factory=ExtractionConfig)
+    email_queue: EmailQueueConfig = Field(default_factory=EmailQueueConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+
+class _ConfigStore:
+    """Process-wide cache of the parsed config, invalidated by file mtime or reload()."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._config: Optional[AppConfig] = None
+        self._mtime: Optional[int] = None
+        self._last_check = 0.0
+
+    def get(self) -> AppConfig:
+        config = self._config
+        now = time.monotonic()
+        if config is not None and now - self._last_check < CONFIG_CHECK_INTERVAL:
+            return config
+        with self._lock:
+            self._last_check = now
+            mtime = self._stat()
+            if self._config is None or mtime != self._mtime:
+                self._load(mtime)
+            return self._config
+
+    def reload(self) -> AppConfig:
+        with self._lock:
+            self._last_check = time.monotonic()
+            self._load(self._stat())
+            return self._config
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, mtime: Optional[int]):
+        try:
+            with stage("config_load"):
+                config = AppConfig.model_validate(load_config(self.path))
+        except ValidationError as e:
+            logging.getLogger(__name__).error(f"Invalid configuration in {self.path}: {str(e)}")
+            if self._config is None:
+                raise
+            # Keep serving the last good config if a hot edit broke the file
+            return
+        except (FileNotFoundError, yaml.YAMLError):
+            if self._config is None:
+                raise
+            return
+        if self._config is not None:
+            logging.getLogger(__name__).info(f"Configuration reloaded from {self.path}")
+        self._config = config
+        self._mtime = mtime
+
+_store = _ConfigStore(CONFIG_PATH)
+
+def load_config(config_path: str | Path = CONFIG_PATH) -> dict:
     """Load configuration from config.yaml with environment variable expansion."""
-    config_path = Path("config.yaml")
+    config_path = Path(config_path)
     try:
         with open(config_path, 'r') as file:
             content = file.read()
             content = os.path.expandvars(content)
             return yaml.safe_load(content)
     except FileNotFoundError:
-        logging.getLogger(__name__).error("config.yaml file not found")
+        logging.getLogger(__name__).error(f"{config_path} file not found")
         raise
     except yaml.YAMLError as e:
-        logging.getLogger(__name__).error(f"Error parsing config.yaml: {str(e)}")
+        logging.getLogger(__name__).error(f"Error parsing {config_path}: {str(e)}")
         raise
 
+def get_config() -> AppConfig:
+    """Return the cached configuration, re-reading config.yaml only when it has changed."""
+    return _store.get()
+
+def reload_config() -> AppConfig:
+    """Force config.yaml to be re-read and validated."""
+    return _store.reload()
+
+# Standard LogRecord attributes; anything else on a record came from `extra=`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JsonLineFormatter(logging.Formatter):
+    """Format records as one JSON object per line (fields passed via `extra=` are included)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the background listener without ever blocking the caller.
+    A full queue (the writer is stalled) drops the record and counts it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback here, while the arguments are still current,
+        # but keep them apart (unlike the stdlib) so the JSON formatter can separate them
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def _file_handler(log_config: LoggingConfig) -> logging.Handler:
+    logs_dir = Path(log_config.directory)
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    # strftime keeps older timestamped filename patterns working
+    log_file = logs_dir / datetime.now().strftime(log_config.filename)
+    if log_config.rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=log_config.max_bytes, backupCount=log_config.backup_count, encoding="utf-8"
+        )
+    if log_config.rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=log_config.when, backupCount=log_config.backup_count, encoding="utf-8"
+        )
+    return logging.FileHandler(log_file, encoding="utf-8")
+
 def setup_logging():
-    """Configure logging to write to a single file in the logs directory."""
-    # Check if logger is already configured 
+    """
+    Configure logging for the application.
+
+    Request threads only put records on an in-memory queue; a background
+    listener thread writes them to the (rotating) log file and the console,
+    so a slow disk or terminal never adds latency to a request.
+    """
+    global _listener
+    # Check if logger is already configured
     if logging.getLogger().hasHandlers():
         return
 
     # Load logging configuration
-    config = load_config()
-    log_config = config['logging']
-
-    logs_dir = Path(log_config['directory'])
-    logs_dir.mkdir(exist_ok=True)
-
-    # Configure logging to write to a single file
-    log_file = logs_dir / datetime.now().strftime(log_config['filename'])
-    logging.basicConfig(
-        level=getattr(logging, log_config['level']),
-        format=log_config['format'],
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    log_config = get_config().logging
+
+    file_handler = _file_handler(log_config)
+    file_handler.setFormatter(JsonLineFormatter() if log_config.json_lines else logging.Formatter(log_config.format))
+    handlers = [file_handler]
+    if log_config.console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(log_config.format))
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=max(0, log_config.queue_size))
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, log_config.level))
+    root.addHandler(_QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records, stop the writer thread and close the log handlers."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,257 @@
+import json
+import logging
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from src.config import get_config, EmailQueueConfig
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+# Failures that will not go away by retrying
+_PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+class EmailQueue:
+    """
+    Durable SQLite-backed outbox for listing emails.
+
+    Jobs move pending -> sending -> sent. A failed job goes back to pending
+    with exponential backoff, and becomes dead after `max_attempts` tries or
+    on a permanent error. Enqueueing the same idempotency key twice returns
+    the existing job instead of sending a duplicate email; without a key
+    every enqueue is a new send. Sent and dead jobs are purged after the
+    retention period.
+    """
+
+    def __init__(self, path: str | Path, max_attempts: int = 5, base_delay: float = 30.0, max_delay: float = 3600.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+            "recipient TEXT NOT NULL, car_data TEXT NOT NULL, photo BLOB, photo_name TEXT, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+            "last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        # Jobs left in 'sending' were interrupted by a crash; make them eligible again
+        recovered = self._db.execute(
+            "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ?", (PENDING, time.time(), SENDING)
+        ).rowcount
+        if recovered:
+            logger.warning(f"Recovered {recovered} interrupted email jobs")
+
+    def enqueue(self, car_data: dict, recipient_email: str, photo: tuple[bytes, str] | None = None,
+                idempotency_key: str | None = None) -> int:
+        """
+        Store an email for delivery and return its job id.
+        Args:
+            idempotency_key (str | None): Identifies the send request, so a retried request does not
+                send twice. Defaults to a new key: sending the same listing again is a new email.
+        """
+        car_json = json.dumps(car_data, sort_keys=True)
+        photo_data, photo_name = photo if photo else (None, None)
+        if idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, recipient, car_data, photo, photo_name, status, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (idempotency_key, recipient_email, car_json, photo_data, photo_name, PENDING, now, now, now)
+            )
+            return self._db.execute("SELECT id FROM outbox WHERE idempotency_key = ?", (idempotency_key,)).fetchone()[0]
+
+    def claim(self) -> dict | None:
+        """Atomically take the next due job, marking it as sending."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, recipient, car_data, photo, photo_name, attempts FROM outbox "
+                    "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                    (PENDING, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?", (SENDING, now, row[0]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, recipient, car_json, photo_data, photo_name, attempts = row
+        return {
+            "id": job_id,
+            "recipient": recipient,
+            "car_data": json.loads(car_json),
+            "photo": (photo_data, photo_name) if photo_data is not None else None,
+            "attempts": attempts
+        }
+
+    def mark_sent(self, job_id: int):
+        """Record a successful delivery; the photo blob is dropped."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, photo = NULL, last_error = NULL, "
+                "updated_at = ? WHERE id = ?", (SENT, time.time(), job_id)
+            )
+
+    def mark_failed(self, job_id: int, error: str, permanent: bool = False) -> str:
+        """Schedule a retry with exponential backoff, or dead-letter the job. Returns the new status."""
+        now = time.time()
+        with self._lock:
+            attempts = self._db.execute("SELECT attempts FROM outbox WHERE id = ?", (job_id,)).fetchone()[0] + 1
+            if permanent or attempts >= self.max_attempts:
+                status, next_attempt_at = DEAD, now
+            else:
+                delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+                status, next_attempt_at = PENDING, now + delay * random.uniform(0.8, 1.2)
+            self._db.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                "WHERE id = ?", (status, attempts, next_attempt_at, error, now, job_id)
+            )
+        return status
+
+    def requeue_dead(self) -> int:
+        """Move all dead-lettered jobs back to pending; returns how many were moved."""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?",
+                (PENDING, time.time(), time.time(), DEAD)
+            ).rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Delete sent and dead jobs last updated more than `older_than` seconds ago; returns how many."""
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?", (SENT, DEAD, time.time() - older_than)
+            ).rowcount
+
+    def stats(self) -> dict:
+        """Return the number of jobs per status."""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {PENDING: 0, SENDING: 0, SENT: 0, DEAD: 0, **dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class EmailQueueWorker:
+    """Pool of background threads draining an EmailQueue."""
+
+    def __init__(self, queue: EmailQueue, workers: int = 2, poll_interval: float = 1.0, deliver=None,
+                 retention: float | None = None, purge_interval: float = 3600.0):
+        if deliver is None:
+            from src.email_sender import deliver_car_listing_email as deliver
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._deliver = deliver
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"email-queue-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} email queue workers")
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def run_once(self) -> bool:
+        """Deliver one due job; returns False when nothing was due."""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        try:
+            self._deliver(job["car_data"], job["recipient"], job["photo"])
+        except Exception as e:
+            status = self.queue.mark_failed(job["id"], str(e), permanent=isinstance(e, _PERMANENT_ERRORS))
+            log = logger.error if status == DEAD else logger.warning
+            log(f"Email job {job['id']} to {job['recipient']} failed (attempt {job['attempts'] + 1}, now {status}): {str(e)}")
+        else:
+            self.queue.mark_sent(job["id"])
+            logger.info(f"Email job {job['id']} delivered to {job['recipient']}")
+        return True
+
+    def purge_if_due(self) -> int:
+        """Purge old sent/dead jobs at most once per purge_interval (shared by all worker threads)."""
+        if self.retention is None or time.time() < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._next_purge = time.time() + self.purge_interval
+            purged = self.queue.purge(self.retention)
+            if purged:
+                logger.info(f"Purged {purged} sent/dead email jobs older than {self.retention:.0f}s")
+            return purged
+        finally:
+            self._purge_lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.purge_if_due()
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Email queue worker error: {str(e)}")
+                self._stop.wait(self.poll_interval)
+
+_queue = None
+_worker = None
+_queue_lock = threading.RLock()
+
+def get_email_queue(queue_config: EmailQueueConfig | None = None) -> EmailQueue:
+    """Return the process-wide outbound email queue."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                queue_config = queue_config or get_config().email_queue
+                _queue = EmailQueue(
+                    queue_config.path,
+                    max_attempts=queue_config.max_attempts,
+                    base_delay=queue_config.base_delay,
+                    max_delay=queue_config.max_delay
+                )
+    return _queue
+
+def start_email_queue_worker(queue_config: EmailQueueConfig | None = None) -> EmailQueueWorker:
+    """Start the background delivery workers (idempotent and cheap once they run)."""
+    global _worker
+    if _worker is not None:
+        return _worker
+    queue_config = queue_config or get_config().email_queue
+    with _queue_lock:
+        if _worker is None:
+            _worker = EmailQueueWorker(get_email_queue(queue_config), workers=queue_config.workers,
+                                       poll_interval=queue_config.poll_interval,
+                                       retention=queue_config.retention_days * 86400)
+            _worker.start()
+    return _worker
@@ -1,26 +1,31 @@
+import asyncio
 import smtplib
 import logging
 import os
-from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
+from email.policy import SMTP
 from pathlib import Path
 import mimetypes
-from src.config import setup_logging, load_config
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.config import get_config
+from src.smtp_pool import get_smtp_pool
+from src.image_payload import optimize_photo
+from src.metrics import stage
+from src.rendering import render_html_details, render_html_email, render_text_email
 
-# Configure logging
-setup_logging()
 logger = logging.getLogger(__name__)
 
 def get_smtp_config():
     """Get SMTP configuration from config.yaml."""
-    config = load_config()
+    smtp = get_config().smtp
     smtp_config = {
-        'smtp_server': config['smtp']['server'],
-        'smtp_port': config['smtp']['port'],
-        'username': config['smtp']['username'],
-        'password': config['smtp']['password']
+        'smtp_server': smtp.server,
+        'smtp_port': smtp.port,
+        'username': smtp.username,
+        'password': smtp.password
     }
     if not all(smtp_config.values()):
         raise ValueError("Missing SMTP configuration in config.yaml.")
@@ -28,74 +33,93 @@ def get_smtp_config():
 
 def format_car_details(car_data: dict) -> str:
     """Format car data into a simple HTML string."""
-    if not car_data or 'car' not in car_data:
-        return "<p>No car information available.</p>"
-    
-    car = car_data['car']
-    html = "<h2>Car Details</h2>\n<ul>\n"
-    html += f"<li><b>Brand:</b> {car.get('brand', 'Unknown')}</li>\n"
-    html += f"<li><b>Model:</b> {car.get('model', 'Unknown')}</li>\n"
-    html += f"<li><b>Manufactured Year:</b> {car.get('manufactured_year', 'Unknown')}</li>\n"
-    html += f"<li><b>Body Type:</b> {car.get('body_type', 'Unknown')}</li>\n"
-    html += f"<li><b>Color:</b> {car.get('color', 'Unknown')}</li>\n"
-    html += f"<li><b>Engine Size:</b> {car.get('motor_size_cc', 0):,} cc</li>\n"
-    html += f"<li><b>Windows:</b> {car.get('windows', 'Unknown')}</li>\n"
-    
-    # Tire information
-    tires = car.get('tires', {})
-    tire_info = tires.get('type', 'Unknown')
-    tire_year = tires.get('manufactured_year', 0)
-    if tire_year > 0:
-        tire_info += f" (Manufactured Year: {tire_year})"
-    html += f"<li><b>Tires:</b> {tire_info}</li>\n"
-    
-    # Price information
-    price = car.get('price')
-    estimated_price = car.get('estimated_price', {})
-    if price and isinstance(price, dict) and price.get('amount', 0) > 0:
-        html += f"<li><b>Price:</b> {price.get('amount', 0):,.2f} {price.get('currency', 'Unknown')}</li>\n"
-    elif estimated_price.get('amount', 0) > 0:
-        html += f"<li><b>Estimated Price:</b> {estimated_price.get('amount', 0):,.2f} {estimated_price.get('currency', 'Unknown')}</li>\n"
-    else:
-        html += "<li><b>Price:</b> Contact for details</li>\n"
-    
-    # Notices
-    notices = car.get('notices', [])
-    if notices:
-        html += "<li><b>Notices:</b><ul>\n"
-        for notice in notices:
-            if isinstance(notice, dict):
-                notice_type = notice.get('type', 'Notice')
-                description = notice.get('description', 'No details available')
-                html += f"<li>{notice_type}: {description}</li>\n"
-            else:
-                html += f"<li>{notice}</li>\n"
-        html += "</ul></li>\n"
-    
-    html += "</ul>\n"
-    return html
+    return render_html_details(car_data)
 
 def create_email_body(car_data: dict, include_photo: bool = False) -> str:
     """Create HTML email body."""
-    html = f"""
-    <html>
-    <body style="font-family: Arial; color: #333;">
-        <h1>Car Listing</h1>
-        <p>Sent on {datetime.now().strftime('%B %d, %Y')}</p>
-        {format_car_details(car_data)}
-        {"<p>Photo attached.</p>" if include_photo else ""}
-        <p>Contact us for more details.</p>
-    </body>
-    </html>
+    return render_html_email(car_data, include_photo=include_photo)
+
+def load_photo(photo_path: str | Path) -> tuple[bytes, str] | None:
+    """Read and optimize a photo attachment from disk, returning (data, filename) or None if missing."""
+    photo_path = str(Path(photo_path))
+    if not os.path.exists(photo_path):
+        logger.error(f"Image file not found: {photo_path}")
+        return None
+    with open(photo_path, "rb") as f:
+        return optimize_photo(f.read(), os.path.basename(photo_path))
+
+def build_car_listing_message(car_data: dict, sender: str, photo: tuple[bytes, str] | None = None) -> MIMEMultipart:
+    """Build the listing email (without a To header) with an optional (data, filename) photo attachment."""
+    with stage("email_build"):
+        return _build_car_listing_message(car_data, sender, photo)
+
+def _build_car_listing_message(car_data: dict, sender: str, photo: tuple[bytes, str] | None) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    # Create subject
+    car = car_data.get('car', {})
+    brand = car.get('brand', 'Unknown')
+    model = car.get('model', 'Unknown')
+    subject = f"Car Listing: {brand} {model}"
+    msg['Subject'] = subject
+    # Add plain-text and HTML bodies as alternatives
+    body = MIMEMultipart('alternative')
+    body.attach(MIMEText(render_text_email(car_data, include_photo=bool(photo)), 'plain'))
+    body.attach(MIMEText(create_email_body(car_data, include_photo=bool(photo)), 'html'))
+    msg.attach(body)
+
+    # Attach image if provided
+    if photo:
+        img_data, filename = photo
+        mime_type, _ = mimetypes.guess_type(filename)
+        if mime_type is None or not mime_type.startswith('image/'):
+            logger.warning(f"Could not guess MIME type for {filename}")
+            mime_type = 'image/jpeg' 
+        image = MIMEImage(img_data, name=filename, _subtype=mime_type.split('/')[1])
+        msg.attach(image)
+    return msg
+
+def parse_recipient(address: str) -> tuple[str, bytes] | None:
+    """
+    Parse one recipient address through the email header registry.
+    Args:
+        address (str): Address as given, e.g. "buyer@example.com" or "Buyer <buyer@example.com>".
+    Returns:
+        tuple[str, bytes] | None: (envelope address, folded "To" header), or None when it is
+        not exactly one valid address (including values that would inject CR/LF headers).
     """
-    return html
+    if not address or not isinstance(address, str) or '@' not in address:
+        return None
+    try:
+        name, header = SMTP.header_store_parse("To", address)
+    except ValueError:
+        return None
+    if header.defects or len(header.addresses) != 1 or not header.addresses[0].domain:
+        return None
+    return header.addresses[0].addr_spec, SMTP.fold_binary(name, header)
 
-def send_car_listing_email(car_data: dict, recipient_email: str, photo_path: str | Path = None) -> bool:
-    """Send car listing email with optional photo attachment."""
+def deliver_car_listing_email(car_data: dict, recipient_email: str, photo: tuple[bytes, str] | None = None):
+    """Build and send a listing email, raising on any failure (used by the outbound queue)."""
+    config = get_smtp_config()
+    msg = build_car_listing_message(car_data, config['username'], photo)
+    msg['To'] = recipient_email
+    get_smtp_pool().send_message(msg)
+
+def send_car_listing_email(car_data: dict, recipient_email: str, photo_path: str | Path = None, use_queue: bool = False,
+                           photo: tuple[bytes, str] | None = None, idempotency_key: str | None = None) -> bool:
+    """
+    Send car listing email with optional photo attachment.
+
+    The photo is either read from `photo_path` or passed in memory as a
+    (data, filename) `photo` pair, which avoids a disk round trip. With `use_queue`, the email is stored in the durable outbound queue and
+    delivered by the background worker; True then means "queued". Each call
+    queues a new email unless the caller passes the `idempotency_key` of an
+    earlier attempt of the same request.
+    """
     try:
         config = get_smtp_config()
         
-        if not recipient_email or '@' not in recipient_email:
+        if parse_recipient(recipient_email) is None:
             logger.error("Invalid recipient email address")
             return False
         
@@ -103,43 +127,23 @@ def send_car_listing_email(car_data: dict, recipient_email: str, photo_path: str
             logger.error("Invalid car data provided")
             return False
         
+        if photo is None and photo_path:
+            photo = load_photo(photo_path)
+            if photo is None:
+                return False
+
+        if use_queue:
+            from src.email_queue import get_email_queue
+            job_id = get_email_queue().enqueue(car_data, recipient_email, photo, idempotency_key)
+            logger.info(f"Email to {recipient_email} queued for delivery (job {job_id})")
+            return True
+
         # Create email message
-        msg = MIMEMultipart()
-        msg['From'] = config['username']
+        msg = build_car_listing_message(car_data, config['username'], photo)
         msg['To'] = recipient_email
-        # Create subject
-        car = car_data.get('car', {})
-        brand = car.get('brand', 'Unknown')
-        model = car.get('model', 'Unknown')
-        subject = f"Car Listing: {brand} {model}"
-        msg['Subject'] = subject
-        # Add HTML body
-        html_body = create_email_body(car_data, include_photo=bool(photo_path))
-        msg.attach(MIMEText(html_body, 'html'))
-
-        # Attach image if provided
-        if photo_path:
-            photo_path = str(Path(photo_path)) 
-            if not os.path.exists(photo_path):
-                logger.error(f"Image file not found: {photo_path}")
-                return False
-            
-            mime_type, _ = mimetypes.guess_type(photo_path)
-            if mime_type is None or not mime_type.startswith('image/'):
-                logger.warning(f"Could not guess MIME type for {photo_path}")
-                mime_type = 'image/jpeg' 
-            
-            with open(photo_path, "rb") as f:
-                img_data = f.read()
-            image = MIMEImage(img_data, name=os.path.basename(photo_path), _subtype=mime_type.split('/')[1])
-            msg.attach(image)
-
-        # Send email
-        logger.info(f"Connecting to SMTP server: {config['smtp_server']}:{config['smtp_port']}")
-        with smtplib.SMTP(config['smtp_server'], config['smtp_port']) as server:
-            server.starttls()
-            server.login(config['username'], config['password'])
-            server.send_message(msg)        
+
+        # Send email over a pooled, already authenticated session
+        get_smtp_pool().send_message(msg)
         logger.info(f"Email successfully sent to {recipient_email}")
         return True
     
@@ -155,3 +159,96 @@ def send_car_listing_email(car_data: dict, recipient_email: str, photo_path: str
     except Exception as e:
         logger.error(f"Unexpected error sending email: {str(e)}")
         return False
+
+def send_bulk_car_listing_email(car_data: dict, recipient_emails: list[str], photo_path: str | Path = None,
+                                bcc_chunk_size: int | None = None, photo: tuple[bytes, str] | None = None) -> dict:
+    """
+    Send one car listing to many recipients.
+
+    The message (body and encoded photo) is rendered and serialized once. Each
+    send only prepends its own To header, or, with `bcc_chunk_size`, addresses a
+    chunk of recipients as BCC. Sends are spread over the pooled SMTP sessions.
+    Args:
+        car_data (dict): Extracted car listing.
+        recipient_emails (list[str]): Recipient addresses.
+        photo_path (str | Path): Optional photo to attach.
+        bcc_chunk_size (int | None): If set, send one message per chunk of this many BCC recipients.
+        photo (tuple[bytes, str] | None): In-memory (data, filename) photo, used instead of `photo_path`.
+    Returns:
+        dict: Delivery report with per-recipient status and throughput stats.
+    """
+    started = time.perf_counter()
+    statuses = {}
+    valid = {}
+    for recipient in dict.fromkeys(recipient_emails):
+        parsed = parse_recipient(recipient)
+        if parsed is None:
+            statuses[recipient] = "invalid address"
+        else:
+            valid[recipient] = parsed
+
+    def report(messages: int) -> dict:
+        elapsed = time.perf_counter() - started
+        sent = sum(1 for status in statuses.values() if status == "sent")
+        return {
+            "sent": sent,
+            "failed": len(statuses) - sent,
+            "messages": messages,
+            "elapsed_seconds": elapsed,
+            "recipients_per_second": sent / elapsed if elapsed > 0 else 0.0,
+            "recipients": statuses
+        }
+
+    try:
+        if not car_data or not isinstance(car_data, dict):
+            raise ValueError("Invalid car data provided")
+        config = get_smtp_config()
+        if photo is None and photo_path:
+            photo = load_photo(photo_path)
+            if photo is None:
+                raise FileNotFoundError(f"Image file not found: {photo_path}")
+        msg = build_car_listing_message(car_data, config['username'], photo)
+        pool = get_smtp_pool()
+    except Exception as e:
+        logger.error(f"Bulk send aborted: {str(e)}")
+        statuses.update({recipient: f"failed: {str(e)}" for recipient in valid})
+        return report(0)
+
+    sender = config['username']
+    # smtplib only normalizes line endings for str payloads, so serialize with CRLF
+    payload = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+    if bcc_chunk_size:
+        # Recipients are only on the envelope; the visible To is the sender
+        header = SMTP.fold_binary(*SMTP.header_store_parse("To", sender))
+        recipients = list(valid)
+        batches = [(recipients[i:i + bcc_chunk_size], header) for i in range(0, len(recipients), bcc_chunk_size)]
+    else:
+        batches = [([recipient], header) for recipient, (_, header) in valid.items()]
+
+    def deliver(batch):
+        recipients, header = batch
+        envelope = [(recipient, valid[recipient][0]) for recipient in recipients]
+        try:
+            refused = pool.sendmail(sender, list(dict.fromkeys(a for _, a in envelope)), header + payload)
+            return {r: (f"refused: {refused[a]}" if a in refused else "sent") for r, a in envelope}
+        except smtplib.SMTPRecipientsRefused as e:
+            return {r: f"refused: {e.recipients.get(a, 'rejected')}" for r, a in envelope}
+        except Exception as e:
+            return {r: f"failed: {str(e)}" for r in recipients}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(pool.size, len(batches)))) as executor:
+        for result in executor.map(deliver, batches):
+            statuses.update(result)
+
+    summary = report(len(batches))
+    logger.info(
+        f"Bulk send completed: {summary['sent']} sent, {summary['failed']} failed in "
+        f"{summary['elapsed_seconds']:.2f}s ({summary['recipients_per_second']:.1f} recipients/s)"
+    )
+    return summary
+
+async def asend_car_listing_email(car_data: dict, recipient_email: str, photo_path: str | Path = None, use_queue: bool = False,
+                                  photo: tuple[bytes, str] | None = None, idempotency_key: str | None = None) -> bool:
+    """Send a car listing email without blocking the event loop (SMTP runs in a worker thread)."""
+    return await asyncio.to_thread(send_car_listing_email, car_data, recipient_email, photo_path, use_queue, photo,
+                                   idempotency_key)
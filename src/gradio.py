@@ -1,31 +1,22 @@
-import gradio as gr
+import asyncio
 import re
-from pathlib import Path
-from langchain_openai import AzureChatOpenAI 
-import uuid
 import logging
-from src.text_processor import process_text
-from src.email_sender import send_car_listing_email
-from src.image_classifier import classify_car_image
-from src.config import setup_logging, load_config
+from src.text_processor import astream_text, warm_up_extraction
+from src.email_sender import asend_car_listing_email
+from src.image_classifier import aclassify_car_image, get_classifier_backend
+from src.image_payload import encode_image
+from src.email_queue import start_email_queue_worker
+from src.llm_client import get_llm
+from src.rendering import render_markdown_summary
+from src.config import setup_logging, get_config
+from src.metrics import mount_metrics, stage
 
-# Configure logging
-setup_logging()
 logger = logging.getLogger(__name__)
 
 def initialize_llm():
-    """Initialize the Azure OpenAI LLM with error handling using LangChain."""
+    """Return the shared Azure OpenAI LLM client with error handling using LangChain."""
     try:
-        config = load_config()
-        llm_config = config['llm']
-        
-        llm = AzureChatOpenAI(
-            deployment_name=llm_config['deployment_name'],
-            azure_endpoint=llm_config['azure_endpoint'],
-            openai_api_version=llm_config['api_version'],
-            api_key=llm_config['api_key'],
-            temperature=llm_config['temperature']
-        )
+        llm = get_llm()
         return llm, "Azure OpenAI GPT-4o-mini configured successfully via LangChain"
     except Exception as e:
         return None, f"Error initializing LLM: {str(e)}"
@@ -54,109 +45,104 @@ def validate_email(email):
     
     return True, "Valid email"
 
-def process_and_send(car_description, receiver_email, car_image):
-    """Main function to process car description and send email."""
+async def classify_upload(car_image):
+    """Encode an upload for attachment and detect its body type; returns (photo, body_type)."""
+    # The upload is encoded once in memory for the attachment; the
+    # classifier works on the already decoded PIL image
+    image = await asyncio.to_thread(encode_image, car_image)
+    try:
+        detected_body_type = await aclassify_car_image(car_image)
+        photo = await asyncio.to_thread(image.as_attachment)
+    finally:
+        image.cleanup()
+    return photo, detected_body_type
+
+async def process_and_send(car_description, receiver_email, car_image):
+    """
+    Main function to process car description and send email.
+
+    This is an async generator: it yields (status, details) updates so the
+    summary fills in while the extraction streams, followed by the detected
+    body type and the email status.
+    """
     # Initialize LLM
     llm, llm_status = initialize_llm()
     if not llm:
-        return llm_status, ""
+        yield llm_status, ""
+        return
     
     # Input validation
     if not car_description or not car_description.strip():
-        return "Error: Car description is required!", ""
+        yield "Error: Car description is required!", ""
+        return
     
     if not receiver_email or not receiver_email.strip():
-        return "Error: Receiver email is required!", ""
+        yield "Error: Receiver email is required!", ""
+        return
     
     is_valid_email, email_message = validate_email(receiver_email)
     if not is_valid_email:
-        return f"Error: {email_message}", ""
+        yield f"Error: {email_message}", ""
+        return
     
-    temp_image_path = None
-    try:
-        car_data = process_text(car_description, llm)
+    with stage("request"):
+        classification = None
+        try:
+            # Image classification runs concurrently with the streamed extraction
+            if car_image is not None:
+                classification = asyncio.create_task(classify_upload(car_image))
+            yield "Extracting car details...", ""
+            car_data = None
+            async for car_data in astream_text(car_description, llm):
+                if car_data and 'car' in car_data:
+                    yield "Extracting car details...", generate_car_details_summary(car_data['car'])
         
-        if not car_data or 'car' not in car_data:
-            return "Failed to process car description. Please try again.", ""
+            if not car_data or 'car' not in car_data:
+                yield "Failed to process car description. Please try again.", ""
+                return
+            car_details = generate_car_details_summary(car_data['car'])
         
-        # Process image if uploaded
-        config = load_config()
-        temp_dir = Path(config['application']['temp_directory'])
-        temp_dir.mkdir(exist_ok=True)
-        allowed_formats = config['application']['allowed_image_formats']
-        if car_image is not None:
-            # Get original image extension (if available) or default to .jpg
-            try:
-                image_format = car_image.format.lower() if car_image.format else 'jpg'
-                extension = f".{image_format}" if image_format in allowed_formats else '.jpg'
-            except AttributeError:
-                extension = '.jpg'
-            
-            unique_filename = f"car_image_{uuid.uuid4().hex}{extension}"
-            temp_image_path = temp_dir / unique_filename
-            car_image.save(temp_image_path)
-            
-            # Classify image
-            detected_body_type = classify_car_image(temp_image_path)
-            if detected_body_type and detected_body_type != 'Unknown':
-                car_data['car']['body_type'] = detected_body_type
+            photo = None
+            if classification is not None:
+                yield "Detecting body type from the photo...", car_details
+                photo, detected_body_type = await classification
+                classification = None
+                if detected_body_type and detected_body_type != 'Unknown':
+                    car_data['car']['body_type'] = detected_body_type
+                    car_details = generate_car_details_summary(car_data['car'])
         
-        # Send email
-        email_sent = send_car_listing_email(car_data=car_data, recipient_email=receiver_email, photo_path=temp_image_path)
-        if email_sent:
-            car_details = generate_car_details_summary(car_data['car'])
-            return "Email sent successfully to: " + receiver_email, car_details
-        else:
-            return "Failed to send email. Please check your SMTP configuration.", ""
+            # Send email (or hand it to the outbound queue)
+            use_queue = get_config().email_queue.enabled
+            if use_queue:
+                # The queue may have been enabled by a config reload after startup
+                start_email_queue_worker()
+            yield ("Queueing email..." if use_queue else "Sending email..."), car_details
+            email_sent = await asend_car_listing_email(car_data=car_data, recipient_email=receiver_email, use_queue=use_queue, photo=photo)
+            if email_sent:
+                if use_queue:
+                    yield "Email queued for delivery to: " + receiver_email, car_details
+                else:
+                    yield "Email sent successfully to: " + receiver_email, car_details
+            else:
+                yield "Failed to send email. Please check your SMTP configuration.", ""
             
-    except Exception as e:
-        return f"An error occurred: {str(e)}", ""
-    finally:
-        if temp_image_path and temp_image_path.exists():
-                temp_image_path.unlink()
+        except Exception as e:
+            yield f"An error occurred: {str(e)}", ""
+        finally:
+            if classification is not None:
+                classification.cancel()
 
 def generate_car_details_summary(car_info):
     """Generate a formatted summary of car details."""
-    summary = "## 📋 Processed Car Details\n\n"
-    # Basic information
-    summary += f"• **Brand:** {car_info.get('brand', 'Unknown')}\n\n"
-    summary += f"• **Model:** {car_info.get('model', 'Unknown')}\n\n"
-    summary += f"• **Color:** {car_info.get('color', 'Unknown')}\n\n"
-    summary += f"• **Engine Size:** {car_info.get('motor_size_cc', 0):,} cc\n\n"
-    summary += f"• **Windows:** {car_info.get('windows', 'Unknown')}\n\n"
-    # Tire information
-    tires = car_info.get('tires', {})
-    tire_info = tires.get('type', 'Unknown')
-    tire_year = tires.get('manufactured_year', 0)
-    if tire_year > 0:
-        tire_info += f" (Manufacturing Year: {tire_year})"
-    summary += f"• **Tires:** {tire_info}\n\n"
-    # Price information
-    price = car_info.get('price')
-    estimated_price = car_info.get('estimated_price')
-    
-    if price and price.get('amount', 0) > 0:
-        summary += f"• **Price:** {price.get('amount', 0):,.2f} {price.get('currency', 'Unknown')}\n\n"
-    elif estimated_price and estimated_price.get('amount', 0) > 0:
-        summary += f"• **Estimated Price:** {estimated_price.get('amount', 0):,.2f} {estimated_price.get('currency', 'Unknown')}\n\n"
-    else:
-        summary += "• **Price:** Contact for details\n\n"
-    # Show notices if any
-    notices = car_info.get('notices', [])
-    if notices:
-        summary += "## Important Notices\n\n"
-        for i, notice in enumerate(notices, 1):
-            if isinstance(notice, dict):
-                summary += f"• **{notice.get('type', 'Notice')}:** {notice.get('description', 'No details available')}\n\n"
-            else:
-                summary += f"• {str(notice)}\n\n"
-    return summary
+    return render_markdown_summary(car_info)
 
 def create_interface():
     """Create and configure the Gradio interface."""
+    # Imported here so that importing this module (tests, bulk runs) does not load the UI stack
+    import gradio as gr
+
     # Load config for Gradio settings
-    config = load_config()
-    gradio_config = config['gradio']
+    gradio_config = get_config().gradio
     
     # Custom CSS for better styling
     custom_css = """
@@ -175,7 +161,7 @@ def create_interface():
     }
     """
     
-    with gr.Blocks(title="AutoLister360", theme=gradio_config['theme'], css=custom_css) as interface:
+    with gr.Blocks(title="AutoLister360", theme=gradio_config.theme, css=custom_css) as interface:
         
         # Header
         gr.HTML("""
@@ -249,15 +235,36 @@ def create_interface():
 
 def main():
     """Launch the Gradio application."""
-    config = load_config()
-    gradio_config = config['gradio']
+    setup_logging()
+    gradio_config = get_config().gradio
+    # Build the pooled LLM client once at startup instead of on the first request
+    llm, llm_status = initialize_llm()
+    logger.info(llm_status)
+    if llm is not None:
+        warm_up_extraction(llm)
+    if get_config().email_queue.enabled:
+        start_email_queue_worker()
+    if get_config().classifier.warmup:
+        try:
+            get_classifier_backend().warmup()
+        except Exception as e:
+            logger.error(f"Classifier warmup failed: {str(e)}")
     interface = create_interface()
+    # Handlers are async, so concurrency can be raised without adding worker threads
+    interface.queue(default_concurrency_limit=gradio_config.concurrency_limit)
+    metrics_config = get_config().metrics
     interface.launch(
-        share=gradio_config['share'],
-        server_name=gradio_config['server_name'],
-        server_port=gradio_config['server_port'],
-        show_error=True
+        share=gradio_config.share,
+        server_name=gradio_config.server_name,
+        server_port=gradio_config.server_port,
+        show_error=True,
+        prevent_thread_lock=metrics_config.enabled
     )
+    if metrics_config.enabled:
+        # The FastAPI app only exists once launched; serve metrics next to the UI
+        mount_metrics(interface.app, metrics_config.path)
+        logger.info(f"Prometheus metrics available at {metrics_config.path}")
+        interface.block_thread()
 
 if __name__ == "__main__":
     main()
@@ -1,28 +1,238 @@
+import asyncio
+import io
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import random
-from src.config import setup_logging
+from PIL import Image
+from src.cache import PerceptualHashCache, make_cache_key
+from src.config import get_config, ClassifierConfig, PerceptualCacheSettings
+from src.metrics import stage
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
-def classify_car_image(image_path: str | Path) -> str:
+ImageInput = str | Path | bytes | memoryview | Image.Image
+
+def load_image(image: ImageInput) -> Image.Image:
+    """Open an image path or encoded buffer (or pass through a PIL image) as RGB."""
+    if isinstance(image, Image.Image):
+        return image.convert("RGB") if image.mode != "RGB" else image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = io.BytesIO(image)
+    with Image.open(image) as opened:
+        return opened.convert("RGB")
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash of an image.
+
+    The image is shrunk to 9x8 grayscale and each bit records whether a pixel
+    is brighter than its right neighbour. Re-encoded, resized or slightly
+    edited copies of a photo get hashes only a few bits apart.
+    """
+    small = image.resize((9, 8), Image.Resampling.BOX, reducing_gap=2.0).convert("L")
+    pixels = small.tobytes()
+    image_hash = 0
+    for row in range(0, 72, 9):
+        for col in range(row, row + 8):
+            image_hash = (image_hash << 1) | (pixels[col] > pixels[col + 1])
+    return image_hash
+
+class ClassifierBackend:
+    """Interface for car body type classifiers."""
+
+    def predict(self, images: list[ImageInput]) -> list[str]:
+        """Return one body type label per image."""
+        raise NotImplementedError
+
+    def warmup(self):
+        """Load the model and run a first inference so later requests are fast."""
+
+class RandomBackend(ClassifierBackend):
     """
-    Dummy function to simulate car body type detection from an image.
-    Returns a random car body type from ['Sedan', 'SUV', 'Truck'].
+    Dummy backend simulating car body type detection.
+    Returns a random car body type from the configured labels.
+    """
+
+    def __init__(self, labels: list[str]):
+        self.labels = list(labels)
+
+    def predict(self, images: list[ImageInput]) -> list[str]:
+        return [random.choice(self.labels) for _ in images]
+
+class OnnxBackend(ClassifierBackend):
+    """
+    CPU body type classifier running a small CNN exported to ONNX.
+
+    The onnxruntime session is created lazily on first use (or by warmup())
+    and then kept for the life of the process. Decoding and resizing run on a
+    thread pool, and the resulting batch goes through a single session.run call.
+    """
+
+    def __init__(self, model_path: str | Path, labels: list[str], input_size: int = 224,
+                 mean: tuple[float, ...] = (0.485, 0.456, 0.406), std: tuple[float, ...] = (0.229, 0.224, 0.225),
+                 batch_size: int = 16, preprocess_workers: int = 4, intra_op_threads: int = 0):
+        self.model_path = Path(model_path)
+        self.labels = list(labels)
+        self.input_size = input_size
+        self.mean = mean
+        self.std = std
+        self.batch_size = batch_size
+        self.intra_op_threads = intra_op_threads
+        self._executor = ThreadPoolExecutor(max_workers=preprocess_workers, thread_name_prefix="classifier-preprocess")
+        self._session = None
+        self._input_name = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._session is not None:
+            return self._session
+        with self._lock:
+            if self._session is None:
+                try:
+                    import onnxruntime
+                except ImportError as e:
+                    raise RuntimeError("onnxruntime is required for the 'onnx' classifier backend") from e
+                if not self.model_path.exists():
+                    raise FileNotFoundError(f"Classifier model not found: {self.model_path}")
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = self.intra_op_threads
+                session = onnxruntime.InferenceSession(str(self.model_path), options, providers=["CPUExecutionProvider"])
+                self._input_name = session.get_inputs()[0].name
+                self._session = session
+                logger.info(f"Loaded body type classifier from {self.model_path}")
+        return self._session
+
+    def _preprocess(self, image: ImageInput):
+        import numpy as np
+        image = load_image(image)
+        # reducing_gap lets Pillow shrink by an integer factor with reduce() before resampling
+        image = image.resize((self.input_size, self.input_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        array = np.asarray(image, dtype=np.float32) / 255.0
+        array = (array - np.asarray(self.mean, dtype=np.float32)) / np.asarray(self.std, dtype=np.float32)
+        return array.transpose(2, 0, 1)
+
+    def warmup(self):
+        self.predict([Image.new("RGB", (self.input_size, self.input_size))])
+
+    def predict(self, images: list[ImageInput]) -> list[str]:
+        import numpy as np
+        session = self._load()
+        labels = []
+        for start in range(0, len(images), self.batch_size):
+            batch = np.stack(list(self._executor.map(self._preprocess, images[start:start + self.batch_size])))
+            logits = session.run(None, {self._input_name: batch})[0]
+            labels.extend(self.labels[index] for index in logits.argmax(axis=1))
+        return labels
+
+_BACKENDS = {
+    "stub": lambda config: RandomBackend(config.labels),
+    "onnx": lambda config: OnnxBackend(
+        config.model_path,
+        config.labels,
+        input_size=config.input_size,
+        batch_size=config.batch_size,
+        preprocess_workers=config.preprocess_workers,
+        intra_op_threads=config.intra_op_threads
+    ),
+}
+
+_backend = None
+_backend_settings = None
+_backend_lock = threading.Lock()
+
+def get_classifier_backend(classifier_config: ClassifierConfig | None = None) -> ClassifierBackend:
+    """Return the shared classifier backend for the current config."""
+    global _backend, _backend_settings
+    classifier_config = classifier_config or get_config().classifier
+    if classifier_config == _backend_settings:
+        return _backend
+    with _backend_lock:
+        if classifier_config != _backend_settings:
+            if classifier_config.backend not in _BACKENDS:
+                raise ValueError(f"Unknown classifier backend: {classifier_config.backend}")
+            _backend = _BACKENDS[classifier_config.backend](classifier_config)
+            _backend_settings = classifier_config
+        return _backend
+
+_cache = None
+_cache_settings = None
+_cache_lock = threading.Lock()
+
+def get_classification_cache() -> PerceptualHashCache | None:
+    """Return the perceptual-hash result cache for the current config, or None if disabled."""
+    global _cache, _cache_settings
+    config = get_config()
+    settings: tuple[PerceptualCacheSettings, ClassifierConfig] = (config.cache.classification, config.classifier)
+    if settings == _cache_settings:
+        return _cache
+    with _cache_lock:
+        if settings != _cache_settings:
+            if _cache is not None:
+                _cache.close()
+            cache_settings, classifier_config = settings
+            _cache = PerceptualHashCache(
+                "classification",
+                # Predictions are only reusable for the same model and labels
+                namespace=make_cache_key(classifier_config.backend, classifier_config.model_path,
+                                         classifier_config.labels, classifier_config.input_size),
+                max_entries=cache_settings.max_entries,
+                max_distance=cache_settings.max_distance,
+                persist_path=cache_settings.persist_path,
+                max_disk_entries=cache_settings.max_disk_entries
+            ) if cache_settings.enabled else None
+            _cache_settings = settings
+        return _cache
+
+def classify_car_images(images: list[ImageInput]) -> list[str]:
+    """
+    Detect car body types for a batch of images.
+
+    Images whose perceptual hash matches (or nearly matches) an earlier photo
+    reuse its prediction; only the rest are sent to the model.
     Args:
-        image_path (str | Path): Path to the car image.
+        images (list[str | Path | bytes | Image.Image]): Image paths, encoded images or PIL images.
     Returns:
-        str: Random car body type ('Sedan', 'SUV', or 'Truck').
+        list[str]: Body type per image ('Unknown' for all images if classification fails).
     """
     try:
-        image_path = str(Path(image_path))
-        logger.info(f"Simulating car body type detection for image: {image_path}")
+        with stage("classification"):
+            backend = get_classifier_backend()
+            cache = get_classification_cache()
+            if cache is None:
+                with stage("classification_model"):
+                    return backend.predict(images)
+            # Decode once; the same image is hashed and, on a miss, classified
+            loaded = [load_image(image) for image in images]
+            hashes = [dhash(image) for image in loaded]
+            labels = [cache.get(image_hash) for image_hash in hashes]
+            missing = [i for i, label in enumerate(labels) if label is None]
+            if missing:
+                with stage("classification_model"):
+                    predicted = backend.predict([loaded[i] for i in missing])
+                for i, label in zip(missing, predicted):
+                    labels[i] = label
+                    cache.set(hashes[i], label)
+            else:
+                logger.info(f"Returning cached body types for {len(images)} images")
+            return labels
+    except Exception as e:
+        logger.error(f"Error in image classification: {str(e)}")
+        return ['Unknown'] * len(images)
 
-        # Randomly select a body type
-        body_types = ['Sedan', 'SUV', 'Truck']
-        return random.choice(body_types)
+def classify_car_image(image_path: ImageInput) -> str:
+    """
+    Detect the car body type from an image.
+    Args:
+        image_path (str | Path | bytes | Image.Image): Path to the car image, its encoded bytes, or the image itself.
+    Returns:
+        str: Detected body type (e.g. 'Sedan', 'SUV', 'Truck'), or 'Unknown' on error.
+    """
+    if isinstance(image_path, (str, Path)):
+        logger.info(f"Detecting car body type for image: {image_path}")
+    return classify_car_images([image_path])[0]
 
-    except Exception as e:
-        logger.error(f"Error in dummy image classification: {str(e)}")
-        return 'Unknown'
\ No newline at end of file
+async def aclassify_car_image(image_path: ImageInput) -> str:
+    """Classify a car image without blocking the event loop."""
+    return await asyncio.to_thread(classify_car_image, image_path)
@@ -0,0 +1,158 @@
+import io
+import logging
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from PIL import Image, ImageOps
+from src.config import get_config, ApplicationConfig, ImageOptimizationConfig
+from src.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Pillow writer names for the extensions we accept
+_SAVE_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "gif": "GIF", "webp": "WEBP"}
+_EXIF_ORIENTATION = 0x0112
+
+@dataclass
+class ImagePayload:
+    """
+    An uploaded image encoded once for attachment.
+
+    Small images stay in memory as `data`. Images above the spill threshold
+    are written to the temp directory instead, and `path` is set.
+    """
+    filename: str
+    data: bytes | None = None
+    path: Path | None = None
+
+    @property
+    def source(self) -> bytes | Path:
+        """The encoded image as accepted by the classifier (bytes, or the spill file)."""
+        return self.data if self.data is not None else self.path
+
+    def read(self) -> bytes:
+        """Return the encoded image bytes, reading the spill file if needed."""
+        if self.data is not None:
+            return self.data
+        return self.path.read_bytes()
+
+    def as_attachment(self) -> tuple[bytes, str]:
+        """Return the (data, filename) pair used for email attachments."""
+        return self.read(), self.filename
+
+    def cleanup(self):
+        """Remove the spill file, if any."""
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+def _target_size(size: tuple[int, int], optimization: ImageOptimizationConfig) -> tuple[int, int]:
+    width, height = size
+    scale = min(optimization.max_width / width, optimization.max_height / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def optimize_image(image: Image.Image, optimization: ImageOptimizationConfig) -> Image.Image:
+    """
+    Orient and downscale a photo to fit the configured maximum dimensions.
+
+    Returns a new image when anything changes. A JPEG that has not been decoded
+    yet is drafted in place first, so libjpeg decodes it directly at a reduced
+    scale; already loaded images are left untouched.
+    """
+    target = _target_size(image.size, optimization)
+    if target != image.size:
+        image.draft("RGB", target)
+    if image.getexif().get(_EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+        target = _target_size(image.size, optimization)
+    if target != image.size:
+        # reducing_gap shrinks by an integer factor with reduce() before the LANCZOS pass
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return image
+
+def _output_format(image: Image.Image, app_config: ApplicationConfig, optimization: ImageOptimizationConfig) -> str:
+    if optimization.enabled and optimization.format != "keep":
+        return optimization.format
+    # Keep the original format when allowed, otherwise fall back to JPEG
+    extension = (image.format or "jpg").lower()
+    if extension not in app_config.allowed_image_formats or extension not in _SAVE_FORMATS:
+        extension = "jpg"
+    return extension
+
+def _encode(image: Image.Image, extension: str, optimization: ImageOptimizationConfig) -> bytes:
+    save_format = _SAVE_FORMATS[extension]
+    params = {}
+    if optimization.enabled:
+        if save_format in ("JPEG", "WEBP"):
+            params["quality"] = optimization.quality
+        if save_format == "JPEG":
+            params["optimize"] = True
+        # Pillow only writes EXIF when it is passed explicitly
+        if not optimization.strip_exif and image.info.get("exif"):
+            params["exif"] = image.info["exif"]
+    if save_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=save_format, **params)
+    return buffer.getvalue()
+
+def optimize_photo(data: bytes, filename: str, optimization: ImageOptimizationConfig | None = None,
+                   app_config: ApplicationConfig | None = None) -> tuple[bytes, str]:
+    """
+    Optimize an encoded photo for attachment.
+    Args:
+        data (bytes): The encoded photo.
+        filename (str): Its attachment filename.
+        optimization (ImageOptimizationConfig): Settings (defaults to the current config).
+        app_config (ApplicationConfig): Settings for allowed formats (defaults to the current config).
+    Returns:
+        tuple[bytes, str]: The (data, filename) to attach; the input is returned unchanged when
+        optimization is disabled, the photo cannot be decoded, or re-encoding would not help.
+    """
+    optimization = optimization or get_config().image_optimization
+    app_config = app_config or get_config().application
+    if not optimization.enabled:
+        return data, filename
+    try:
+        with stage("image_optimize"), Image.open(io.BytesIO(data)) as image:
+            has_exif = bool(image.info.get("exif"))
+            original_size = image.size
+            optimized = optimize_image(image, optimization)
+            resized = optimized.size != original_size
+            extension = _output_format(image, app_config, optimization)
+            encoded = _encode(optimized, extension, optimization)
+    except Exception as e:
+        logger.warning(f"Could not optimize photo {filename}: {str(e)}")
+        return data, filename
+    # An already small, compressed photo can grow when re-encoded; keep it unless EXIF must go
+    if len(encoded) >= len(data) and not resized and not (has_exif and optimization.strip_exif):
+        return data, filename
+    return encoded, f"{Path(filename).stem}.{extension}"
+
+def encode_image(image: Image.Image, app_config: ApplicationConfig | None = None,
+                 optimization: ImageOptimizationConfig | None = None) -> ImagePayload:
+    """
+    Optimize and encode a PIL image once into an in-memory payload.
+    Args:
+        image (PIL.Image.Image): The uploaded image (not modified).
+        app_config (ApplicationConfig): Settings for allowed formats and spilling (defaults to the current config).
+        optimization (ImageOptimizationConfig): Resize/recompress settings (defaults to the current config).
+    Returns:
+        ImagePayload: The encoded image, spilled to disk only above `image_spill_bytes`.
+    """
+    app_config = app_config or get_config().application
+    optimization = optimization or get_config().image_optimization
+    extension = _output_format(image, app_config, optimization)
+    with stage("image_encode"):
+        if optimization.enabled:
+            image = optimize_image(image, optimization)
+        data = _encode(image, extension, optimization)
+    filename = f"car_image_{uuid.uuid4().hex}.{extension}"
+    if len(data) <= app_config.image_spill_bytes:
+        return ImagePayload(filename, data=data)
+
+    temp_dir = Path(app_config.temp_directory)
+    temp_dir.mkdir(exist_ok=True)
+    path = temp_dir / filename
+    path.write_bytes(data)
+    logger.info(f"Image of {len(data)} bytes spilled to {path}")
+    return ImagePayload(filename, path=path)
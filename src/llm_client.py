@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING
+from src.config import get_config, LlmConfig, LlmPoolConfig
+from src.llm_router import Deployment, LLMRouter
+from src.text_processor import discard_extraction_chains
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import AzureChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+class LLMClientRegistry:
+    """
+    Thread-safe registry of long-lived AzureChatOpenAI clients.
+
+    One client is kept per deployment (endpoint, deployment, api version, key,
+    temperature). Deployments on the same endpoint share one pooled, keep-alive
+    HTTP connection pool, so TLS handshakes are paid once per connection
+    rather than once per listing. When a config reload changes a deployment's
+    settings, its old client is dropped, along with connection pools no client
+    uses any more. They are not closed: requests already running on other
+    threads (bulk workers, router hedges) may still hold the old client, and
+    the connections are released once the last of them is garbage-collected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: dict[tuple, "AzureChatOpenAI"] = {}
+        self._http_clients: dict[tuple, "httpx.Client"] = {}
+        self._async_http_clients: dict[tuple, "httpx.AsyncClient"] = {}
+        # Keeps tasks closing async pools from being garbage collected mid-close
+        self._closing: set[asyncio.Task] = set()
+
+    def get(self, llm_config: LlmConfig) -> "AzureChatOpenAI":
+        """Return the shared client for a deployment, creating it on first use."""
+        key = (
+            llm_config.azure_endpoint,
+            llm_config.deployment_name,
+            llm_config.api_version,
+            llm_config.api_key,
+            llm_config.temperature,
+            llm_config.pool,
+        )
+        llm = self._clients.get(key)
+        if llm is not None:
+            return llm
+        with self._lock:
+            llm = self._clients.get(key)
+            if llm is None:
+                # Same endpoint and deployment with other settings: the old client is stale
+                stale = [k for k in self._clients if k[:2] == key[:2]]
+                for stale_key in stale:
+                    discard_extraction_chains(self._clients.pop(stale_key))
+                llm = self._create(llm_config)
+                self._clients[key] = llm
+                if stale:
+                    logger.info(f"Replaced LLM client for deployment '{llm_config.deployment_name}' after a settings change")
+                    self._drop_unused_pools()
+            return llm
+
+    def _pool_key(self, key: tuple) -> tuple:
+        """Connection pool (endpoint, pool settings) of the client stored under `key`."""
+        return key[0], key[5]
+
+    def _drop_unused_pools(self):
+        used = {self._pool_key(key) for key in self._clients}
+        for pool_key in [pool_key for pool_key in self._http_clients if pool_key not in used]:
+            del self._http_clients[pool_key]
+            del self._async_http_clients[pool_key]
+
+    def _aclose(self, clients: list["httpx.AsyncClient"]):
+        """Close async HTTP clients, on the running event loop if called from one."""
+        if not clients:
+            return
+
+        async def aclose_all():
+            for client in clients:
+                try:
+                    await client.aclose()
+                except Exception as e:
+                    logger.warning(f"Closing an async LLM connection pool failed: {str(e)}")
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(aclose_all())
+            return
+        task = loop.create_task(aclose_all())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _create(self, llm_config: LlmConfig) -> "AzureChatOpenAI":
+        # Imported here: httpx and langchain_openai dominate import time otherwise
+        import httpx
+        from langchain_openai import AzureChatOpenAI
+
+        pool = llm_config.pool
+        pool_key = (llm_config.azure_endpoint, pool)
+        if pool_key not in self._http_clients:
+            limits = httpx.Limits(
+                max_connections=pool.max_connections,
+                max_keepalive_connections=pool.max_keepalive_connections,
+                keepalive_expiry=pool.keepalive_expiry,
+            )
+            timeout = httpx.Timeout(pool.timeout, connect=pool.connect_timeout)
+            self._http_clients[pool_key] = httpx.Client(limits=limits, timeout=timeout)
+            self._async_http_clients[pool_key] = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        logger.info(
+            f"Creating LLM client for deployment '{llm_config.deployment_name}' "
+            f"(max_connections={pool.max_connections}, keepalive={pool.max_keepalive_connections})"
+        )
+        return AzureChatOpenAI(
+            deployment_name=llm_config.deployment_name,
+            azure_endpoint=llm_config.azure_endpoint,
+            openai_api_version=llm_config.api_version,
+            api_key=llm_config.api_key,
+            temperature=llm_config.temperature,
+            max_retries=pool.max_retries,
+            timeout=pool.timeout,
+            http_client=self._http_clients[pool_key],
+            http_async_client=self._async_http_clients[pool_key],
+        )
+
+    def close(self):
+        """Close all pooled HTTP connections (sync and async) and forget the cached clients."""
+        with self._lock:
+            for client in self._http_clients.values():
+                client.close()
+            self._aclose(list(self._async_http_clients.values()))
+            for llm in self._clients.values():
+                discard_extraction_chains(llm)
+            self._clients.clear()
+            self._http_clients.clear()
+            self._async_http_clients.clear()
+
+_registry = LLMClientRegistry()
+_router = None
+_router_settings = None
+_router_lock = threading.Lock()
+
+def get_router(llm_config: LlmConfig) -> LLMRouter:
+    """Return the shared router over `llm_config.deployments`, rebuilt (with fresh breakers) when they change."""
+    global _router, _router_settings
+    if llm_config == _router_settings:
+        return _router
+    with _router_lock:
+        if llm_config != _router_settings:
+            if _router is not None:
+                _router.close()
+                discard_extraction_chains(_router)
+            deployments = [Deployment(name, weight, _registry.get(deployment_config), llm_config.routing)
+                           for name, weight, deployment_config in llm_config.routed_deployments()]
+            _router = LLMRouter(deployments, llm_config.routing, llm_config.temperature,
+                                max_workers=llm_config.pool.max_connections)
+            _router_settings = llm_config
+            logger.info(f"Routing LLM calls across {len(deployments)} deployments: "
+                        + ", ".join(f"{d.name} (weight {d.weight:g})" for d in deployments))
+        return _router
+
+def get_llm(llm_config: LlmConfig | None = None) -> "AzureChatOpenAI | LLMRouter":
+    """
+    Return the shared LLM client for the given (default: configured) settings.
+    With llm.deployments configured this is a router that balances and fails over across them.
+    """
+    llm_config = llm_config or get_config().llm
+    if llm_config.deployments:
+        return get_router(llm_config)
+    return _registry.get(llm_config)
+
+def close_llm_clients():
+    """Release pooled LLM connections, e.g. on shutdown."""
+    global _router, _router_settings
+    with _router_lock:
+        if _router is not None:
+            _router.close()
+            discard_extraction_chains(_router)
+        _router = _router_settings = None
+    _registry.close()
@@ -0,0 +1,498 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from functools import cache
+from typing import TYPE_CHECKING, Any, AsyncIterator
+from src.config import LlmRoutingConfig
+from src.metrics import LLM_CIRCUIT_STATE, LLM_DEPLOYMENT_CALLS, LLM_DEPLOYMENT_SECONDS, LLM_HEDGED_REQUESTS
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+# Routing of extraction calls across several Azure OpenAI deployments. Calls
+# go to a deployment picked at random by weight among those whose circuit
+# breaker is closed. Rate limits, timeouts, connection and 5xx errors fail
+# over to another deployment and count against the breaker; any other error
+# (e.g. unparsable output) is the request's fault and is raised as is.
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+# Latency kinds: a whole invoke() call, or a stream's time to first chunk
+CALL, FIRST_CHUNK = "call", "first_chunk"
+_EMPTY = object()
+
+class NoDeploymentAvailable(RuntimeError):
+    """Raised when every routed deployment has been tried without success."""
+
+@cache
+def deployment_errors() -> tuple[type[Exception], ...]:
+    """Errors caused by the deployment rather than the request: rate limits, timeouts, connection and 5xx errors."""
+    try:
+        import openai
+    except ImportError:
+        return ()
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+def _retry_after(error: Exception) -> float | None:
+    """Seconds from a rate-limited response's Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(float(headers.get("retry-after")), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Per-deployment circuit breaker.
+
+    Opens after `failure_threshold` consecutive failed (or slow) calls, or at
+    once when the deployment rate-limits us. While open the deployment gets
+    no calls; after `open_seconds` (or the server's Retry-After) a single
+    probe call is let through: success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, name: str, settings: LlmRoutingConfig):
+        self.name = name
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        LLM_CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], deployment=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    @property
+    def open_until(self) -> float:
+        with self._lock:
+            return self._open_until
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            logger.log(logging.WARNING if state == OPEN else logging.INFO,
+                       f"Circuit breaker for LLM deployment '{self.name}': {self._state} -> {state}")
+            self._state = state
+            LLM_CIRCUIT_STATE.set(_STATE_VALUES[state], deployment=self.name)
+
+    def _refresh(self):
+        if self._state == OPEN and time.monotonic() >= self._open_until:
+            self._set_state(HALF_OPEN)
+
+    def available(self) -> bool:
+        """Whether a call could be sent now (without claiming the half-open probe)."""
+        with self._lock:
+            self._refresh()
+            return self._state == CLOSED or (self._state == HALF_OPEN and not self._probing)
+
+    def acquire(self) -> bool:
+        """Claim permission for one call; in the half-open state only one probe runs at a time."""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def record_failure(self, open_for: float | None = None):
+        """Count a failed or slow call; `open_for` opens the breaker at once for that many seconds."""
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if open_for is not None or self._state == HALF_OPEN or self._failures >= self._settings.failure_threshold:
+                self._open_until = time.monotonic() + (open_for if open_for is not None else self._settings.open_seconds)
+                self._failures = 0
+                self._set_state(OPEN)
+
+    def release(self):
+        """Give back a claimed call that ended without a verdict (e.g. a cancelled hedge)."""
+        with self._lock:
+            self._probing = False
+
+class Deployment:
+    """One routed deployment: its chat model, weight, circuit breaker and recent latencies per kind."""
+
+    def __init__(self, name: str, weight: float, llm: "BaseChatModel", settings: LlmRoutingConfig):
+        self.name = name
+        self.weight = weight
+        self.llm = llm
+        self.breaker = CircuitBreaker(name, settings)
+        self._settings = settings
+        self._latencies = {kind: deque(maxlen=settings.latency_window) for kind in (CALL, FIRST_CHUNK)}
+        self._lock = threading.Lock()
+
+    def latency_quantile(self, q: float, kind: str = CALL) -> float | None:
+        """Quantile of recent successful latencies of `kind`, or None until hedge_min_samples were seen."""
+        with self._lock:
+            latencies = sorted(self._latencies[kind])
+        if not latencies or len(latencies) < self._settings.hedge_min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def succeeded(self, seconds: float, kind: str = CALL):
+        """Record a successful call; `seconds` is the call's latency, or a stream's time to first chunk."""
+        with self._lock:
+            self._latencies[kind].append(seconds)
+        LLM_DEPLOYMENT_SECONDS.observe(seconds, deployment=self.name)
+        slow_call = self._settings.slow_call_seconds
+        if slow_call is not None and seconds > slow_call:
+            LLM_DEPLOYMENT_CALLS.inc(deployment=self.name, outcome="slow")
+            self.breaker.record_failure()
+        else:
+            LLM_DEPLOYMENT_CALLS.inc(deployment=self.name, outcome="success")
+            self.breaker.record_success()
+
+    def failed(self, error: Exception, seconds: float):
+        LLM_DEPLOYMENT_SECONDS.observe(seconds, deployment=self.name)
+        rate_limited = getattr(error, "status_code", None) == 429
+        LLM_DEPLOYMENT_CALLS.inc(deployment=self.name, outcome="rate_limited" if rate_limited else "error")
+        open_for = None
+        if rate_limited:
+            open_for = _retry_after(error)
+            open_for = self._settings.open_seconds if open_for is None else open_for
+        self.breaker.record_failure(open_for)
+
+    def abandoned(self, error: BaseException):
+        """A call that says nothing about the deployment: cancelled, or failed on the request itself."""
+        cancelled = isinstance(error, (asyncio.CancelledError, GeneratorExit))
+        LLM_DEPLOYMENT_CALLS.inc(deployment=self.name, outcome="cancelled" if cancelled else "request_error")
+        self.breaker.release()
+
+class LLMRouter:
+    """
+    Stand-in for a single chat model that spreads calls over several deployments.
+
+    Only with_structured_output() is supported, which is all the extraction
+    chain needs: it returns a runnable that routes every call, fails over on
+    deployment errors and, if enabled, hedges slow calls by sending a second
+    request to another deployment after a delay (the primary's p95 latency
+    by default) and returning whichever answers first.
+    """
+
+    def __init__(self, deployments: list[Deployment], settings: LlmRoutingConfig, temperature: float = 0,
+                 max_workers: int = 16):
+        if not deployments:
+            raise ValueError("LLMRouter needs at least one deployment")
+        self.deployments = deployments
+        self.settings = settings
+        self.temperature = temperature
+        # Used in extraction cache keys: results do not depend on which deployment answered
+        self.deployment_name = "+".join(deployment.name for deployment in deployments)
+        self._rng = random.Random()
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def with_structured_output(self, schema, method: str | None = None, **kwargs) -> "Runnable":
+        """Structured-output runnable routed across all deployments."""
+        if method:
+            kwargs["method"] = method
+        bound = {deployment.name: deployment.llm.with_structured_output(schema, **kwargs) for deployment in self.deployments}
+        return _routed_runnable_type()(self, bound)
+
+    def acquire(self, exclude: list[Deployment] = ()) -> Deployment | None:
+        """
+        Pick a deployment by weight among those not excluded whose breaker lets a call through.
+        Args:
+            exclude (list[Deployment]): Deployments already tried for this request.
+        Returns:
+            Deployment | None: The claimed deployment. When every breaker is open and nothing has
+            been tried yet, the one due to close first; None when nothing is left to try.
+        """
+        skipped = list(exclude)
+        while True:
+            candidates = [d for d in self.deployments if d not in skipped and d.breaker.available()]
+            if not candidates:
+                break
+            deployment = self._rng.choices(candidates, weights=[d.weight for d in candidates])[0]
+            if deployment.breaker.acquire():
+                return deployment
+            skipped.append(deployment)
+        if exclude:
+            return None
+        # Everything is open: rather than rejecting the listing, try the deployment that recovers first
+        deployment = min(self.deployments, key=lambda d: d.breaker.open_until)
+        logger.warning(f"All LLM deployments are unavailable; trying '{deployment.name}' anyway")
+        return deployment
+
+    def hedge_delay(self, deployment: Deployment, kind: str = CALL) -> float | None:
+        """Seconds to wait for `deployment` (its answer, or first chunk) before hedging, or None to not hedge."""
+        if not self.settings.hedge or len(self.deployments) < 2:
+            return None
+        if self.settings.hedge_delay is not None:
+            return self.settings.hedge_delay
+        return deployment.latency_quantile(0.95, kind)
+
+    def _executor_for_hedging(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(self._max_workers, thread_name_prefix="llm-hedge")
+        return self._executor
+
+    def close(self):
+        """Stop the hedging threads (in-flight calls still complete)."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    # Sync calls
+
+    def _call(self, deployment: Deployment, runnable: "Runnable", input: Any, config) -> Any:
+        start = time.perf_counter()
+        try:
+            output = runnable.invoke(input, config)
+        except deployment_errors() as e:
+            deployment.failed(e, time.perf_counter() - start)
+            raise
+        except BaseException as e:
+            deployment.abandoned(e)
+            raise
+        deployment.succeeded(time.perf_counter() - start)
+        return output
+
+    def invoke(self, bound: dict[str, "Runnable"], input: Any, config=None) -> Any:
+        """Run one call, failing over to other deployments on deployment errors."""
+        tried: list[Deployment] = []
+        error = None
+        for _ in range(max(1, self.settings.max_attempts)):
+            deployment = self.acquire(tried)
+            if deployment is None:
+                break
+            tried.append(deployment)
+            try:
+                delay = self.hedge_delay(deployment)
+                if delay is None:
+                    return self._call(deployment, bound[deployment.name], input, config)
+                return self._invoke_hedged(deployment, delay, tried, bound, input, config)
+            except deployment_errors() as e:
+                logger.warning(f"LLM deployment '{deployment.name}' failed ({type(e).__name__}); failing over")
+                error = e
+        raise error or NoDeploymentAvailable("No LLM deployment available")
+
+    def _invoke_hedged(self, primary: Deployment, delay: float, tried: list[Deployment], bound: dict[str, "Runnable"],
+                       input: Any, config) -> Any:
+        executor = self._executor_for_hedging()
+        submit = lambda deployment: executor.submit(contextvars.copy_context().run, self._call, deployment,
+                                                    bound[deployment.name], input, config)
+        first = submit(primary)
+        done, _ = concurrent.futures.wait([first], timeout=delay)
+        backup = None if done else self.acquire(tried)
+        if backup is None:
+            return first.result()
+        tried.append(backup)
+        second = submit(backup)
+        futures = {first: "primary", second: "hedge"}
+        error = None
+        pending = set(futures)
+        # The slower call keeps running in its thread; its latency still feeds the breaker
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    LLM_HEDGED_REQUESTS.inc(winner=futures[future])
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    # Async calls
+
+    async def _acall(self, deployment: Deployment, runnable: "Runnable", input: Any, config) -> Any:
+        start = time.perf_counter()
+        try:
+            output = await runnable.ainvoke(input, config)
+        except deployment_errors() as e:
+            deployment.failed(e, time.perf_counter() - start)
+            raise
+        except BaseException as e:
+            deployment.abandoned(e)
+            raise
+        deployment.succeeded(time.perf_counter() - start)
+        return output
+
+    async def ainvoke(self, bound: dict[str, "Runnable"], input: Any, config=None) -> Any:
+        """Async invoke(); a losing hedged call is cancelled."""
+        tried: list[Deployment] = []
+        error = None
+        for _ in range(max(1, self.settings.max_attempts)):
+            deployment = self.acquire(tried)
+            if deployment is None:
+                break
+            tried.append(deployment)
+            try:
+                delay = self.hedge_delay(deployment)
+                if delay is None:
+                    return await self._acall(deployment, bound[deployment.name], input, config)
+                return await self._ainvoke_hedged(deployment, delay, tried, bound, input, config)
+            except deployment_errors() as e:
+                logger.warning(f"LLM deployment '{deployment.name}' failed ({type(e).__name__}); failing over")
+                error = e
+        raise error or NoDeploymentAvailable("No LLM deployment available")
+
+    async def _ainvoke_hedged(self, primary: Deployment, delay: float, tried: list[Deployment],
+                              bound: dict[str, "Runnable"], input: Any, config) -> Any:
+        tasks = {asyncio.ensure_future(self._acall(primary, bound[primary.name], input, config)): "primary"}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            backup = None if done else self.acquire(tried)
+            if backup is None:
+                return await next(iter(tasks))
+            tried.append(backup)
+            tasks[asyncio.ensure_future(self._acall(backup, bound[backup.name], input, config))] = "hedge"
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGED_REQUESTS.inc(winner=tasks[task])
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _stream(self, deployment: Deployment, runnable: "Runnable", input: Any, config) -> AsyncIterator[Any]:
+        start = time.perf_counter()
+        first_chunk = None
+        try:
+            async for chunk in runnable.astream(input, config):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+                yield chunk
+        except deployment_errors() as e:
+            deployment.failed(e, time.perf_counter() - start)
+            raise
+        except BaseException as e:
+            deployment.abandoned(e)
+            raise
+        deployment.succeeded(first_chunk if first_chunk is not None else time.perf_counter() - start, FIRST_CHUNK)
+
+    async def _first_chunk(self, primary: Deployment, tried: list[Deployment], bound: dict[str, "Runnable"],
+                           input: Any, config) -> tuple[AsyncIterator[Any], Any]:
+        """
+        Start streaming from `primary` and, if its first chunk is later than the hedge delay, from a
+        second deployment too. Returns the stream that delivered first with that chunk; the other is closed.
+        """
+        streams = {}
+        started = set()
+
+        def start(deployment: Deployment):
+            stream = self._stream(deployment, bound[deployment.name], input, config)
+
+            async def first_chunk():
+                started.add(deployment)
+                return await anext(stream, _EMPTY)
+
+            streams[asyncio.ensure_future(first_chunk())] = (stream, deployment)
+
+        start(primary)
+        winner = None
+        try:
+            delay = self.hedge_delay(primary, FIRST_CHUNK)
+            if delay is not None:
+                done, _ = await asyncio.wait(streams, timeout=delay)
+                backup = None if done else self.acquire(tried)
+                if backup is not None:
+                    tried.append(backup)
+                    start(backup)
+            error = None
+            pending = set(streams)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if len(streams) > 1:
+                            LLM_HEDGED_REQUESTS.inc(winner="primary" if streams[task][1] is primary else "hedge")
+                        return streams[task][0], task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task, (stream, deployment) in streams.items():
+                if task is winner:
+                    continue
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                if deployment not in started:
+                    # Cancelled before it ran: the claimed call never reached the deployment
+                    deployment.abandoned(asyncio.CancelledError())
+                await stream.aclose()
+
+    async def astream(self, bound: dict[str, "Runnable"], input: Any, config=None) -> AsyncIterator[Any]:
+        """
+        Stream from one deployment, hedging on the time to first chunk. A deployment error
+        before the first chunk fails over; once chunks have been yielded, errors are raised.
+        """
+        tried: list[Deployment] = []
+        error = None
+        for _ in range(max(1, self.settings.max_attempts)):
+            deployment = self.acquire(tried)
+            if deployment is None:
+                break
+            tried.append(deployment)
+            try:
+                stream, chunk = await self._first_chunk(deployment, tried, bound, input, config)
+            except deployment_errors() as e:
+                logger.warning(f"LLM deployment '{deployment.name}' failed ({type(e).__name__}); failing over")
+                error = e
+                continue
+            try:
+                if chunk is not _EMPTY:
+                    yield chunk
+                    async for chunk in stream:
+                        yield chunk
+            finally:
+                await stream.aclose()
+            return
+        raise error or NoDeploymentAvailable("No LLM deployment available")
+
+@cache
+def _routed_runnable_type() -> type:
+    """Runnable class for routed calls, defined on first use so langchain_core is only imported when needed."""
+    from langchain_core.runnables import Runnable
+
+    class RoutedRunnable(Runnable):
+        """Per-deployment runnables behind one router; batch() and stream() use the Runnable defaults."""
+
+        def __init__(self, router: LLMRouter, bound: dict[str, Runnable]):
+            self.router = router
+            self.bound = bound
+
+        def invoke(self, input, config=None, **kwargs):
+            return self.router.invoke(self.bound, input, config)
+
+        async def ainvoke(self, input, config=None, **kwargs):
+            return await self.router.ainvoke(self.bound, input, config)
+
+        async def astream(self, input, config=None, **kwargs):
+            async for chunk in self.router.astream(self.bound, input, config):
+                yield chunk
+
+    return RoutedRunnable
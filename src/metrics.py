@@ -0,0 +1,261 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Minimal Prometheus-compatible metrics. Every metric keeps its samples in a
+# dict keyed by label values and guarded by its own lock, so recording a
+# sample costs a dict lookup and an addition; formatting only happens when
+# /metrics is scraped.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._labelset = frozenset(self.labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if labels.keys() != self._labelset:
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. tokens used or cache hits."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in flight."""
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies in seconds) over fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time spent in the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def sum(self, **labels) -> float:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[1] if state else 0.0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def clear(self):
+        """Reset all samples (metrics stay registered)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram(
+    "autolister_stage_duration_seconds", "Time spent per pipeline stage.", ("stage",)
+)
+STAGE_IN_FLIGHT = Gauge(
+    "autolister_stage_in_flight", "Pipeline stages currently executing.", ("stage",)
+)
+STAGE_ERRORS = Counter(
+    "autolister_stage_errors", "Pipeline stages that raised an exception.", ("stage",)
+)
+LLM_TOKENS = Counter(
+    "autolister_llm_tokens", "LLM tokens used, by deployment and kind (prompt/completion).", ("deployment", "kind")
+)
+CACHE_LOOKUPS = Counter(
+    "autolister_cache_lookups", "Cache lookups by cache and result (hit/miss).", ("cache", "result")
+)
+SMTP_FAILURES = Counter(
+    "autolister_smtp_failures", "Failed SMTP operations by error type.", ("error",)
+)
+EXTRACTIONS = Counter(
+    "autolister_extractions", "Extractions by path: rules only, rules plus partial LLM, or full LLM.", ("path",)
+)
+REQUEST_TOKENS = Histogram(
+    "autolister_llm_request_tokens", "Tokens per extraction request by part (prompt, schema, completion) and prompt variant.",
+    ("part", "variant"), buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+INPUT_TRUNCATIONS = Counter(
+    "autolister_input_truncations", "Descriptions shortened to fit the token budget, by kind (compacted/truncated).", ("kind",)
+)
+LLM_DEPLOYMENT_CALLS = Counter(
+    "autolister_llm_deployment_calls", "Routed LLM calls by deployment and outcome (success, slow, error, rate_limited, request_error, cancelled).",
+    ("deployment", "outcome")
+)
+LLM_DEPLOYMENT_SECONDS = Histogram(
+    "autolister_llm_deployment_duration_seconds", "Latency of routed LLM calls per deployment.", ("deployment",)
+)
+LLM_CIRCUIT_STATE = Gauge(
+    "autolister_llm_circuit_state", "Circuit breaker state per LLM deployment (0 closed, 1 half-open, 2 open).", ("deployment",)
+)
+LLM_HEDGED_REQUESTS = Counter(
+    "autolister_llm_hedged_requests", "Hedged LLM requests by which call answered first (primary/hedge).", ("winner",)
+)
+SANITIZER_PATTERN_SECONDS = Histogram(
+    "autolister_sanitizer_pattern_duration_seconds", "Scan time per sanitizer threat pattern (profile mode only).",
+    ("level", "category", "pattern"), buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+SANITIZER_REJECTIONS = Counter(
+    "autolister_sanitizer_rejections", "Inputs rejected for overrunning the sanitizer time budget, by scan mode (combined/profile).", ("mode",)
+)
+LOG_RECORDS_DROPPED = Counter(
+    "autolister_log_records_dropped", "Log records dropped because the log writer fell behind."
+)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Instrument a pipeline stage: in-flight gauge, latency histogram and error counter.
+    Works in sync and async code (the timing includes any awaits inside the block).
+    """
+    STAGE_IN_FLIGHT.inc(stage=name)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+        STAGE_IN_FLIGHT.dec(stage=name)
+
+def mount_metrics(app, path: str = "/metrics", registry: Registry | None = None):
+    """Add a Prometheus scrape endpoint to a FastAPI/Starlette app (e.g. the running Gradio app)."""
+    from starlette.responses import Response
+    registry = registry or REGISTRY
+
+    def metrics_endpoint():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route(path, metrics_endpoint, methods=["GET"], include_in_schema=False)
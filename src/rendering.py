@@ -0,0 +1,149 @@
+from datetime import datetime
+from html import escape as escape_html
+
+# Every output format renders the same rows, computed once per listing by
+# listing_rows()/listing_notices(). The format strings below are bound once at
+# import time so rendering is a single join rather than repeated `+=`.
+
+_MARKDOWN_ESCAPES = str.maketrans({c: "\\" + c for c in "\\`*_[]<>#|"})
+
+def escape_markdown(text: str) -> str:
+    """Escape characters that Markdown would interpret as formatting."""
+    return text.translate(_MARKDOWN_ESCAPES)
+
+def _format_price(price: dict) -> str:
+    return f"{price.get('amount', 0):,.2f} {price.get('currency', 'Unknown')}"
+
+def _has_amount(price) -> bool:
+    return isinstance(price, dict) and (price.get('amount') or 0) > 0
+
+def _tires(car: dict) -> str:
+    tires = car.get('tires') or {}
+    tire_info = str(tires.get('type', 'Unknown'))
+    tire_year = tires.get('manufactured_year') or 0
+    if tire_year > 0:
+        tire_info += f" (Manufactured Year: {tire_year})"
+    return tire_info
+
+def _price(car: dict) -> tuple[str, str]:
+    price = car.get('price')
+    estimated_price = car.get('estimated_price')
+    if _has_amount(price):
+        return "Price", _format_price(price)
+    if _has_amount(estimated_price):
+        return "Estimated Price", _format_price(estimated_price)
+    return "Price", "Contact for details"
+
+# (label, getter) for each listing row, in display order
+LISTING_FIELDS = (
+    ("Brand", lambda car: str(car.get('brand', 'Unknown'))),
+    ("Model", lambda car: str(car.get('model', 'Unknown'))),
+    ("Manufactured Year", lambda car: str(car.get('manufactured_year', 'Unknown'))),
+    ("Body Type", lambda car: str(car.get('body_type', 'Unknown'))),
+    ("Color", lambda car: str(car.get('color', 'Unknown'))),
+    ("Engine Size", lambda car: f"{car.get('motor_size_cc') or 0:,} cc"),
+    ("Windows", lambda car: str(car.get('windows', 'Unknown'))),
+    ("Tires", _tires),
+)
+
+def listing_rows(car: dict) -> list[tuple[str, str]]:
+    """Return the (label, value) rows shown for a car, including the price row."""
+    rows = [(label, getter(car)) for label, getter in LISTING_FIELDS]
+    rows.append(_price(car))
+    return rows
+
+def listing_notices(car: dict) -> list[tuple[str | None, str]]:
+    """Return (type, description) pairs for the car's notices; type is None for free-text notices."""
+    notices = []
+    for notice in car.get('notices') or []:
+        if isinstance(notice, dict):
+            notices.append((str(notice.get('type', 'Notice')), str(notice.get('description', 'No details available'))))
+        else:
+            notices.append((None, str(notice)))
+    return notices
+
+_HTML_ROW = "<li><b>{0}:</b> {1}</li>\n".format
+_HTML_NOTICE = "<li>{0}: {1}</li>\n".format
+_HTML_FREE_NOTICE = "<li>{0}</li>\n".format
+_HTML_EMPTY = "<p>No car information available.</p>"
+_HTML_BODY = """
+    <html>
+    <body style="font-family: Arial; color: #333;">
+        <h1>Car Listing</h1>
+        <p>Sent on {date}</p>
+        {details}
+        {photo}
+        <p>Contact us for more details.</p>
+    </body>
+    </html>
+    """.format
+
+_TEXT_ROW = "- {0}: {1}\n".format
+_TEXT_NOTICE = "  - {0}: {1}\n".format
+_TEXT_FREE_NOTICE = "  - {0}\n".format
+_TEXT_BODY = "Car Listing\nSent on {date}\n\n{details}{photo}\nContact us for more details.\n".format
+
+_MARKDOWN_ROW = "• **{0}:** {1}\n\n".format
+_MARKDOWN_NOTICE = "• **{0}:** {1}\n\n".format
+_MARKDOWN_FREE_NOTICE = "• {0}\n\n".format
+
+def render_html_details(car_data: dict) -> str:
+    """Render the car details as an HTML list (values are HTML-escaped)."""
+    if not car_data or 'car' not in car_data:
+        return _HTML_EMPTY
+    car = car_data['car']
+    parts = ["<h2>Car Details</h2>\n<ul>\n"]
+    parts.extend(_HTML_ROW(escape_html(label), escape_html(value)) for label, value in listing_rows(car))
+    notices = listing_notices(car)
+    if notices:
+        parts.append("<li><b>Notices:</b><ul>\n")
+        parts.extend(
+            _HTML_NOTICE(escape_html(kind), escape_html(text)) if kind is not None else _HTML_FREE_NOTICE(escape_html(text))
+            for kind, text in notices
+        )
+        parts.append("</ul></li>\n")
+    parts.append("</ul>\n")
+    return "".join(parts)
+
+def render_html_email(car_data: dict, include_photo: bool = False) -> str:
+    """Render the complete HTML email body."""
+    return _HTML_BODY(
+        date=datetime.now().strftime('%B %d, %Y'),
+        details=render_html_details(car_data),
+        photo="<p>Photo attached.</p>" if include_photo else ""
+    )
+
+def render_text_details(car_data: dict) -> str:
+    """Render the car details as plain text."""
+    if not car_data or 'car' not in car_data:
+        return "No car information available.\n"
+    car = car_data['car']
+    parts = ["Car Details\n"]
+    parts.extend(_TEXT_ROW(label, value) for label, value in listing_rows(car))
+    notices = listing_notices(car)
+    if notices:
+        parts.append("- Notices:\n")
+        parts.extend(_TEXT_NOTICE(kind, text) if kind is not None else _TEXT_FREE_NOTICE(text) for kind, text in notices)
+    return "".join(parts)
+
+def render_text_email(car_data: dict, include_photo: bool = False) -> str:
+    """Render the plain-text alternative of the email body."""
+    return _TEXT_BODY(
+        date=datetime.now().strftime('%B %d, %Y'),
+        details=render_text_details(car_data),
+        photo="\nPhoto attached.\n" if include_photo else ""
+    )
+
+def render_markdown_summary(car: dict) -> str:
+    """Render the Markdown summary shown in the web interface (values are Markdown-escaped)."""
+    parts = ["## 📋 Processed Car Details\n\n"]
+    parts.extend(_MARKDOWN_ROW(label, escape_markdown(value)) for label, value in listing_rows(car))
+    notices = listing_notices(car)
+    if notices:
+        parts.append("## Important Notices\n\n")
+        parts.extend(
+            _MARKDOWN_NOTICE(escape_markdown(kind), escape_markdown(text)) if kind is not None
+            else _MARKDOWN_FREE_NOTICE(escape_markdown(text))
+            for kind, text in notices
+        )
+    return "".join(parts)
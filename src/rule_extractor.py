@@ -0,0 +1,333 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from functools import cache
+from typing import Any
+from pydantic import BaseModel, Field, create_model
+from src.utils import Car, CarListing
+
+# Deterministic extraction for short, formulaic descriptions such as
+# "2020 Toyota Camry, red sedan, 2500cc, $25,000". Each field gets a
+# confidence; fields at or above the configured threshold are trusted, and
+# the LLM is only asked for the rest (or skipped when everything needed is
+# resolved and no word of the text is left unexplained: anything the rules do
+# not understand, e.g. "flooded", may be a notice only the LLM can extract).
+
+# Car fields as units of extraction; `price` covers price and estimated_price
+FIELD_UNITS = ("body_type", "color", "brand", "model", "manufactured_year", "motor_size_cc", "tires", "windows",
+               "notices", "price")
+_UNIT_FIELDS = {"price": ("price", "estimated_price")}
+
+CERTAIN = 0.95
+LIKELY = 0.9
+AMBIGUOUS = 0.5
+GUESS = 0.6
+
+BRAND_MODELS = {
+    "Toyota": ("Camry", "Corolla", "Yaris", "RAV4", "Land Cruiser", "Hilux", "Prius", "Fortuner", "C-HR"),
+    "Honda": ("Civic", "Accord", "CR-V", "HR-V", "City", "Jazz", "Fit"),
+    "Hyundai": ("Elantra", "Accent", "Tucson", "Santa Fe", "Sonata", "Verna", "i10", "i20", "i30", "Creta"),
+    "Kia": ("Sportage", "Cerato", "Picanto", "Rio", "Sorento", "Optima", "Seltos", "Carnival"),
+    "Nissan": ("Sunny", "Sentra", "Altima", "Qashqai", "X-Trail", "Patrol", "Juke", "Micra", "Navara"),
+    "Chevrolet": ("Aveo", "Optra", "Lanos", "Cruze", "Malibu", "Captiva", "Camaro", "Silverado", "Tahoe"),
+    "Ford": ("Focus", "Fiesta", "Mustang", "Explorer", "Escape", "Kuga", "Ranger", "F-150", "Fusion"),
+    "BMW": ("X1", "X3", "X5", "X6", "1 Series", "3 Series", "5 Series", "7 Series", "320i", "520i"),
+    "Mercedes-Benz": ("A-Class", "C-Class", "E-Class", "S-Class", "GLA", "GLC", "GLE", "C180", "C200", "E200"),
+    "Audi": ("A3", "A4", "A6", "Q3", "Q5", "Q7"),
+    "Volkswagen": ("Golf", "Passat", "Polo", "Jetta", "Tiguan", "Touareg"),
+    "Skoda": ("Octavia", "Fabia", "Superb", "Kodiaq", "Karoq"),
+    "Renault": ("Logan", "Duster", "Megane", "Clio", "Symbol", "Kadjar"),
+    "Peugeot": ("301", "308", "508", "2008", "3008", "5008"),
+    "Fiat": ("128", "Tipo", "500", "Punto", "Uno"),
+    "Mitsubishi": ("Lancer", "Pajero", "Outlander", "Eclipse Cross", "Attrage", "Mirage"),
+    "Mazda": ("Mazda3", "Mazda6", "CX-3", "CX-5", "CX-9", "MX-5"),
+    "Suzuki": ("Swift", "Alto", "Vitara", "Ciaz", "Jimny"),
+    "Jeep": ("Wrangler", "Cherokee", "Grand Cherokee", "Compass", "Renegade"),
+    "Lexus": ("ES", "IS", "RX", "NX", "LX"),
+    "Subaru": ("Impreza", "Forester", "Outback", "XV"),
+    "Opel": ("Astra", "Corsa", "Insignia", "Mokka"),
+    "Seat": ("Ibiza", "Leon", "Arona", "Ateca"),
+    "Tesla": ("Model 3", "Model S", "Model X", "Model Y"),
+    "MG": ("MG5", "ZS", "HS", "RX5"),
+    "Chery": ("Tiggo", "Arrizo"),
+    "BYD": ("F3", "Atto 3", "Seal", "Dolphin")
+}
+BRAND_ALIASES = {"mercedes": "Mercedes-Benz", "benz": "Mercedes-Benz", "vw": "Volkswagen", "chevy": "Chevrolet"}
+
+COLORS = {
+    "red": "Red", "blue": "Blue", "black": "Black", "white": "White", "silver": "Silver", "grey": "Grey",
+    "gray": "Grey", "green": "Green", "yellow": "Yellow", "orange": "Orange", "brown": "Brown", "beige": "Beige",
+    "gold": "Gold", "golden": "Gold", "maroon": "Maroon", "burgundy": "Burgundy", "navy": "Navy", "purple": "Purple",
+    "bronze": "Bronze", "champagne": "Champagne"
+}
+BODY_TYPES = {
+    "sedan": "Sedan", "saloon": "Sedan", "suv": "SUV", "crossover": "SUV", "hatchback": "Hatchback",
+    "coupe": "Coupe", "coupé": "Coupe", "convertible": "Convertible", "cabriolet": "Convertible",
+    "wagon": "Wagon", "estate": "Wagon", "pickup": "Truck", "pick-up": "Truck", "truck": "Truck",
+    "van": "Van", "minivan": "Van"
+}
+CURRENCIES = {
+    "$": "USD", "us$": "USD", "usd": "USD", "dollar": "USD", "dollars": "USD", "€": "EUR", "eur": "EUR",
+    "euro": "EUR", "euros": "EUR", "£": "GBP", "gbp": "GBP", "egp": "EGP", "l.e": "L.E", "le": "L.E",
+    "l.e.": "L.E", "pounds": "EGP", "egyptian pounds": "EGP"
+}
+TIRE_TYPES = {
+    "brand-new": "Brand-new", "brand new": "Brand-new", "new": "New", "used": "Used", "worn": "Used",
+    "all-season": "All-season", "all season": "All-season", "winter": "Winter", "summer": "Summer"
+}
+# Words that carry no field of their own; they count as explained text
+FILLER_WORDS = frozenset((
+    "a", "an", "the", "my", "and", "with", "for", "in", "of", "on", "at", "to", "is", "it", "its", "car", "color",
+    "colour", "engine", "motor", "price", "priced", "asking", "sale", "selling", "sell", "only", "model", "year",
+    "body", "type", "good", "great", "excellent", "clean", "condition", "very", "cc", "just", "automatic",
+    "manual", "transmission", "gear", "gearbox", "petrol", "gasoline", "diesel", "hybrid", "metallic", "dark", "light"
+))
+
+def _key(phrase: str) -> str:
+    """Lookup key for lexicon phrases, ignoring case, spaces and hyphens."""
+    return re.sub(r"[\s-]", "", phrase.lower())
+
+def _words(phrase: str) -> str:
+    """Regex for a lexicon phrase: case-insensitive, flexible space/hyphen between words."""
+    return r"[\s-]?".join(re.escape(part) for part in re.split(r"[\s-]", phrase))
+
+def _alternation(phrases) -> str:
+    # Longest first so "Grand Cherokee" wins over "Cherokee"
+    return "|".join(_words(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+
+_ALL_BRANDS = {_key(brand): brand for brand in BRAND_MODELS} | BRAND_ALIASES
+_MODELS = {brand: {_key(model): model for model in models} for brand, models in BRAND_MODELS.items()}
+_COLORS = {_key(name): color for name, color in COLORS.items()}
+_BODY_TYPES = {_key(name): body for name, body in BODY_TYPES.items()}
+_TIRE_TYPES = {_key(name): tire_type for name, tire_type in TIRE_TYPES.items()}
+_CURRENCIES = {_key(name): currency for name, currency in CURRENCIES.items()}
+_BRAND_RE = re.compile(rf"\b(?P<brand>{_alternation([*BRAND_MODELS, *BRAND_ALIASES])})\b", re.IGNORECASE)
+_MODEL_AFTER_BRAND_RE = {
+    brand: re.compile(rf"[\s-]*(?P<model>{_alternation(models)})(?![\w-])", re.IGNORECASE)
+    for brand, models in BRAND_MODELS.items()
+}
+_NEXT_WORD_RE = re.compile(r"[\s-]*(?P<model>[A-Za-z0-9][\w-]*)")
+# Distinctive model names imply the brand when it is not written out
+_MODEL_BRANDS = {
+    _key(model): (brand, model) for brand, models in BRAND_MODELS.items() for model in models
+    if not model.isdigit() and len(model) > 3 and _key(model) not in _ALL_BRANDS
+}
+_MODEL_RE = re.compile(rf"\b(?P<model>{_alternation([model for _, model in _MODEL_BRANDS.values()])})(?![\w-])", re.IGNORECASE)
+_COLOR_RE = re.compile(rf"\b(?P<color>{_alternation(COLORS)})\b(?!\s+(?:interior|seats?|leather|upholstery))",
+                       re.IGNORECASE)
+_BODY_RE = re.compile(rf"\b(?P<body>{_alternation(BODY_TYPES)})\b", re.IGNORECASE)
+_YEAR_RE = re.compile(r"\b(?P<year>19[5-9]\d|20[0-2]\d|2030)\b")
+_TIRE_RE = re.compile(
+    rf"(?:\b(?P<type>{_alternation(TIRE_TYPES)})\s+)?\b(?:tires?|tyres?)\b"
+    r"(?:\s*(?:from|made in|manufactured in|dated|year|of|\()?\s*(?P<year>19[5-9]\d|20[0-2]\d|2030)\)?)?",
+    re.IGNORECASE
+)
+_TIRE_YEAR_BEFORE_RE = re.compile(r"\b(?P<year>19[5-9]\d|20[0-2]\d|2030)\s+(?:tires?|tyres?)\b", re.IGNORECASE)
+_CC_RE = re.compile(r"\b(?P<cc>\d{3,4})\s*(?:cc|cm3|c\.c\.?)(?![\w])", re.IGNORECASE)
+_LITERS_RE = re.compile(r"\b(?P<liters>\d\.\d)\s*(?:l|liters?|litres?)\b(?!\.?\s?e\b)", re.IGNORECASE)
+# Thousands groups use one separator throughout and may be followed by cents with the other one
+# ("25,000", "1,200.50", "12.500,00"); a space is not a separator, so "$25,000 2020" keeps the year
+_AMOUNT = (r"(?P<amount>\d{1,3}(?P<sep>[,.])\d{3}(?:(?P=sep)\d{3})*(?!\d)(?:(?!(?P=sep))[.,]\d{1,2}(?!\d))?|\d+(?:\.\d+)?)"
+           r"(?:\s*(?P<multiplier>k|thousand|m|mn|million)\b)?")
+_PRICE_PREFIX_RE = re.compile(rf"(?P<currency>US\$|\$|€|£|\bUSD|\bEUR|\bGBP|\bEGP|\bL\.E\.?)\s?{_AMOUNT}", re.IGNORECASE)
+_PRICE_SUFFIX_RE = re.compile(
+    rf"\b{_AMOUNT}\s*(?P<currency>egyptian pounds|USD|dollars?|EUR|euros?|GBP|pounds|EGP|L\.E\.?|LE\b)",
+    re.IGNORECASE
+)
+_ESTIMATE_RE = re.compile(r"(?:worth|valued|value|estimated?|approx\w*|around|about|roughly|market)\W*(?:\w+\W+){0,3}$",
+                          re.IGNORECASE)
+# Mileage has no field in the schema; matching it keeps it from counting as unexplained text
+_MILEAGE_RE = re.compile(r"\b\d[\d,.]*\s*(?:k\s*)?(?:km|kms|kilometers?|kilometres?|miles?|mi)\b", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"\w+")
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "mn": 1_000_000, "million": 1_000_000}
+
+@dataclass
+class RuleExtraction:
+    """Fields found by the rules (shaped like Car), a confidence per field unit, the share of words explained and the words that were not."""
+    values: dict[str, Any] = field(default_factory=dict)
+    confidence: dict[str, float] = field(default_factory=dict)
+    coverage: float = 0.0
+    unexplained: list[str] = field(default_factory=list)
+
+    def resolved(self, min_confidence: float) -> tuple[str, ...]:
+        """Field units whose confidence reaches `min_confidence`."""
+        return tuple(unit for unit in FIELD_UNITS if self.confidence.get(unit, 0.0) >= min_confidence)
+
+    def unresolved(self, min_confidence: float) -> tuple[str, ...]:
+        """Field units the LLM still has to extract, in schema order."""
+        resolved = self.resolved(min_confidence)
+        return tuple(unit for unit in FIELD_UNITS if unit not in resolved)
+
+    def is_complete(self, min_confidence: float, required: tuple[str, ...]) -> bool:
+        """True when the LLM can be skipped: required units resolved and no word left unexplained."""
+        resolved = self.resolved(min_confidence)
+        return not self.unexplained and all(unit in resolved for unit in required)
+
+def _parse_amount(match: re.Match) -> float:
+    amount, separator = match.group("amount", "sep")
+    if separator:
+        whole, _, cents = amount.partition("." if separator == "," else ",")
+        value = float(f"{whole.replace(separator, '')}.{cents or 0}")
+    else:
+        value = float(amount)
+    multiplier = (match.group("multiplier") or "").lower()
+    return value * _MULTIPLIERS.get(multiplier, 1)
+
+def _single(candidates: list, certain: float = CERTAIN):
+    """Pick the value when all candidates agree; disagreement keeps the first but marks it ambiguous."""
+    distinct = list(dict.fromkeys(candidates))
+    return distinct[0], certain if len(distinct) == 1 else AMBIGUOUS
+
+def extract_rules(text: str) -> RuleExtraction:
+    """
+    Extract car fields from a description with regexes and a brand/model lexicon.
+    Args:
+        text (str): Sanitized car description.
+    Returns:
+        RuleExtraction: Values found, a confidence per field unit and the share of words explained.
+    """
+    result = RuleExtraction()
+    spans: list[tuple[int, int]] = []
+
+    def found(unit: str, key: str, value: Any, confidence: float, *match_spans: tuple[int, int]):
+        result.values[key] = value
+        result.confidence[unit] = confidence
+        spans.extend(match_spans)
+
+    # Brand and model
+    brand_match = _BRAND_RE.search(text)
+    if brand_match:
+        brand = _ALL_BRANDS[_key(brand_match.group("brand"))]
+        found("brand", "brand", brand, CERTAIN, brand_match.span())
+        model_match = _MODEL_AFTER_BRAND_RE[brand].match(text, brand_match.end())
+        next_word = _NEXT_WORD_RE.match(text, brand_match.end())
+        if model_match:
+            found("model", "model", _MODELS[brand][_key(model_match.group("model"))], CERTAIN, model_match.span("model"))
+        elif next_word and not _YEAR_RE.fullmatch(next_word.group("model")) and \
+                _key(next_word.group("model")) not in FILLER_WORDS | _COLORS.keys() | _BODY_TYPES.keys():
+            # Unknown model name: usually right, but let the LLM confirm it
+            found("model", "model", next_word.group("model"), GUESS, next_word.span("model"))
+    elif model_match := _MODEL_RE.search(text):
+        brand, model = _MODEL_BRANDS[_key(model_match.group("model"))]
+        found("model", "model", model, LIKELY, model_match.span())
+        found("brand", "brand", brand, LIKELY)
+
+    # Tires (their year must not be mistaken for the car's)
+    tire_spans = []
+    tire = {}
+    for match in _TIRE_RE.finditer(text):
+        if match.group("type"):
+            tire.setdefault("type", _TIRE_TYPES[_key(match.group("type"))])
+        if match.group("year"):
+            tire.setdefault("manufactured_year", int(match.group("year")))
+        tire_spans.append(match.span())
+    for match in _TIRE_YEAR_BEFORE_RE.finditer(text):
+        tire.setdefault("manufactured_year", int(match.group("year")))
+        tire_spans.append(match.span())
+    if tire:
+        found("tires", "tires", tire, LIKELY if len(tire) == 2 else AMBIGUOUS, *tire_spans)
+
+    def outside_tires(match: re.Match) -> bool:
+        return not any(start <= match.start() < end for start, end in tire_spans)
+
+    # Prices; the amounts must not be read as years or engine sizes
+    prices = []
+    for regex in (_PRICE_PREFIX_RE, _PRICE_SUFFIX_RE):
+        for match in regex.finditer(text):
+            currency = _CURRENCIES.get(_key(match.group("currency")))
+            if currency:
+                estimated = bool(_ESTIMATE_RE.search(text, max(0, match.start() - 40), match.start()))
+                prices.append((match, estimated, {"amount": _parse_amount(match), "currency": currency}))
+    price_spans = [match.span() for match, _, _ in prices]
+    if prices:
+        prices.sort(key=lambda price: price[0].start())
+        (estimated, price), confidence = _single([(estimated, tuple(price.items())) for _, estimated, price in prices])
+        found("price", "estimated_price" if estimated else "price", dict(price), confidence, *price_spans)
+
+    def outside_prices(match: re.Match) -> bool:
+        return not any(start <= match.start() < end for start, end in price_spans)
+
+    years = [match for match in _YEAR_RE.finditer(text) if outside_tires(match) and outside_prices(match)]
+    years = [match for match in years if int(match.group("year")) <= date.today().year + 1]
+    if years:
+        year, confidence = _single([int(match.group("year")) for match in years])
+        found("manufactured_year", "manufactured_year", year, confidence, *(match.span() for match in years))
+
+    sizes = [(int(match.group("cc")), match.span()) for match in _CC_RE.finditer(text) if outside_prices(match)]
+    sizes += [(round(float(match.group("liters")) * 1000), match.span()) for match in _LITERS_RE.finditer(text)]
+    if sizes:
+        size, confidence = _single([size for size, _ in sizes])
+        found("motor_size_cc", "motor_size_cc", size, confidence, *(span for _, span in sizes))
+
+    colors = list(_COLOR_RE.finditer(text))
+    if colors:
+        color, confidence = _single([_COLORS[_key(match.group("color"))] for match in colors], LIKELY)
+        found("color", "color", color, confidence, *(match.span() for match in colors))
+
+    bodies = list(_BODY_RE.finditer(text))
+    if bodies:
+        body, confidence = _single([_BODY_TYPES[_key(match.group("body"))] for match in bodies], LIKELY)
+        found("body_type", "body_type", body, confidence, *(match.span() for match in bodies))
+
+    spans.extend(match.span() for match in _MILEAGE_RE.finditer(text))
+
+    tokens = list(_TOKEN_RE.finditer(text))
+    result.unexplained = [
+        token.group() for token in tokens
+        if token.group().lower() not in FILLER_WORDS and not any(start <= token.start() < end for start, end in spans)
+    ]
+    result.coverage = 1 - len(result.unexplained) / len(tokens) if tokens else 0.0
+    return result
+
+def _is_default(value: Any) -> bool:
+    if isinstance(value, dict):
+        return all(_is_default(item) for item in value.values())
+    return value in (None, 0, "", "Unknown", "unknown")
+
+def merge_listing(rules: RuleExtraction, llm_car: dict | None, min_confidence: float) -> dict:
+    """
+    Combine rule values with (partial) LLM output into a validated car listing dict.
+
+    Confident rule values win; less certain ones only fill fields the LLM
+    left at their defaults.
+    Args:
+        rules (RuleExtraction): Result of extract_rules().
+        llm_car (dict | None): The `car` part of the LLM's output, if it was called.
+        min_confidence (float): Confidence at which rule values are trusted.
+    Returns:
+        dict: Listing in the CarListing shape.
+    """
+    car = dict(llm_car or {})
+    for key, value in rules.values.items():
+        unit = "price" if key in _UNIT_FIELDS["price"] else key
+        if rules.confidence.get(unit, 0.0) >= min_confidence:
+            if unit == "price":
+                car["price"] = car["estimated_price"] = None
+            car[key] = value
+        elif unit == "price":
+            if not car.get("price") and _is_default(car.get("estimated_price")):
+                car["price"] = car["estimated_price"] = None
+                car[key] = value
+        elif isinstance(value, dict):
+            current = dict(car.get(key) or {})
+            car[key] = current | {sub_key: sub_value for sub_key, sub_value in value.items() if _is_default(current.get(sub_key))}
+        elif _is_default(car.get(key)):
+            car[key] = value
+    # Defaults are not validated by pydantic (manufactured_year=0 is below its minimum), so leave them implicit
+    car = {key: value for key, value in car.items() if key not in Car.model_fields or value != Car.model_fields[key].default}
+    return CarListing.model_validate({"car": car}).model_dump()
+
+@cache
+def partial_listing_schema(units: tuple[str, ...]) -> type[BaseModel]:
+    """
+    A CarListing-shaped model with only the given field units, so the LLM
+    generates (and is billed for) just the fields the rules could not resolve.
+    Cached per unit tuple, which also keeps the extraction chain cache effective.
+    """
+    fields = [name for unit in units for name in _UNIT_FIELDS.get(unit, (unit,))]
+    partial_car = create_model(
+        "PartialCar",
+        __doc__="Car details the description still needs extracted.",
+        **{name: (Car.model_fields[name].annotation, Car.model_fields[name]) for name in fields}
+    )
+    return create_model("PartialCarListing", car=(partial_car, Field(description="Car details")))
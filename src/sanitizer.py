@@ -0,0 +1,366 @@
+import heapq
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from src.metrics import SANITIZER_PATTERN_SECONDS, SANITIZER_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# High-threat patterns that should always be removed
+HIGH_THREAT_PATTERNS = {
+    'instruction_override': [
+        r'\bignore\s+(?:all\s+)?(?:previous|above|prior)\s+(?:instructions?|prompts?|rules?)\b',
+        r'\bforget\s+(?:everything|all|previous|above)\b',
+        r'\bdisregard\s+(?:previous|above|all)\s+(?:instructions?|prompts?)\b',
+        r'\boverride\s+(?:system|previous|default)\s+(?:settings?|instructions?|prompts?)\b',
+    ],
+    'system_manipulation': [
+        r'\bsystem\s*:\s*(?:you\s+are|act\s+as|behave\s+like)',
+        r'\bassistant\s*:\s*(?:you\s+are|act\s+as)',
+        r'\bnow\s+(?:you\s+are|act\s+as|behave\s+like)\s+(?:a\s+)?(?:car\s+dealer|salesperson)',
+        r'\bpretend\s+(?:you\s+are|to\s+be)\s+(?:a\s+)?(?:car\s+dealer|salesperson)',
+    ],
+    'code_injection': [
+        r'```\s*(?:python|javascript|sql|bash|sh|cmd)',
+        # Attributes and body stop at the next opening tag, so a run of unclosed
+        # tags is scanned once instead of once per tag (which was quadratic)
+        r'<script\b[^<>]*+>[^<\n]*+(?:<(?!/?script\b)[^<\n]*+)*+</script>',
+        r'<iframe\b[^<>]*+>[^<\n]*+(?:<(?!/?iframe\b)[^<\n]*+)*+</iframe>',
+        r'\beval\s*\(',
+        r'\bexec\s*\(',
+        r'__import__\s*\(',
+    ],
+    'data_extraction': [
+        r'\bprint\s+(?:all\s+)?(?:system\s+)?(?:prompts?|instructions?|data)\b',
+        r'\bshow\s+(?:me\s+)?(?:your\s+)?(?:system\s+)?(?:prompts?|instructions?|data)\b',
+        r'\breveal\s+(?:your\s+)?(?:system\s+)?(?:prompts?|instructions?)\b',
+        r'\bdisplay\s+(?:all\s+)?(?:hidden\s+)?(?:prompts?|instructions?)\b',
+    ]
+}
+
+# Medium-threat patterns (only removed in strict mode)
+MEDIUM_THREAT_PATTERNS = {
+    'role_confusion': [
+        r'\bas\s+(?:a\s+)?(?:car\s+dealer|salesperson|expert),\s*(?:you\s+should|please)',
+        r'\byou\s+are\s+now\s+(?:a\s+)?(?:car\s+dealer|salesperson)',
+        r'\bchange\s+your\s+role\s+to\b',
+    ],
+    'context_manipulation': [
+        r'\bstart\s+(?:over|new|fresh)\b',
+        r'\breset\s+(?:context|conversation|everything)\b',
+        r'\bclear\s+(?:previous|all)\s+(?:context|data)\b',
+    ],
+    'unusual_formatting': [
+        r'={10,}',
+        r'-{10,}',
+        r'\*{10,}',
+        r'#{5,}',
+    ]
+}
+
+PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+
+_REGEX_SPECIAL = set("()[]{}.?*+|^$\\")
+
+def _leading_literal(pattern: str) -> str | None:
+    """Return the literal first character a pattern must match (ignoring a leading \\b), or None."""
+    if pattern.startswith(r"\b"):
+        pattern = pattern[2:]
+    if len(pattern) >= 2 and pattern[0] == "\\" and not pattern[1].isalnum():
+        char, rest = pattern[1], pattern[2:]
+    elif pattern and pattern[0] not in _REGEX_SPECIAL:
+        char, rest = pattern[0], pattern[1:]
+    else:
+        return None
+    # An optional first character does not have to be present
+    if rest[:1] in ("?", "*") or rest.startswith("{0") or rest.startswith("{,"):
+        return None
+    return char
+
+@dataclass(frozen=True, slots=True)
+class ThreatMatch:
+    level: str
+    category: str
+    pattern: str
+    start: int
+    end: int
+
+@dataclass(slots=True)
+class SanitizationResult:
+    text: str
+    original_length: int
+    truncated: bool = False
+    threats: list[ThreatMatch] = field(default_factory=list)
+    elapsed: float = 0.0
+    timed_out: bool = False
+    # Seconds spent per pattern; only filled in timed mode
+    pattern_timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def threat_level(self) -> str | None:
+        """Highest threat level found, or None if the input was clean."""
+        if not self.threats:
+            return None
+        return "HIGH" if any(threat.level == "HIGH" for threat in self.threats) else "MEDIUM"
+
+    def threat_summary(self) -> list[str]:
+        """Distinct 'LEVEL: category' entries, one per matched pattern."""
+        seen = dict.fromkeys((threat.level, threat.category, threat.pattern) for threat in self.threats)
+        return [f"{level}: {category}" for level, category, _ in seen]
+
+class Sanitizer:
+    """
+    Prompt-injection sanitizer that scans clean text once.
+
+    All threat patterns are compiled up front into one alternation per mode,
+    with a named group per pattern. A single finditer pass both reports the
+    threats and builds the cleaned text with one join, replacing every match
+    with a space. When something was removed, the result is scanned again
+    until no pattern matches, so removing a threat cannot reveal another one.
+
+    With a `time_budget`, an input whose scan overruns the budget is rejected.
+    The budget is a rejection threshold, not a bound: Python's re cannot be
+    interrupted mid-scan, so the combined scan always runs to completion and
+    the cost is already paid when the input is rejected. What keeps scans
+    cheap is the patterns themselves, which are written to stay linear
+    (possessive quantifiers, tag bodies that stop at the next opening tag).
+    The budget is measured in CPU time of the scanning thread, so time spent
+    waiting for the GIL under load does not get valid input rejected.
+
+    Profiling mode (`profile=True`) runs each pattern separately so the time
+    spent in each one can be recorded and exported as a histogram. There the
+    budget is checked between patterns, and the remaining patterns are
+    skipped once it is exhausted.
+    """
+
+    def __init__(self, high_patterns: dict = HIGH_THREAT_PATTERNS, medium_patterns: dict = MEDIUM_THREAT_PATTERNS,
+                 slow_call_threshold: float = 0.05, keep_slowest: int = 10):
+        self._groups: dict[str, tuple[str, str, str]] = {}
+        high = self._register("HIGH", high_patterns)
+        medium = self._register("MEDIUM", medium_patterns)
+        self._default_regex = self._compile(high)
+        self._strict_regex = self._compile(high + medium)
+        self._high_count = len(high)
+        self._pattern_regexes = [
+            (name, re.compile(pattern, PATTERN_FLAGS)) for name, pattern in high + medium
+        ]
+
+        self.slow_call_threshold = slow_call_threshold
+        self._keep_slowest = keep_slowest
+        self._stats_lock = threading.Lock()
+        self._pattern_stats = {name: [0, 0.0, 0.0] for name in self._groups}  # calls, total, max
+        self._slowest_inputs: list[tuple[float, int, str]] = []  # min-heap of (seconds, length, preview)
+
+    def _register(self, level: str, patterns: dict) -> list[tuple[str, str]]:
+        alternatives = []
+        for category, category_patterns in patterns.items():
+            for pattern in category_patterns:
+                name = f"p{len(self._groups)}"
+                self._groups[name] = (level, category, pattern)
+                alternatives.append((name, pattern))
+        return alternatives
+
+    @staticmethod
+    def _compile(alternatives: list[tuple[str, str]]) -> re.Pattern:
+        """
+        Combine patterns into one regex. Patterns starting with \\b share a single
+        word-boundary check, and when every pattern starts with a literal
+        character a lookahead on that character set lets the engine skip
+        non-candidate positions without trying each branch.
+        """
+        bounded = [f"(?P<{name}>{pattern[2:]})" for name, pattern in alternatives if pattern.startswith(r"\b")]
+        unbounded = [f"(?P<{name}>{pattern})" for name, pattern in alternatives if not pattern.startswith(r"\b")]
+        branches = ([r"\b(?:" + "|".join(bounded) + ")"] if bounded else []) + unbounded
+        combined = "|".join(branches)
+
+        leading = {_leading_literal(pattern) for _, pattern in alternatives}
+        if leading and None not in leading:
+            combined = "(?=[" + "".join(re.escape(char) for char in sorted(leading)) + "])(?:" + combined + ")"
+        return re.compile(combined, PATTERN_FLAGS)
+
+    def scan(self, text: str, strict_mode: bool = False) -> tuple[str, list[ThreatMatch]]:
+        """
+        Remove threat patterns from `text`; returns (cleaned_text, threats).
+
+        Replacing a match with a space can join the text around it into a new
+        match (e.g. a threat glued onto a code fence). Removing the patterns one
+        by one caught those, so the cleaned text is scanned again until nothing
+        matches. Clean input takes a single pass. Threat positions refer to the
+        text of the pass that found them.
+        """
+        regex = self._strict_regex if strict_mode else self._default_regex
+        threats = []
+        while True:
+            text, found = self._scan_once(regex, text)
+            if not found:
+                return text, threats
+            threats.extend(found)
+
+    def _scan_once(self, regex: re.Pattern, text: str) -> tuple[str, list[ThreatMatch]]:
+        groups = self._groups
+        parts = []
+        threats = []
+        position = 0
+        for match in regex.finditer(text):
+            level, category, pattern = groups[match.lastgroup]
+            start, end = match.span()
+            threats.append(ThreatMatch(level, category, pattern, start, end))
+            parts.append(text[position:start])
+            parts.append(" ")
+            position = end
+        if not threats:
+            return text, threats
+        parts.append(text[position:])
+        return "".join(parts), threats
+
+    def scan_timed(self, text: str, strict_mode: bool = False, time_budget: float | None = None) -> tuple[str, list[ThreatMatch], dict[str, float], bool]:
+        """
+        Scan pattern by pattern, timing each one and skipping the rest once
+        `time_budget` seconds are spent. Returns (cleaned_text, threats, pattern_timings, timed_out).
+        """
+        patterns = self._pattern_regexes if strict_mode else self._pattern_regexes[:self._high_count]
+        cpu_started = time.thread_time()
+        spans = []
+        timings = {}
+        timed_out = False
+        for name, regex in patterns:
+            pattern_started = time.perf_counter()
+            spans.extend((match.start(), match.end(), name) for match in regex.finditer(text))
+            timings[self._groups[name][2]] = time.perf_counter() - pattern_started
+            if time_budget is not None and time.thread_time() - cpu_started > time_budget:
+                timed_out = len(timings) < len(patterns)
+                break
+        self._record_pattern_timings(patterns, timings)
+
+        # Merge the per-pattern matches, skipping any that overlap an earlier one
+        spans.sort()
+        parts = []
+        threats = []
+        position = 0
+        for start, end, name in spans:
+            if start < position:
+                continue
+            level, category, pattern = self._groups[name]
+            threats.append(ThreatMatch(level, category, pattern, start, end))
+            parts.append(text[position:start])
+            parts.append(" ")
+            position = end
+        parts.append(text[position:])
+        return "".join(parts), threats, timings, timed_out
+
+    def _record_pattern_timings(self, patterns: list[tuple[str, re.Pattern]], timings: dict[str, float]):
+        with self._stats_lock:
+            for name, _ in patterns:
+                level, category, pattern = self._groups[name]
+                seconds = timings.get(pattern)
+                if seconds is None:
+                    continue
+                stats = self._pattern_stats[name]
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+                SANITIZER_PATTERN_SECONDS.observe(seconds, level=level, category=category, pattern=pattern)
+
+    def _record_call(self, text: str, elapsed: float):
+        if elapsed < self.slow_call_threshold:
+            return
+        logger.warning(f"Slow sanitization: {elapsed * 1000:.1f} ms for {len(text)} characters")
+        entry = (elapsed, len(text), text[:80])
+        with self._stats_lock:
+            if len(self._slowest_inputs) < self._keep_slowest:
+                heapq.heappush(self._slowest_inputs, entry)
+            else:
+                heapq.heappushpop(self._slowest_inputs, entry)
+
+    def slowest_patterns(self, limit: int = 5) -> list[dict]:
+        """Patterns with the highest worst-case scan time (timed mode only)."""
+        with self._stats_lock:
+            rows = [
+                {"level": self._groups[name][0], "category": self._groups[name][1], "pattern": self._groups[name][2],
+                 "calls": calls, "total_seconds": total, "max_seconds": worst}
+                for name, (calls, total, worst) in self._pattern_stats.items() if calls
+            ]
+        return sorted(rows, key=lambda row: row["max_seconds"], reverse=True)[:limit]
+
+    def slowest_inputs(self, limit: int = 5) -> list[dict]:
+        """Slowest inputs seen (above `slow_call_threshold`), slowest first."""
+        with self._stats_lock:
+            rows = sorted(self._slowest_inputs, reverse=True)[:limit]
+        return [{"seconds": seconds, "length": length, "preview": preview} for seconds, length, preview in rows]
+
+    def sanitize(self, text: str, max_length: int = 2000, strict_mode: bool = False, log_threats: bool = True,
+                 time_budget: float | None = None, profile: bool = False) -> SanitizationResult:
+        """
+        Truncate, strip threat patterns and normalize whitespace, returning a structured report.
+
+        If scanning uses more than `time_budget` seconds of CPU time the input is
+        rejected (empty text, `timed_out` set) and counted in
+        autolister_sanitizer_rejections. With `profile`, patterns are timed individually.
+        """
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        original_length = len(text)
+        truncated = original_length > max_length
+
+        # Cap input length
+        if truncated:
+            text = text[:max_length]
+            if log_threats:
+                logger.warning(f"Input truncated from {original_length} to {max_length} characters")
+
+        # Normalize whitespace before scanning: joining lines afterwards could
+        # complete a pattern that stops at line breaks (e.g. a <script> tag)
+        normalized = " ".join(text.split())
+        timings = {}
+        timed_out = False
+        if profile:
+            cleaned_text, threats, timings, timed_out = self.scan_timed(normalized, strict_mode, time_budget)
+            if threats and not timed_out:
+                # Matches created by removing the first ones
+                cleaned_text, rescanned = self.scan(cleaned_text, strict_mode)
+                threats.extend(rescanned)
+        else:
+            cleaned_text, threats = self.scan(normalized, strict_mode)
+            timed_out = time_budget is not None and time.thread_time() - cpu_started > time_budget
+        # Removed threats leave spaces behind; collapse them and strip the ends
+        if timed_out:
+            cleaned_text = ""
+        elif threats:
+            cleaned_text = " ".join(cleaned_text.split())
+        elapsed = time.perf_counter() - started
+        result = SanitizationResult(cleaned_text, original_length, truncated, threats, elapsed, timed_out, timings)
+        self._record_call(text, elapsed)
+
+        if timed_out:
+            detail = ""
+            if timings:
+                slowest = max(timings, key=timings.get)
+                detail = f" after {len(timings)} patterns (slowest: {slowest!r} at {timings[slowest] * 1000:.1f} ms)"
+            SANITIZER_REJECTIONS.inc(mode="profile" if profile else "combined")
+            logger.warning(f"Sanitization of {len(text)} characters exceeded its {time_budget * 1000:.0f} ms budget{detail}; input rejected")
+
+        # Log threats if detected
+        if log_threats and threats:
+            summary = result.threat_summary()
+            logger.warning(f"Threats detected in input - Level: {result.threat_level}, Count: {len(summary)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for threat in summary:
+                    logger.debug(f"Threat pattern: {threat}")
+            logger.info(f"Input sanitization completed. Original length: {original_length}, Final length: {len(cleaned_text)}")
+        return result
+
+# Compiling the combined patterns takes a noticeable share of import time, so
+# the shared sanitizer is built on first use instead
+_default_sanitizer = None
+_default_sanitizer_lock = threading.Lock()
+
+def get_default_sanitizer() -> Sanitizer:
+    """Return the shared Sanitizer, compiling its patterns on first use."""
+    global _default_sanitizer
+    if _default_sanitizer is None:
+        with _default_sanitizer_lock:
+            if _default_sanitizer is None:
+                _default_sanitizer = Sanitizer()
+    return _default_sanitizer
@@ -0,0 +1,200 @@
+import logging
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.message import Message
+from typing import Iterator
+from src.config import get_config, SmtpConfig
+from src.metrics import SMTP_FAILURES, stage
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the SMTP session is still usable (smtplib already sent RSET)
+_SESSION_SAFE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+class SMTPConnectionPool:
+    """
+    Pool of authenticated SMTP sessions reused across sends.
+
+    At most `size` sessions are open at once. Idle sessions older than
+    `idle_timeout` are closed. Sessions idle for longer than
+    `health_check_interval` are probed with NOOP before reuse. A send that hits
+    SMTPServerDisconnected is retried once on a newly opened session. The idle
+    sessions are dropped at that point too, since a server that closed one
+    session (e.g. on restart) has usually closed the others as well.
+    """
+
+    def __init__(self, server: str, port: int, username: str, password: str, size: int = 4,
+                 idle_timeout: float = 60.0, health_check_interval: float = 10.0,
+                 timeout: float = 30.0, use_tls: bool = True):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.use_tls = use_tls
+        self._idle: deque[tuple[smtplib.SMTP, float]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+        self.stats = {"connects": 0, "reuses": 0, "reconnects": 0, "health_check_failures": 0}
+
+    def _connect(self) -> smtplib.SMTP:
+        logger.info(f"Connecting to SMTP server: {self.server}:{self.port}")
+        with stage("smtp_connect"):
+            connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            with stage("smtp_login"):
+                if self.use_tls:
+                    connection.starttls()
+                if self.username:
+                    connection.login(self.username, self.password)
+        except Exception as e:
+            SMTP_FAILURES.inc(error=type(e).__name__)
+            self._discard(connection)
+            raise
+        self._count("connects")
+        return connection
+
+    def _count(self, name: str):
+        # Sends run on many threads; += on a shared dict entry is not atomic
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _discard(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _is_alive(self, connection: smtplib.SMTP) -> bool:
+        try:
+            return connection.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _checkout(self, fresh: bool = False) -> smtplib.SMTP:
+        if fresh:
+            return self._connect()
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._discard(connection)
+                continue
+            if idle_for > self.health_check_interval and not self._is_alive(connection):
+                self._count("health_check_failures")
+                connection.close()
+                continue
+            self._count("reuses")
+            return connection
+        return self._connect()
+
+    def _checkin(self, connection: smtplib.SMTP):
+        with self._lock:
+            if not self._closed:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._discard(connection)
+
+    def _drop_idle(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    @contextmanager
+    def connection(self, fresh: bool = False) -> Iterator[smtplib.SMTP]:
+        """
+        Borrow an authenticated SMTP session; it is returned to the pool on success.
+        With `fresh`, a new session is opened instead of reusing an idle one.
+        """
+        if self._closed:
+            raise RuntimeError("SMTP connection pool is closed")
+        self._slots.acquire()
+        try:
+            connection = self._checkout(fresh)
+            try:
+                yield connection
+            except _SESSION_SAFE_ERRORS:
+                self._checkin(connection)
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            self._checkin(connection)
+        finally:
+            self._slots.release()
+
+    def _send(self, send, fresh: bool = False):
+        with self.connection(fresh) as connection, stage("smtp_send"):
+            try:
+                return send(connection)
+            except Exception as e:
+                SMTP_FAILURES.inc(error=type(e).__name__)
+                raise
+
+    def _with_reconnect(self, send):
+        try:
+            return self._send(send)
+        except smtplib.SMTPServerDisconnected:
+            logger.warning("SMTP session dropped by server, reconnecting")
+            self._count("reconnects")
+            # The other idle sessions are likely stale as well
+            self._drop_idle()
+            return self._send(send, fresh=True)
+
+    def send_message(self, msg: Message, from_addr: str | None = None, to_addrs: list[str] | None = None) -> dict:
+        """Send an email.message.Message over a pooled session."""
+        return self._with_reconnect(lambda connection: connection.send_message(msg, from_addr, to_addrs))
+
+    def sendmail(self, from_addr: str, to_addrs: list[str], data: bytes | str) -> dict:
+        """Send a pre-serialized message over a pooled session."""
+        return self._with_reconnect(lambda connection: connection.sendmail(from_addr, to_addrs, data))
+
+    def close(self):
+        """Close all idle sessions; sessions in use are closed when returned."""
+        with self._lock:
+            self._closed = True
+        self._drop_idle()
+
+_pool = None
+_pool_settings = None
+_pool_lock = threading.Lock()
+
+def get_smtp_pool(smtp_config: SmtpConfig | None = None) -> SMTPConnectionPool:
+    """Return the shared SMTP pool, rebuilding it when the SMTP config changes."""
+    global _pool, _pool_settings
+    smtp_config = smtp_config or get_config().smtp
+    if smtp_config == _pool_settings:
+        return _pool
+    with _pool_lock:
+        if smtp_config != _pool_settings:
+            if _pool is not None:
+                _pool.close()
+            _pool = SMTPConnectionPool(
+                smtp_config.server,
+                smtp_config.port,
+                smtp_config.username,
+                smtp_config.password,
+                size=smtp_config.pool.size,
+                idle_timeout=smtp_config.pool.idle_timeout,
+                health_check_interval=smtp_config.pool.health_check_interval,
+                timeout=smtp_config.pool.timeout,
+                use_tls=smtp_config.use_tls
+            )
+            _pool_settings = smtp_config
+        return _pool
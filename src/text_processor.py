@@ -1,14 +1,136 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_core.language_models import BaseLanguageModel
-from src.templates import CAR_LISTING_PROMPT
+from src.templates import CAR_LISTING_PROMPT, get_prompt_variant
 from src.utils import CarListing, sanitize_input
-from src.config import setup_logging, load_config
+from src.rule_extractor import FIELD_UNITS, RuleExtraction, extract_rules, merge_listing, partial_listing_schema
+from src.config import get_config, CacheSettings
+from src.cache import TTLCache, make_cache_key
+from src.tokens import record_request_tokens, truncate_to_tokens
+from src.metrics import EXTRACTIONS, LLM_TOKENS, stage
+from pydantic import BaseModel
+import asyncio
+import copy
+from dataclasses import dataclass
+import random
+from functools import cache
+from typing import TYPE_CHECKING, AsyncIterator
+import threading
+import time
 import logging
 
-# Configure logging
-setup_logging()
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseLanguageModel
 logger = logging.getLogger(__name__)
 
+def _record_token_usage(response):
+    """Count prompt/completion tokens reported by the chat model into LLM_TOKENS."""
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if not usage:
+                continue
+            deployment = message.response_metadata.get("model_name") or "unknown"
+            LLM_TOKENS.inc(usage.get("input_tokens", 0), deployment=deployment, kind="prompt")
+            LLM_TOKENS.inc(usage.get("output_tokens", 0), deployment=deployment, kind="completion")
+
+@cache
+def _chain_config() -> dict:
+    """
+    Run config passed to every chain call so token usage is recorded without
+    touching the chain itself. Built on first use: langchain_core is only
+    imported once an extraction actually runs.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenMetricsHandler(BaseCallbackHandler):
+        run_inline = True
+
+        def on_llm_end(self, response, **kwargs):
+            _record_token_usage(response)
+
+    return {"callbacks": [TokenMetricsHandler()]}
+
+# Compiled extraction chains keyed by (id(llm), schema, template). The llm is
+# stored alongside its chain so its id cannot be reused while cached.
+_chain_cache = {}
+_chain_lock = threading.Lock()
+_chain_stats = {"builds": 0, "hits": 0}
+
+def get_extraction_chain(llm: "BaseLanguageModel", schema: type[BaseModel] = CarListing, template: str = CAR_LISTING_PROMPT,
+                         method: str | None = None):
+    """
+    Return the prompt | structured-output runnable for an LLM, building it only once.
+    Args:
+        llm (BaseLanguageModel): LLM client the chain is bound to.
+        schema (type[BaseModel]): Pydantic model used for structured output.
+        template (str): Prompt template with a {description} variable.
+        method (str | None): Structured output method passed to the model (default: the model's own default).
+    Returns:
+        Runnable: Cached chain producing instances of `schema`.
+    """
+    key = (id(llm), schema, template, method)
+    with _chain_lock:
+        entry = _chain_cache.get(key)
+        if entry is not None and entry[0] is llm:
+            _chain_stats["hits"] += 1
+            return entry[1]
+
+        from langchain_core.prompts import PromptTemplate
+
+        prompt = PromptTemplate(template=template, input_variables=["description"])
+        structured_llm = llm.with_structured_output(schema, method=method) if method else llm.with_structured_output(schema)
+        chain = prompt | structured_llm
+        _chain_cache[key] = (llm, chain)
+        _chain_stats["builds"] += 1
+        logger.info(f"Built extraction chain for {schema.__name__} ({_chain_stats['builds']} built so far)")
+        return chain
+
+def get_chain_stats() -> dict:
+    """Return extraction chain cache statistics (builds, hits, cached)."""
+    with _chain_lock:
+        return {**_chain_stats, "cached": len(_chain_cache)}
+
+def clear_chain_cache():
+    """Drop all cached extraction chains."""
+    with _chain_lock:
+        _chain_cache.clear()
+
+def discard_extraction_chains(llm: "BaseLanguageModel"):
+    """Drop the chains built for `llm`, e.g. a client replaced on config reload, so they do not keep it alive."""
+    with _chain_lock:
+        for key in [key for key, (owner, _) in _chain_cache.items() if owner is llm]:
+            del _chain_cache[key]
+
+_extraction_cache = None
+_extraction_cache_settings = None
+_extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache() -> TTLCache | None:
+    """Return the extraction result cache for the current config, or None if disabled."""
+    global _extraction_cache, _extraction_cache_settings
+    settings: CacheSettings = get_config().cache.extraction
+    if settings == _extraction_cache_settings:
+        return _extraction_cache
+    with _extraction_cache_lock:
+        if settings != _extraction_cache_settings:
+            if _extraction_cache is not None:
+                _extraction_cache.close()
+            _extraction_cache = TTLCache(
+                "extraction",
+                max_entries=settings.max_entries,
+                ttl_seconds=settings.ttl_seconds,
+                persist_path=settings.persist_path,
+                max_disk_entries=settings.max_disk_entries
+            ) if settings.enabled else None
+            _extraction_cache_settings = settings
+        return _extraction_cache
+
+def extraction_cache_key(sanitized_description: str, llm: "BaseLanguageModel", template: str | None = None) -> str:
+    """Key a result on the sanitized text, prompt (default: the configured variant's), model deployment and temperature."""
+    template = template or get_prompt_variant(get_config().extraction.prompt_variant).full
+    deployment = getattr(llm, "deployment_name", None) or getattr(llm, "model_name", None) or type(llm).__name__
+    temperature = getattr(llm, "temperature", None)
+    return make_cache_key(template, deployment, temperature, sanitized_description)
+
 def create_default_car_listing() -> dict:
     """Create a default car listing structure."""
     return {
@@ -33,49 +155,173 @@ def create_default_car_listing() -> dict:
         }
     }
 
-def process_text(description: str, llm: BaseLanguageModel) -> dict:
+def prepare_description(description: str) -> str | None:
     """
-    Process car description into structured JSON using LangChain and Pydantic.
+    Validate and sanitize a raw description before it is sent to the LLM.
     Args:
         description (str): User-provided car description.
     Returns:
-        dict: JSON with car details or default JSON on error.
+        str | None: Sanitized description, or None if nothing usable remains.
     """
-    try:
-        # Load config
-        config = load_config()
-        app_config = config['application']
+    config = get_config()
+    app_config = config.application
 
-        # Input validation
-        if not description or not isinstance(description, str):
-            logger.warning("Empty or invalid input provided")
-            return create_default_car_listing()
+    # Input validation
+    if not description or not isinstance(description, str):
+        logger.warning("Empty or invalid input provided")
+        return None
 
-        # Sanitize input
+    # Sanitize input
+    with stage("sanitize"):
         sanitized_description = sanitize_input(
             description,
-            max_length=app_config['max_input_length'],
-            strict_mode=app_config['strict_sanitization'],
-            log_threats=app_config['log_threats']
+            max_length=app_config.max_input_length,
+            strict_mode=app_config.strict_sanitization,
+            log_threats=app_config.log_threats,
+            time_budget=config.sanitization.time_budget,
+            profile=config.sanitization.profile
         )
-        if not sanitized_description:
-            logger.warning("Input is empty after sanitization")
-            return create_default_car_listing()
+    if not sanitized_description:
+        logger.warning("Input is empty after sanitization")
+        return None
+
+    # max_input_length caps characters; the LLM is billed (and slowed) by tokens
+    max_tokens = config.extraction.max_input_tokens
+    if max_tokens:
+        shortened = truncate_to_tokens(sanitized_description, max_tokens)
+        if shortened != sanitized_description:
+            logger.warning(f"Description shortened to fit {max_tokens} tokens ({len(sanitized_description)} -> {len(shortened)} characters)")
+            sanitized_description = shortened
+    return sanitized_description
 
+def plan_extraction(sanitized_description: str, partial: bool = True) -> tuple[RuleExtraction | None, tuple[str, ...] | None]:
+    """
+    Run the rule-based extractor and decide what is left for the LLM.
+    Args:
+        sanitized_description (str): Output of prepare_description().
+        partial (bool): Allow asking the LLM for only the unresolved fields.
+    Returns:
+        tuple: (rules, fields). `rules` is None when rule extraction is disabled.
+        `fields` is () when the rules alone are enough, the field units to ask
+        the LLM for when some were resolved, or None for a full extraction.
+    """
+    settings = get_config().extraction.rules
+    if not settings.enabled:
+        EXTRACTIONS.inc(path="llm")
+        return None, None
+    with stage("rules"):
+        rules = extract_rules(sanitized_description)
+    if rules.is_complete(settings.min_confidence, settings.required_fields):
+        EXTRACTIONS.inc(path="rules")
+        return rules, ()
+    missing = rules.unresolved(settings.min_confidence)
+    if not partial or len(missing) == len(FIELD_UNITS):
+        EXTRACTIONS.inc(path="llm")
+        return rules, None
+    EXTRACTIONS.inc(path="partial")
+    return rules, missing
+
+def _request_prompt(fields: tuple[str, ...] | None) -> tuple[str, str, type[BaseModel]]:
+    """(variant name, template, schema) for a full extraction or one of only `fields`."""
+    variant = get_prompt_variant(get_config().extraction.prompt_variant)
+    if fields is None:
+        return variant.name, variant.full, CarListing
+    return variant.name, variant.partial, partial_listing_schema(fields)
+
+def _planned_chain(llm: "BaseLanguageModel", fields: tuple[str, ...] | None, method: str | None = None):
+    """Full extraction chain, or one whose schema only has `fields`."""
+    _, template, schema = _request_prompt(fields)
+    return get_extraction_chain(llm, schema, template, method)
+
+def warm_up_extraction(llm: "BaseLanguageModel"):
+    """
+    Build the chain astream_text uses for a full extraction (the configured
+    prompt variant and CarListing, with function calling), so the first
+    request does not pay for imports and schema building.
+    Args:
+        llm (BaseLanguageModel): LLM client the requests will use.
+    """
+    _planned_chain(llm, None, method="function_calling")
+
+def _record_tokens(fields: tuple[str, ...] | None, sanitized_description: str, output: BaseModel | None):
+    """Record prompt, schema and completion tokens of one extraction request."""
+    try:
+        variant, template, schema = _request_prompt(fields)
+        record_request_tokens(variant, template.format(description=sanitized_description), schema, output)
+    except Exception as e:
+        logger.warning(f"Token accounting failed: {str(e)}")
+
+def _complete_listing(rules: RuleExtraction | None, output: BaseModel | None) -> dict:
+    """Turn LLM output (full or partial) plus rule values into a listing dict."""
+    if rules is None:
+        return output.model_dump()
+    car = output.model_dump()["car"] if output is not None else None
+    return merge_listing(rules, car, get_config().extraction.rules.min_confidence)
+
+@dataclass
+class _Extraction:
+    """One extraction between _start_extraction and _finish_extraction."""
+    sanitized_description: str | None = None
+    cache: TTLCache | None = None
+    cache_key: str | None = None
+    rules: RuleExtraction | None = None
+    fields: tuple[str, ...] | None = None
+    # Set when there is nothing to ask the LLM: empty input, a cache hit or a rule-only listing
+    result: dict | None = None
+
+def _start_extraction(description: str, llm: "BaseLanguageModel") -> _Extraction:
+    """Sanitize, look up the cache and plan what is left for the LLM."""
+    sanitized_description = prepare_description(description)
+    if not sanitized_description:
+        return _Extraction(result=create_default_car_listing())
+
+    cache = get_extraction_cache()
+    cache_key = extraction_cache_key(sanitized_description, llm) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info("Returning cached car listing")
+            return _Extraction(sanitized_description, result=cached)
+
+    rules, fields = plan_extraction(sanitized_description)
+    extraction = _Extraction(sanitized_description, cache, cache_key, rules, fields)
+    if fields == ():
+        logger.info("Car listing fully resolved by rule-based extraction")
+        extraction.result = _finish_extraction(extraction, None)
+    else:
         logger.info(f"Processing car description with {len(sanitized_description)} characters")
+    return extraction
 
-        # Setup parser and chain
-        prompt = PromptTemplate(template=CAR_LISTING_PROMPT, input_variables=["description"])
-        structured_llm = llm.with_structured_output(CarListing)
-        chain = prompt | structured_llm 
+def _finish_extraction(extraction: _Extraction, output: BaseModel | None) -> dict:
+    """Record tokens, merge the rule values into the LLM output and cache the listing."""
+    if extraction.fields != ():
+        _record_tokens(extraction.fields, extraction.sanitized_description, output)
+    if extraction.rules is None and output is None:
+        raise ValueError("Extraction produced no output")
+    result = _complete_listing(extraction.rules, output)
+    if extraction.cache:
+        extraction.cache.set(extraction.cache_key, result)
+    logger.info("Successfully processed car listing")
+    return result
+
+def process_text(description: str, llm: "BaseLanguageModel") -> dict:
+    """
+    Process car description into structured JSON using LangChain and Pydantic.
+    Args:
+        description (str): User-provided car description.
+    Returns:
+        dict: JSON with car details or default JSON on error.
+    """
+    try:
+        extraction = _start_extraction(description, llm)
+        if extraction.result is not None:
+            return extraction.result
 
         # Process with LangChain
-        car_listing = chain.invoke({"description": sanitized_description})
-        
-        # Convert Pydantic model to dict
-        result = car_listing.model_dump()
-        logger.info("Successfully processed car listing")
-        return result
+        chain = _planned_chain(llm, extraction.fields)
+        with stage("llm"):
+            car_listing = chain.invoke({"description": extraction.sanitized_description}, config=_chain_config())
+        return _finish_extraction(extraction, car_listing)
 
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
@@ -84,3 +330,195 @@ def process_text(description: str, llm: BaseLanguageModel) -> dict:
     except Exception as e:
         logger.error(f"Unexpected error processing text: {str(e)}")
         return create_default_car_listing()
+
+async def aprocess_text(description: str, llm: "BaseLanguageModel") -> dict:
+    """
+    Async variant of process_text that awaits the LLM via ainvoke.
+
+    Sanitizing, rule extraction, cache access and token counting are
+    synchronous, so they run in a worker thread to keep the event loop free.
+    Args:
+        description (str): User-provided car description.
+    Returns:
+        dict: JSON with car details or default JSON on error.
+    """
+    try:
+        extraction = await asyncio.to_thread(_start_extraction, description, llm)
+        if extraction.result is not None:
+            return extraction.result
+
+        chain = _planned_chain(llm, extraction.fields)
+        with stage("llm"):
+            car_listing = await chain.ainvoke({"description": extraction.sanitized_description}, config=_chain_config())
+        return await asyncio.to_thread(_finish_extraction, extraction, car_listing)
+
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        return create_default_car_listing()
+
+    except Exception as e:
+        logger.error(f"Unexpected error processing text: {str(e)}")
+        return create_default_car_listing()
+
+async def astream_text(description: str, llm: "BaseLanguageModel") -> AsyncIterator[dict]:
+    """
+    Stream the extraction, yielding partial listings as the structured output arrives.
+
+    Each yielded dict is a valid (but possibly incomplete) car listing; the
+    last one is the final result, which is cached like aprocess_text's. As
+    there, the synchronous steps before and after the LLM run in a worker thread.
+    Args:
+        description (str): User-provided car description.
+    Returns:
+        AsyncIterator[dict]: Progressively more complete listings (default JSON on error).
+    """
+    try:
+        extraction = await asyncio.to_thread(_start_extraction, description, llm)
+        if extraction.result is not None:
+            yield extraction.result
+            return
+
+        rules = extraction.rules
+        shown = None
+        if rules is not None and rules.values:
+            # The rule-based fields are available before the LLM answers
+            shown = _complete_listing(rules, None)
+            yield copy.deepcopy(shown)
+
+        # json_schema output is only parsed once complete; tool-call arguments parse incrementally
+        chain = _planned_chain(llm, extraction.fields, method="function_calling")
+        final = None
+        with stage("llm"):
+            async for car_listing in chain.astream({"description": extraction.sanitized_description}, config=_chain_config()):
+                if car_listing is None:
+                    continue
+                final = car_listing
+                partial = _complete_listing(rules, car_listing)
+                # Chunks that do not change the parsed fields are not worth a re-render
+                if partial != shown:
+                    shown = partial
+                    yield copy.deepcopy(partial)
+
+        result = await asyncio.to_thread(_finish_extraction, extraction, final)
+        if result != shown:
+            yield result
+
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        yield create_default_car_listing()
+
+    except Exception as e:
+        logger.error(f"Unexpected error processing text: {str(e)}")
+        yield create_default_car_listing()
+
+def _retryable_errors() -> tuple[type[Exception], ...]:
+    """Transient OpenAI errors (rate limits, timeouts, 5xx) worth retrying with backoff."""
+    try:
+        import openai
+    except ImportError:
+        return ()
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Honour a server-provided Retry-After header, else back off exponentially with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), 60.0)
+    except ValueError:
+        pass
+    return min(2 ** (attempt - 1), 30.0) + random.uniform(0, 1)
+
+def _batch_with_retry(chain, inputs: list[dict], max_concurrency: int, attempts: int) -> list:
+    """Run chain.batch, re-batching only the items that failed with a transient error."""
+    config = {**_chain_config(), "max_concurrency": max_concurrency}
+    with stage("llm_batch"):
+        outputs = chain.batch(inputs, config=config, return_exceptions=True)
+    retryable = _retryable_errors()
+    for attempt in range(1, attempts):
+        retry_indexes = [i for i, output in enumerate(outputs) if isinstance(output, retryable)]
+        if not retry_indexes:
+            break
+        delay = max(_retry_delay(outputs[i], attempt) for i in retry_indexes)
+        logger.warning(f"Retrying {len(retry_indexes)} rate-limited/transient failures in {delay:.1f}s (attempt {attempt + 1}/{attempts})")
+        time.sleep(delay)
+        with stage("llm_batch"):
+            retried = chain.batch([inputs[i] for i in retry_indexes], config=config, return_exceptions=True)
+        for i, output in zip(retry_indexes, retried):
+            outputs[i] = output
+    return outputs
+
+def process_texts(descriptions: list[str], llm: "BaseLanguageModel", max_concurrency: int | None = None) -> list[dict]:
+    """
+    Process many car descriptions concurrently using the chain's batch API.
+    Args:
+        descriptions (list[str]): User-provided car descriptions.
+        llm (BaseLanguageModel): LLM client to extract with.
+        max_concurrency (int | None): Maximum in-flight LLM calls (default: extraction.max_concurrency).
+    Returns:
+        list[dict]: One result per description, in input order. Items that fail
+        fall back to the default car listing without affecting the rest.
+    """
+    extraction_config = get_config().extraction
+    max_concurrency = max_concurrency or extraction_config.max_concurrency
+    results: list[dict | None] = [None] * len(descriptions)
+    cache = get_extraction_cache()
+
+    # Sanitize, serve cache hits and rule-only results, and collapse duplicate descriptions.
+    # The rest is batched with the full schema (one chain for the whole batch); confident
+    # rule values still override the LLM's.
+    pending: dict[str, tuple[str, list[int], RuleExtraction | None]] = {}
+    for index, description in enumerate(descriptions):
+        try:
+            sanitized_description = prepare_description(description)
+        except Exception as e:
+            logger.error(f"Unexpected error preparing description {index}: {str(e)}")
+            sanitized_description = None
+        if not sanitized_description:
+            results[index] = create_default_car_listing()
+            continue
+
+        cache_key = extraction_cache_key(sanitized_description, llm)
+        if cache_key in pending:
+            pending[cache_key][1].append(index)
+            continue
+        cached = cache.get(cache_key) if cache else None
+        if cached is not None:
+            results[index] = cached
+            continue
+        rules, fields = plan_extraction(sanitized_description, partial=False)
+        if fields == ():
+            results[index] = _complete_listing(rules, None)
+            if cache:
+                cache.set(cache_key, results[index])
+            continue
+        pending[cache_key] = (sanitized_description, [index], rules)
+
+    if pending:
+        logger.info(f"Processing {len(pending)} car descriptions in batch (max_concurrency={max_concurrency})")
+        items = list(pending.items())
+        outputs = _batch_with_retry(
+            _planned_chain(llm, None),
+            [{"description": sanitized} for _, (sanitized, _, _) in items],
+            max_concurrency,
+            extraction_config.retry_attempts
+        )
+
+        failures = 0
+        for (cache_key, (sanitized_description, indexes, rules)), output in zip(items, outputs):
+            if isinstance(output, Exception):
+                failures += 1
+                logger.error(f"Error processing description {indexes[0]}: {str(output)}")
+                for index in indexes:
+                    results[index] = create_default_car_listing()
+                continue
+            _record_tokens(None, sanitized_description, output)
+            result = _complete_listing(rules, output)
+            if cache:
+                cache.set(cache_key, result)
+            for position, index in enumerate(indexes):
+                results[index] = result if position == 0 else copy.deepcopy(result)
+        logger.info(f"Batch processing completed: {len(pending) - failures} succeeded, {failures} failed")
+
+    return results
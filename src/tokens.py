@@ -0,0 +1,113 @@
+import json
+import logging
+import re
+import threading
+from functools import lru_cache
+from pydantic import BaseModel
+from src.config import get_config
+from src.metrics import INPUT_TRUNCATIONS, REQUEST_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Token counting for extraction requests. Counts use the deployment's
+# tiktoken encoding (extraction.token_encoding); when it cannot be loaded
+# (tiktoken missing, or its encoding file cannot be downloaded) or is set to
+# "approximate", roughly four characters per token are assumed.
+
+APPROXIMATE = "approximate"
+CHARS_PER_TOKEN = 4
+_TRUNCATION_MARK = " ... "
+
+_encoding = None
+_encoding_name = None
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    """Return the configured tiktoken encoding, or None when counting approximately."""
+    global _encoding, _encoding_name
+    name = get_config().extraction.token_encoding
+    if name == _encoding_name:
+        return _encoding
+    with _encoding_lock:
+        if name != _encoding_name:
+            encoding = None
+            if name != APPROXIMATE:
+                try:
+                    import tiktoken
+                    encoding = tiktoken.get_encoding(name)
+                except Exception as e:
+                    logger.warning(f"Token encoding '{name}' unavailable ({str(e)}); approximating token counts")
+            _encoding, _encoding_name = encoding, name
+        return _encoding
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text` for the configured encoding."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+@lru_cache(maxsize=256)
+def _schema_tokens(schema: type[BaseModel], encoding_name: str) -> int:
+    return count_tokens(json.dumps(schema.model_json_schema(), separators=(",", ":")))
+
+def schema_tokens(schema: type[BaseModel]) -> int:
+    """Approximate tokens the structured-output schema adds to every request (cached per schema)."""
+    return _schema_tokens(schema, get_config().extraction.token_encoding)
+
+def compact_text(text: str) -> str:
+    """Collapse whitespace and drop repeated sentences, which cost tokens but add no information."""
+    seen = set()
+    sentences = []
+    for sentence in re.split(r"(?<=[.!?\n])\s+", text):
+        sentence = " ".join(sentence.split())
+        key = sentence.lower().rstrip(".!?")
+        if not sentence or key in seen:
+            continue
+        seen.add(key)
+        sentences.append(sentence)
+    return " ".join(sentences)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Fit `text` into `max_tokens`, compacting it first and then cutting from the middle.
+    Args:
+        text (str): Sanitized description.
+        max_tokens (int): Token budget for the description.
+    Returns:
+        str: `text` unchanged if it fits, else its compacted and (if still needed) truncated form.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    compacted = compact_text(text)
+    if count_tokens(compacted) <= max_tokens:
+        INPUT_TRUNCATIONS.inc(kind="compacted")
+        return compacted
+
+    INPUT_TRUNCATIONS.inc(kind="truncated")
+    # Listings tend to open with the car and close with the price, so keep both ends
+    budget = max(max_tokens - count_tokens(_TRUNCATION_MARK), 2)
+    head = budget * 3 // 4
+    tail = budget - head
+    encoding = get_encoding()
+    if encoding is None:
+        head_chars, tail_chars = head * CHARS_PER_TOKEN, tail * CHARS_PER_TOKEN
+        return compacted[:head_chars].rstrip() + _TRUNCATION_MARK + compacted[-tail_chars:].lstrip()
+    tokens = encoding.encode(compacted, disallowed_special=())
+    return encoding.decode(tokens[:head]).rstrip() + _TRUNCATION_MARK + encoding.decode(tokens[-tail:]).lstrip()
+
+def record_request_tokens(variant: str, prompt: str, schema: type[BaseModel], output: BaseModel | None):
+    """
+    Record the token cost of one extraction request by part.
+    Args:
+        variant (str): Prompt variant name.
+        prompt (str): Rendered prompt (template with the description).
+        schema (type[BaseModel]): Structured-output schema sent with the request.
+        output (BaseModel | None): Parsed structured output, counted as the completion.
+    """
+    REQUEST_TOKENS.observe(count_tokens(prompt), part="prompt", variant=variant)
+    REQUEST_TOKENS.observe(schema_tokens(schema), part="schema", variant=variant)
+    if output is not None:
+        REQUEST_TOKENS.observe(count_tokens(output.model_dump_json()), part="completion", variant=variant)
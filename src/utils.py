@@ -1,10 +1,8 @@
 import logging
 from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
-import re
-from src.config import setup_logging
+from src.sanitizer import get_default_sanitizer
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 class Tires(BaseModel):
@@ -50,7 +48,8 @@ class Car(BaseModel):
 class CarListing(BaseModel):
     car: Car = Field(description="Car details")
 
-def sanitize_input(text: str, max_length: int = 2000, strict_mode: bool = False, log_threats: bool = True) -> str:
+def sanitize_input(text: str, max_length: int = 2000, strict_mode: bool = False, log_threats: bool = True,
+                   time_budget: Optional[float] = None, profile: bool = False) -> str:
     """
     Enhanced input sanitization to prevent prompt injection attacks while preserving legitimate content.
     
@@ -59,6 +58,8 @@ def sanitize_input(text: str, max_length: int = 2000, strict_mode: bool = False,
         max_length (int): Maximum allowed input length (default: 2000)
         strict_mode (bool): If True, applies stricter sanitization rules (default: False)
         log_threats (bool): Whether to log detected threats (default: True)
+        time_budget (float): Seconds the sanitizer may spend before rejecting the input (default: None)
+        profile (bool): If True, records per-pattern timings (default: False)
     
     Returns:
         str: Sanitized input text
@@ -67,99 +68,12 @@ def sanitize_input(text: str, max_length: int = 2000, strict_mode: bool = False,
     if not isinstance(text, str):
         logger.warning(f"Invalid input type received: {type(text)}")
         return ""
-    
-    original_length = len(text)
-    
-    # Cap input length
-    if len(text) > max_length:
-        text = text[:max_length]
-        if log_threats:
-            logger.warning(f"Input truncated from {original_length} to {max_length} characters")
-    
-    threats_detected = []
-    cleaned_text = text
-    
-    # High-threat patterns that should always be removed
-    HIGH_THREAT_PATTERNS = {
-        'instruction_override': [
-            r'\bignore\s+(?:all\s+)?(?:previous|above|prior)\s+(?:instructions?|prompts?|rules?)\b',
-            r'\bforget\s+(?:everything|all|previous|above)\b',
-            r'\bdisregard\s+(?:previous|above|all)\s+(?:instructions?|prompts?)\b',
-            r'\boverride\s+(?:system|previous|default)\s+(?:settings?|instructions?|prompts?)\b',
-        ],
-        'system_manipulation': [
-            r'\bsystem\s*:\s*(?:you\s+are|act\s+as|behave\s+like)',
-            r'\bassistant\s*:\s*(?:you\s+are|act\s+as)',
-            r'\bnow\s+(?:you\s+are|act\s+as|behave\s+like)\s+(?:a\s+)?(?:car\s+dealer|salesperson)',
-            r'\bpretend\s+(?:you\s+are|to\s+be)\s+(?:a\s+)?(?:car\s+dealer|salesperson)',
-        ],
-        'code_injection': [
-            r'```\s*(?:python|javascript|sql|bash|sh|cmd)',
-            r'<script\b[^>]*>.*?</script>',
-            r'<iframe\b[^>]*>.*?</iframe>',
-            r'\beval\s*\(',
-            r'\bexec\s*\(',
-            r'__import__\s*\(',
-        ],
-        'data_extraction': [
-            r'\bprint\s+(?:all\s+)?(?:system\s+)?(?:prompts?|instructions?|data)\b',
-            r'\bshow\s+(?:me\s+)?(?:your\s+)?(?:system\s+)?(?:prompts?|instructions?|data)\b',
-            r'\breveal\s+(?:your\s+)?(?:system\s+)?(?:prompts?|instructions?)\b',
-            r'\bdisplay\s+(?:all\s+)?(?:hidden\s+)?(?:prompts?|instructions?)\b',
-        ]
-    }
-    
-    # Medium-threat patterns (only removed in strict mode)
-    MEDIUM_THREAT_PATTERNS = {
-        'role_confusion': [
-            r'\bas\s+(?:a\s+)?(?:car\s+dealer|salesperson|expert),\s*(?:you\s+should|please)',
-            r'\byou\s+are\s+now\s+(?:a\s+)?(?:car\s+dealer|salesperson)',
-            r'\bchange\s+your\s+role\s+to\b',
-        ],
-        'context_manipulation': [
-            r'\bstart\s+(?:over|new|fresh)\b',
-            r'\breset\s+(?:context|conversation|everything)\b',
-            r'\bclear\s+(?:previous|all)\s+(?:context|data)\b',
-        ],
-        'unusual_formatting': [
-            r'={10,}', 
-            r'-{10,}',  
-            r'\*{10,}', 
-            r'#{5,}',   
-        ]
-    }
-    
-    # Remove high-threat patterns (always removed)
-    for category, patterns in HIGH_THREAT_PATTERNS.items():
-        for pattern in patterns:
-            matches = list(re.finditer(pattern, cleaned_text, re.IGNORECASE | re.MULTILINE))
-            if matches:
-                threats_detected.append(f"HIGH: {category}")
-                for match in reversed(matches):  # Reverse to maintain indices
-                    cleaned_text = cleaned_text[:match.start()] + " " + cleaned_text[match.end():]
-    
-    # Remove medium-threat patterns (only in strict mode)
-    if strict_mode:
-        for category, patterns in MEDIUM_THREAT_PATTERNS.items():
-            for pattern in patterns:
-                matches = list(re.finditer(pattern, cleaned_text, re.IGNORECASE | re.MULTILINE))
-                if matches:
-                    threats_detected.append(f"MEDIUM: {category}")
-                    for match in reversed(matches):
-                        cleaned_text = cleaned_text[:match.start()] + " " + cleaned_text[match.end():]
-    
-    # Log threats if detected
-    if log_threats and threats_detected:
-        threat_level = "HIGH" if any("HIGH:" in threat for threat in threats_detected) else "MEDIUM"
-        logger.warning(f"Threats detected in input - Level: {threat_level}, Count: {len(threats_detected)}")
-        for threat in threats_detected:
-            logger.debug(f"Threat pattern: {threat}")
-        logger.info(f"Input sanitization completed. Original length: {original_length}, Final length: {len(cleaned_text)}")
-    
-    # Normalize whitespace
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
-    
-    # Remove leading/trailing whitespace
-    cleaned_text = cleaned_text.strip()
-    
-    return cleaned_text
\ No newline at end of file
+
+    return get_default_sanitizer().sanitize(
+        text,
+        max_length=max_length,
+        strict_mode=strict_mode,
+        log_threats=log_threats,
+        time_budget=time_budget,
+        profile=profile
+    ).text
@@ -0,0 +1,29 @@
+import socket
+import pytest
+
+@pytest.fixture(autouse=True)
+def offline_token_counting(monkeypatch):
+    """Count tokens approximately so tests never try to download a tiktoken encoding."""
+    monkeypatch.setattr("src.tokens.get_encoding", lambda: None)
+
+@pytest.fixture
+def smtp_server():
+    """Local aiosmtpd sink standing in for the real SMTP server."""
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+
+    class Sink:
+        def __init__(self):
+            self.messages = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.messages.append(envelope)
+            return "250 OK"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    sink = Sink()
+    controller = controller_module.Controller(sink, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield "127.0.0.1", port, sink
+    controller.stop()
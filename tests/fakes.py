@@ -0,0 +1,263 @@
+"""
+Local stand-ins for Azure OpenAI and SMTP, used by the tests and the end-to-end benchmarks.
+
+FakeOpenAIServer speaks enough of the Azure OpenAI chat completions API for
+LangChain's structured output. That covers json_schema and function calling
+responses, both plain and streamed (SSE), with usage reporting. Every
+response is delayed by a configurable latency, and the server can be told
+to answer with an error status instead (e.g. 429 with Retry-After).
+FakeSMTPServer is an aiosmtpd sink that accepts any login and counts
+delivered messages.
+"""
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def fake_listing(description: str) -> dict:
+    """A plausible extraction for a description (brand and model are its first two words)."""
+    words = (description.split() + ["Unknown", "Unknown"])[:2]
+    return {
+        "car": {
+            "body_type": "Sedan",
+            "color": "Silver",
+            "brand": words[0],
+            "model": words[1],
+            "manufactured_year": 2020,
+            "motor_size_cc": 2000,
+            "tires": {"type": "All-season", "manufactured_year": 2022},
+            "windows": "Tinted",
+            "notices": [{"type": "Maintenance", "description": "Full service history"}],
+            "price": {"amount": 22000.0, "currency": "USD"},
+            "estimated_price": None
+        }
+    }
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_FakeOpenAIHTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if "/chat/completions" not in self.path:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        self.server.requests += 1
+        time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        if self.server.fail_status:
+            headers = {"Retry-After": str(self.server.retry_after)} if self.server.retry_after is not None else {}
+            self._send_json(self.server.fail_status, {"error": {"code": str(self.server.fail_status),
+                                                                "message": "Injected failure"}}, headers)
+            return
+
+        description = body["messages"][-1]["content"] if body.get("messages") else ""
+        if isinstance(description, list):
+            description = " ".join(part.get("text", "") for part in description)
+        description = description.split("Description:")[-1].strip()
+        arguments = json.dumps(fake_listing(description))
+        tool = body["tools"][0]["function"]["name"] if body.get("tools") else None
+        usage = {"prompt_tokens": len(str(body.get("messages"))) // 4, "completion_tokens": len(arguments) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if body.get("stream"):
+            self._stream(body, arguments, tool, usage)
+        else:
+            message = {"role": "assistant", "content": None if tool else arguments}
+            if tool:
+                message["tool_calls"] = [{"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                                          "function": {"name": tool, "arguments": arguments}}]
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model") or "fake-gpt",
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool else "stop"}],
+                "usage": usage
+            })
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, body: dict, arguments: str, tool: str | None, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def event(delta: dict, finish_reason=None, with_usage=False):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body.get("model") or "fake-gpt",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if not with_usage else []}
+            if with_usage:
+                chunk["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        piece = max(1, len(arguments) // self.server.stream_chunks)
+        if tool:
+            event({"role": "assistant", "tool_calls": [{"index": 0, "id": "call_0", "type": "function",
+                                                        "function": {"name": tool, "arguments": ""}}]})
+        else:
+            event({"role": "assistant", "content": ""})
+        for start in range(0, len(arguments), piece):
+            text = arguments[start:start + piece]
+            if tool:
+                event({"tool_calls": [{"index": 0, "function": {"arguments": text}}]})
+            else:
+                event({"content": text})
+            if self.server.stream_interval:
+                time.sleep(self.server.stream_interval)
+        event({}, finish_reason="tool_calls" if tool else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event({}, with_usage=True)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+class _FakeOpenAIHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    latency = 0.0
+    jitter = 0.0
+    stream_chunks = 8
+    stream_interval = 0.0
+    fail_status = None
+    retry_after = None
+    requests = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that give up on a request (e.g. a cancelled hedge) just hang up
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class FakeOpenAIServer:
+    """
+    Azure OpenAI-compatible chat completions endpoint on localhost.
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        jitter (float): Extra random delay, uniformly distributed in [0, jitter].
+        stream_chunks (int): Number of pieces a streamed answer is split into.
+        stream_interval (float): Delay between streamed pieces.
+        fail_status (int | None): Answer every request with this HTTP error status instead.
+        retry_after (float | None): Retry-After header sent with error responses.
+
+    latency, fail_status and retry_after can be changed while the server runs.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, stream_chunks: int = 8, stream_interval: float = 0.0,
+                 fail_status: int | None = None, retry_after: float | None = None):
+        self._server = _FakeOpenAIHTTPServer(("127.0.0.1", free_port()), _ChatHandler)
+        self._server.latency = latency
+        self._server.jitter = jitter
+        self._server.stream_chunks = stream_chunks
+        self._server.stream_interval = stream_interval
+        self._server.fail_status = fail_status
+        self._server.retry_after = retry_after
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    @property
+    def latency(self) -> float:
+        return self._server.latency
+
+    @latency.setter
+    def latency(self, value: float):
+        self._server.latency = value
+
+    @property
+    def fail_status(self) -> int | None:
+        return self._server.fail_status
+
+    @fail_status.setter
+    def fail_status(self, value: int | None):
+        self._server.fail_status = value
+
+    @property
+    def retry_after(self) -> float | None:
+        return self._server.retry_after
+
+    @retry_after.setter
+    def retry_after(self, value: float | None):
+        self._server.retry_after = value
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class FakeSMTPServer:
+    """aiosmtpd sink on localhost that accepts any credentials and counts messages."""
+
+    def __init__(self):
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+
+        class Sink:
+            def __init__(self):
+                self.messages = 0
+                self.recipients = 0
+
+            async def handle_DATA(self, server, session, envelope):
+                self.messages += 1
+                self.recipients += len(envelope.rcpt_tos)
+                return "250 OK"
+
+        self.sink = Sink()
+        self.port = free_port()
+        self._controller = Controller(
+            self.sink, hostname="127.0.0.1", port=self.port,
+            authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False
+        )
+
+    @property
+    def messages(self) -> int:
+        return self.sink.messages
+
+    def start(self) -> "FakeSMTPServer":
+        self._controller.start()
+        return self
+
+    def stop(self):
+        self._controller.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
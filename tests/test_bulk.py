@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain_core.runnables import RunnableLambda
+from src import bulk
+from src.email_queue import EmailQueue, PENDING
+
+class EchoLLM:
+    """Fake chat model whose extracted brand is the first word of the description."""
+
+    def with_structured_output(self, schema):
+        def respond(prompt_value):
+            brand = prompt_value.to_string().split("Description:")[-1].split()[0]
+            return schema.model_validate({"car": {"brand": brand, "model": "X", "manufactured_year": 2020}})
+        return RunnableLambda(respond)
+
+def write_csv(path, rows):
+    lines = ["id,description,recipient,image"] + [",".join(row) for row in rows]
+    path.write_text("\n".join(lines) + "\n")
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_streams_rows_in_chunks_and_writes_results(tmp_path, monkeypatch):
+    image = tmp_path / "car.jpg"
+    image.write_bytes(b"jpeg")
+    batches = []
+    monkeypatch.setattr(bulk, "classify_car_images", lambda images: batches.append(images) or ["SUV"] * len(images))
+    source = tmp_path / "stock.csv"
+    write_csv(source, [
+        ("a", "Toyota Camry 2020", "one@example.com", str(image)),
+        ("b", "Kia Sportage 2019", "two@example.com", ""),
+        ("c", "Ford Ranger 2018", "three@example.com", str(image)),
+    ])
+    output = tmp_path / "results.jsonl"
+
+    summary = bulk.run(source, output, workers=2, chunk_size=2, send=False, llm=EchoLLM())
+
+    results = read_results(output)
+    assert [r["id"] for r in results] == ["a", "b", "c"]
+    assert [r["car"]["brand"] for r in results] == ["Toyota", "Kia", "Ford"]
+    assert results[0]["car"]["body_type"] == "SUV" and results[1]["car"]["body_type"] != "SUV"
+    assert summary["extracted"] == 3
+    # One classifier batch per chunk that has photos
+    assert [len(b) for b in batches] == [1, 1]
+
+def test_resume_skips_completed_rows(tmp_path, monkeypatch):
+    source = tmp_path / "stock.jsonl"
+    source.write_text("".join(
+        json.dumps({"description": f"Brand{i} car", "recipient": f"buyer{i}@example.com"}) + "\n" for i in range(4)
+    ))
+    output = tmp_path / "results.jsonl"
+    sent = []
+    failing = {"buyer2@example.com"}
+
+    def fake_send(car_data, recipient, photo_path=None, use_queue=False, idempotency_key=None):
+        if recipient in failing:
+            return False
+        sent.append(recipient)
+        return True
+
+    monkeypatch.setattr(bulk, "send_car_listing_email", fake_send)
+    first = bulk.run(source, output, workers=2, llm=EchoLLM())
+    assert first["sent"] == 3 and first["failed"] == 1
+
+    failing.clear()
+    # A crash can leave a truncated last line behind
+    with open(output, "a") as f:
+        f.write('{"id": "4", "sta')
+    second = bulk.run(source, output, workers=2, resume=True, llm=EchoLLM())
+
+    assert second["skipped"] == 3 and second["sent"] == 1
+    assert sent.count("buyer2@example.com") == 1 and len(sent) == 4
+    assert bulk.completed_ids(output) == {"1", "2", "3", "4"}
+
+def test_resume_after_crash_does_not_queue_rows_twice(tmp_path, monkeypatch):
+    queue = EmailQueue(tmp_path / "outbox.sqlite3")
+    monkeypatch.setattr("src.email_queue.get_email_queue", lambda: queue)
+    monkeypatch.setattr("src.email_sender.get_smtp_config", lambda: {"username": "dealer@example.com"})
+    source = tmp_path / "stock.jsonl"
+    source.write_text("".join(
+        json.dumps({"description": f"Brand{i} car", "recipient": f"buyer{i}@example.com"}) + "\n" for i in range(4)
+    ))
+    output = tmp_path / "results.jsonl"
+
+    assert bulk.run(source, output, workers=2, use_queue=True, llm=EchoLLM())["queued"] == 4
+    # The crash lost the last two records after they were queued
+    lines = output.read_text().splitlines(keepends=True)
+    output.write_text("".join(lines[:2]))
+    resumed = bulk.run(source, output, workers=2, resume=True, use_queue=True, llm=EchoLLM())
+
+    assert resumed["skipped"] == 2 and resumed["queued"] == 2
+    assert queue.stats()[PENDING] == 4
+    queue.close()
+
+def test_missing_image_fails_row_without_sending(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk, "send_car_listing_email", lambda *a, **k: (_ for _ in ()).throw(AssertionError("sent")))
+    source = tmp_path / "stock.jsonl"
+    source.write_text(json.dumps({"id": 7, "description": "Audi A4", "recipient": "a@example.com",
+                                  "image": str(tmp_path / "missing.jpg")}) + "\n")
+    output = tmp_path / "results.jsonl"
+
+    summary = bulk.run(source, output, llm=EchoLLM())
+    assert summary["failed"] == 1
+    assert read_results(output)[0]["error"].startswith("Image file not found")
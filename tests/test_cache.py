@@ -0,0 +1,74 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.cache import PerceptualHashCache, TTLCache, make_cache_key
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache("test", max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1 and stats["evictions"] == 1
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.cache.time.time", lambda: now[0])
+    cache = TTLCache("test", ttl_seconds=10)
+    cache.set("k", {"v": 1})
+    now[0] += 11
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    key = make_cache_key("prompt", "deployment", 0, "2020 Toyota Camry")
+    cache = TTLCache("test", persist_path=path, max_disk_entries=1)
+    cache.set("old", 0)
+    cache.set(key, {"car": {"brand": "Toyota"}})
+    cache.close()
+
+    reopened = TTLCache("test", persist_path=path)
+    assert reopened.get(key) == {"car": {"brand": "Toyota"}}
+    assert reopened.get("old") is None
+    assert reopened.stats()["disk_hits"] == 1
+
+def test_perceptual_cache_matches_near_duplicates():
+    cache = PerceptualHashCache("test", max_distance=4)
+    original = 0x0F0F_F0F0_1234_ABCD
+    cache.set(original, "SUV")
+
+    assert cache.get(original) == "SUV"
+    assert cache.get(original ^ 0b1011) == "SUV"            # 3 bits apart
+    assert cache.get(original ^ (1 << 63 | 1 << 40 | 1 << 20 | 1 << 2)) == "SUV"
+    assert cache.get(original ^ 0b11111) is None             # 5 bits apart
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["near_hits"] == 2 and stats["misses"] == 1
+
+def test_perceptual_cache_eviction_updates_index():
+    cache = PerceptualHashCache("test", max_entries=2, max_distance=2)
+    cache.set(0, "Sedan")
+    cache.set(0xFF00, "SUV")
+    cache.set(0xFF0000, "Truck")
+
+    assert cache.get(1) is None
+    assert cache.get(0xFF0001) == "Truck"
+    assert cache.stats()["evictions"] == 1
+
+def test_perceptual_cache_persists_per_namespace(tmp_path):
+    path = tmp_path / "hashes.sqlite3"
+    cache = PerceptualHashCache("test", namespace="model-a", max_entries=1, persist_path=path)
+    cache.set(0xFF, "Sedan")
+    cache.set(0xFF << 40, "Truck")
+    cache.close()
+
+    reopened = PerceptualHashCache("test", namespace="model-a", max_entries=1, persist_path=path)
+    assert reopened.get(0xFF << 40 | 1) == "Truck"           # preloaded, near duplicate
+    assert reopened.get(0xFF) == "Sedan" and reopened.stats()["disk_hits"] == 1
+    assert PerceptualHashCache("test", namespace="model-b", persist_path=path).get(0xFF) is None
@@ -0,0 +1,119 @@
+import os
+import sys
+import pytest
+from pydantic import ValidationError
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import logging
+from contextlib import contextmanager
+import src.config as config_module
+from src.config import _ConfigStore, AppConfig, LoggingConfig, setup_logging, shutdown_logging
+
+CONFIG_TEMPLATE = """
+smtp:
+  server: "smtp.example.com"
+  port: {port}
+  username: "${{TEST_SMTP_USERNAME}}"
+  password: "secret"
+llm:
+  azure_endpoint: "https://example.openai.azure.com/"
+  deployment_name: "gpt-4o-mini"
+  api_version: "2025-01-01-preview"
+  api_key: "key"
+"""
+
+def write_config(path, port, mtime_ns=None):
+    path.write_text(CONFIG_TEMPLATE.format(port=port))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_config_is_typed_cached_and_env_expanded(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEST_SMTP_USERNAME", "dealer@example.com")
+    path = tmp_path / "config.yaml"
+    write_config(path, 587)
+    store = _ConfigStore(path)
+
+    config = store.get()
+    assert isinstance(config, AppConfig)
+    assert config.smtp.username == "dealer@example.com"
+    assert config.application.max_input_length == 5000
+    assert store.get() is config
+    with pytest.raises(ValidationError):
+        config.smtp.port = 25
+
+def test_config_reloads_on_mtime_change(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.config.CONFIG_CHECK_INTERVAL", 0)
+    path = tmp_path / "config.yaml"
+    write_config(path, 587, mtime_ns=1_000_000_000)
+    store = _ConfigStore(path)
+    assert store.get().smtp.port == 587
+
+    write_config(path, 2525, mtime_ns=2_000_000_000)
+    assert store.get().smtp.port == 2525
+
+def test_invalid_edit_keeps_last_good_config(tmp_path):
+    path = tmp_path / "config.yaml"
+    write_config(path, 587)
+    store = _ConfigStore(path)
+    store.get()
+
+    path.write_text("smtp: {}\n")
+    assert store.reload().smtp.port == 587
+
+def test_unsupported_image_format_fails_at_load(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(CONFIG_TEMPLATE.format(port=587) + 'image_optimization:\n  format: "bmp"\n')
+    with pytest.raises(ValidationError, match="image_optimization.format"):
+        _ConfigStore(path).get()
+
+@contextmanager
+def bare_root_logger():
+    """Run setup_logging() on an unconfigured root logger, restoring pytest's handlers afterwards."""
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers.clear()
+    try:
+        yield root
+    finally:
+        shutdown_logging()
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+def use_logging_config(monkeypatch, tmp_path, **settings):
+    config = AppConfig.model_validate({
+        "smtp": {"server": "s", "port": 25, "username": "u", "password": "p"},
+        "llm": {"azure_endpoint": "e", "deployment_name": "d", "api_version": "v", "api_key": "k"},
+        "logging": {"directory": str(tmp_path), "console": False, **settings}
+    })
+    monkeypatch.setattr(config_module, "get_config", lambda: config)
+
+def test_logging_goes_through_queue_to_json_lines(monkeypatch, tmp_path):
+    use_logging_config(monkeypatch, tmp_path, json_lines=True)
+    with bare_root_logger() as root:
+        setup_logging()
+        assert isinstance(root.handlers[0], logging.handlers.QueueHandler)
+
+        logger = logging.getLogger("test.queue")
+        logger.info("listing %s", "A1", extra={"request_id": "r-1"})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+
+    lines = [json.loads(line) for line in (tmp_path / LoggingConfig().filename).read_text().splitlines()]
+    assert lines[0]["message"] == "listing A1" and lines[0]["request_id"] == "r-1"
+    assert lines[0]["logger"] == "test.queue" and lines[0]["level"] == "INFO"
+    assert lines[1]["message"] == "failed" and "ValueError: boom" in lines[1]["exception"]
+
+def test_log_file_rotates_by_size(monkeypatch, tmp_path):
+    use_logging_config(monkeypatch, tmp_path, max_bytes=2000, backup_count=2)
+    with bare_root_logger():
+        setup_logging()
+        for i in range(100):
+            logging.getLogger("test.rotation").info("line %d %s", i, "x" * 50)
+
+    log_files = sorted(path.name for path in tmp_path.iterdir())
+    assert log_files == ["autolister360.log", "autolister360.log.1", "autolister360.log.2"]
+    assert all(path.stat().st_size <= 2000 for path in tmp_path.iterdir())
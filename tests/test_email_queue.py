@@ -0,0 +1,88 @@
+import os
+import smtplib
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.email_queue import EmailQueue, EmailQueueWorker, PENDING, SENT, DEAD
+
+CAR_DATA = {"car": {"brand": "Toyota", "model": "Camry"}}
+
+def test_enqueue_is_idempotent_and_persistent(tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    queue = EmailQueue(path)
+    first = queue.enqueue(CAR_DATA, "buyer@example.com", (b"jpeg-bytes", "car.jpg"), idempotency_key="request-1")
+    second = queue.enqueue(CAR_DATA, "buyer@example.com", (b"jpeg-bytes", "car.jpg"), idempotency_key="request-1")
+    assert first == second
+    queue.claim()
+    queue.close()
+
+    # A job interrupted mid-send is picked up again after a restart
+    reopened = EmailQueue(path)
+    job = reopened.claim()
+    assert job["id"] == first
+    assert job["photo"] == (b"jpeg-bytes", "car.jpg")
+
+def test_worker_retries_with_backoff_then_dead_letters(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.email_queue.time.time", lambda: now[0])
+    queue = EmailQueue(tmp_path / "outbox.sqlite3", max_attempts=3, base_delay=10)
+    attempts = []
+
+    def flaky_deliver(car_data, recipient, photo):
+        attempts.append(recipient)
+        raise smtplib.SMTPServerDisconnected("down")
+
+    worker = EmailQueueWorker(queue, deliver=flaky_deliver)
+    queue.enqueue(CAR_DATA, "buyer@example.com")
+
+    assert worker.run_once()
+    assert queue.stats()[PENDING] == 1
+    assert not worker.run_once()  # not due yet
+    now[0] += 13
+    assert worker.run_once()
+    now[0] += 25
+    assert worker.run_once()
+
+    assert len(attempts) == 3
+    assert queue.stats()[DEAD] == 1
+
+def test_worker_marks_delivered_and_dead_letters_refused(tmp_path):
+    queue = EmailQueue(tmp_path / "outbox.sqlite3")
+    delivered = []
+
+    def deliver(car_data, recipient, photo):
+        if recipient.startswith("refused"):
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b"no such user")})
+        delivered.append(recipient)
+
+    worker = EmailQueueWorker(queue, deliver=deliver)
+    queue.enqueue(CAR_DATA, "buyer@example.com")
+    queue.enqueue(CAR_DATA, "refused@example.com")
+    while worker.run_once():
+        pass
+
+    assert delivered == ["buyer@example.com"]
+    assert queue.stats()[SENT] == 1 and queue.stats()[DEAD] == 1
+
+def test_resending_a_listing_is_a_new_job_and_old_jobs_are_purged(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.email_queue.time.time", lambda: now[0])
+    queue = EmailQueue(tmp_path / "outbox.sqlite3")
+    delivered = []
+    worker = EmailQueueWorker(queue, deliver=lambda car_data, recipient, photo: delivered.append(recipient),
+                              retention=86400, purge_interval=60)
+
+    first = queue.enqueue(CAR_DATA, "buyer@example.com")
+    assert worker.run_once()
+    # Sending the same listing to the same recipient again is delivered again
+    second = queue.enqueue(CAR_DATA, "buyer@example.com")
+    assert second != first
+    assert worker.run_once()
+    assert delivered == ["buyer@example.com", "buyer@example.com"]
+
+    assert worker.purge_if_due() == 0
+    now[0] += 86400 + 61
+    queue.enqueue(CAR_DATA, "later@example.com")
+    assert worker.purge_if_due() == 2
+    assert queue.stats() == {PENDING: 1, "sending": 0, SENT: 0, DEAD: 0}
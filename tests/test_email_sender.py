@@ -1,12 +1,14 @@
 import os
 import sys
 import logging
+from email import message_from_bytes
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Adjust the path to import from the src directory
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.email_sender import send_car_listing_email, format_car_details, create_email_body
+from src.email_sender import send_car_listing_email, send_bulk_car_listing_email, format_car_details, create_email_body
+from src.smtp_pool import SMTPConnectionPool
 
 load_dotenv()
 
@@ -72,5 +74,85 @@ def run_live_email_test():
     except Exception as e:
         logging.error(f"An unexpected error occurred during the live test: {e}")
 
+def test_bulk_send_renders_once_and_reports_per_recipient(smtp_server, monkeypatch):
+    host, port, sink = smtp_server
+    pool = SMTPConnectionPool(host, port, "", "", size=3, use_tls=False)
+    monkeypatch.setattr("src.email_sender.get_smtp_pool", lambda: pool)
+    monkeypatch.setattr("src.email_sender.get_smtp_config", lambda: {"username": "dealer@example.com"})
+    renders = []
+    original = create_email_body
+    monkeypatch.setattr("src.email_sender.create_email_body", lambda *a, **k: renders.append(1) or original(*a, **k))
+
+    car_data = {"car": {"brand": "Toyota", "model": "Camry", "price": {"amount": 22000.0, "currency": "USD"}}}
+    recipients = [f"buyer{i}@example.com" for i in range(10)] + ["not-an-email"]
+    report = send_bulk_car_listing_email(car_data, recipients)
+    pool.close()
+
+    assert len(renders) == 1
+    assert report["sent"] == 10 and report["failed"] == 1
+    assert report["recipients"]["not-an-email"] == "invalid address"
+    assert sorted(m.rcpt_tos[0] for m in sink.messages) == sorted(recipients[:10])
+    assert all(f"To: {m.rcpt_tos[0]}" in m.content.decode() for m in sink.messages)
+
+def test_bulk_send_bcc_chunks(smtp_server, monkeypatch):
+    host, port, sink = smtp_server
+    pool = SMTPConnectionPool(host, port, "", "", size=2, use_tls=False)
+    monkeypatch.setattr("src.email_sender.get_smtp_pool", lambda: pool)
+    monkeypatch.setattr("src.email_sender.get_smtp_config", lambda: {"username": "dealer@example.com"})
+
+    recipients = [f"buyer{i}@example.com" for i in range(7)]
+    report = send_bulk_car_listing_email({"car": {"brand": "Kia"}}, recipients, bcc_chunk_size=3)
+    pool.close()
+
+    assert report["sent"] == 7 and report["messages"] == 3
+    assert sorted(len(m.rcpt_tos) for m in sink.messages) == [1, 3, 3]
+
+def test_bulk_send_uses_crlf_line_endings(smtp_server, monkeypatch):
+    host, port, sink = smtp_server
+    pool = SMTPConnectionPool(host, port, "", "", size=1, use_tls=False)
+    monkeypatch.setattr("src.email_sender.get_smtp_pool", lambda: pool)
+    monkeypatch.setattr("src.email_sender.get_smtp_config", lambda: {"username": "dealer@example.com"})
+
+    report = send_bulk_car_listing_email({"car": {"brand": "Kia"}}, ["buyer@example.com"], photo=(b"\x89PNG fake", "car.png"))
+    pool.close()
+
+    assert report["sent"] == 1
+    raw = sink.messages[0].original_content
+    # SMTP requires CRLF; bare LFs are rejected or mangled by strict servers
+    assert raw.count(b"\r\n") > 10
+    assert raw.count(b"\n") == raw.count(b"\r\n")
+
+def test_bulk_send_rejects_header_injection(smtp_server, monkeypatch):
+    host, port, sink = smtp_server
+    pool = SMTPConnectionPool(host, port, "", "", size=1, use_tls=False)
+    monkeypatch.setattr("src.email_sender.get_smtp_pool", lambda: pool)
+    monkeypatch.setattr("src.email_sender.get_smtp_config", lambda: {"username": "dealer@example.com"})
+
+    injected = "a@b.com\r\nBcc: evil@x.com\r\nSubject: pwned"
+    recipients = [injected, "a@b.com, evil@x.com", "Buyer <buyer@example.com>"]
+    report = send_bulk_car_listing_email({"car": {"brand": "Kia"}}, recipients)
+    pool.close()
+
+    assert report["recipients"] == {
+        injected: "invalid address", "a@b.com, evil@x.com": "invalid address", "Buyer <buyer@example.com>": "sent"
+    }
+    assert [m.rcpt_tos for m in sink.messages] == [["buyer@example.com"]]
+    assert sink.messages[0].original_content.startswith(b"To: Buyer <buyer@example.com>\r\n")
+    assert not send_car_listing_email({"car": {"brand": "Kia"}}, injected)
+
+def test_in_memory_photo_is_attached(smtp_server, monkeypatch):
+    host, port, sink = smtp_server
+    pool = SMTPConnectionPool(host, port, "", "", size=1, use_tls=False)
+    monkeypatch.setattr("src.email_sender.get_smtp_pool", lambda: pool)
+    monkeypatch.setattr("src.email_sender.get_smtp_config", lambda: {"username": "dealer@example.com"})
+
+    sent = send_car_listing_email({"car": {"brand": "Kia"}}, "buyer@example.com", photo=(b"\x89PNG fake", "car.png"))
+    pool.close()
+
+    assert sent
+    message = message_from_bytes(sink.messages[0].content)
+    image = [part for part in message.walk() if part.get_content_maintype() == "image"][0]
+    assert image.get_content_type() == "image/png" and image.get_payload(decode=True) == b"\x89PNG fake"
+
 if __name__ == '__main__':
     run_live_email_test()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from PIL import Image
+from src import gradio as app
+
+def collect(generator):
+    async def run():
+        return [update async for update in generator]
+    return asyncio.run(run())
+
+def test_process_and_send_streams_progress(monkeypatch):
+    async def fake_stream(description, llm):
+        yield {"car": {"brand": "Mazda"}}
+        yield {"car": {"brand": "Mazda", "model": "CX-5"}}
+
+    sent = {}
+    async def fake_send(car_data, recipient_email, use_queue=False, photo=None):
+        sent.update(car=car_data["car"], photo=photo)
+        return True
+
+    monkeypatch.setattr(app, "initialize_llm", lambda: (object(), "ok"))
+    monkeypatch.setattr(app, "astream_text", fake_stream)
+    monkeypatch.setattr(app, "asend_car_listing_email", fake_send)
+    monkeypatch.setattr(app, "aclassify_car_image", lambda image: asyncio.sleep(0, result="SUV"))
+
+    updates = collect(app.process_and_send("Mazda CX-5", "buyer@example.com", Image.new("RGB", (32, 32))))
+    statuses = [status for status, _ in updates]
+
+    assert statuses[0] == "Extracting car details..."
+    assert "Mazda" in updates[1][1] and "CX-5" not in updates[1][1] and "CX-5" in updates[2][1]
+    assert statuses.index("Detecting body type from the photo...") < statuses.index("Sending email...")
+    assert statuses[-1] == "Email sent successfully to: buyer@example.com"
+    assert "SUV" in updates[-1][1] and sent["car"]["body_type"] == "SUV"
+    assert sent["photo"][1].startswith("car_image_")
+
+def test_process_and_send_rejects_invalid_email(monkeypatch):
+    monkeypatch.setattr(app, "initialize_llm", lambda: (object(), "ok"))
+    assert collect(app.process_and_send("Mazda", "not-an-email", None)) == [("Error: Invalid email format", "")]
+
+def test_queue_enabled_by_reload_starts_the_worker(monkeypatch):
+    async def fake_stream(description, llm):
+        yield {"car": {"brand": "Mazda"}}
+
+    async def fake_send(car_data, recipient_email, use_queue=False, photo=None):
+        return use_queue
+
+    config = app.get_config()
+    reloaded = config.model_copy(update={"email_queue": config.email_queue.model_copy(update={"enabled": True})})
+    started = []
+    monkeypatch.setattr(app, "get_config", lambda: reloaded)
+    monkeypatch.setattr(app, "start_email_queue_worker", lambda: started.append(True))
+    monkeypatch.setattr(app, "initialize_llm", lambda: (object(), "ok"))
+    monkeypatch.setattr(app, "astream_text", fake_stream)
+    monkeypatch.setattr(app, "asend_car_listing_email", fake_send)
+
+    updates = collect(app.process_and_send("Mazda", "buyer@example.com", None))
+    assert updates[-1][0] == "Email queued for delivery to: buyer@example.com"
+    assert started == [True]
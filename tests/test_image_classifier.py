@@ -0,0 +1,118 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import pytest
+from PIL import Image
+from PIL import ImageFilter
+from src.cache import PerceptualHashCache
+from src.config import ClassifierConfig
+from src.image_classifier import (
+    ClassifierBackend,
+    OnnxBackend,
+    RandomBackend,
+    dhash,
+    aclassify_car_image,
+    classify_car_image,
+    classify_car_images,
+    get_classifier_backend,
+    load_image
+)
+
+LABELS = ("Sedan", "SUV", "Truck")
+
+def write_channel_mean_model(path):
+    """Tiny ONNX model whose logits are the per-channel means of the input."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper
+    graph = helper.make_graph(
+        [
+            helper.make_node("GlobalAveragePool", ["image"], ["pooled"]),
+            helper.make_node("Flatten", ["pooled"], ["logits"])
+        ],
+        "channel_mean",
+        [helper.make_tensor_value_info("image", TensorProto.FLOAT, ["batch", 3, 32, 32])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 3])]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+    return path
+
+@pytest.fixture
+def onnx_backend(tmp_path):
+    pytest.importorskip("onnxruntime")
+    model_path = write_channel_mean_model(tmp_path / "body_type.onnx")
+    return OnnxBackend(model_path, LABELS, input_size=32, mean=(0.0, 0.0, 0.0), std=(1.0, 1.0, 1.0), batch_size=2)
+
+def test_random_backend_returns_configured_labels():
+    backend = RandomBackend(LABELS)
+    assert all(label in LABELS for label in backend.predict([Image.new("RGB", (8, 8))] * 5))
+
+def test_onnx_backend_batches_and_maps_labels(onnx_backend, tmp_path):
+    red = Image.new("RGB", (640, 480), (255, 0, 0))
+    blue = Image.new("RGB", (100, 300), (0, 0, 255))
+    green_path = tmp_path / "green.png"
+    Image.new("RGB", (50, 50), (0, 200, 0)).save(green_path)
+
+    # 3 images with batch_size=2 exercises a full and a partial batch
+    assert onnx_backend.predict([red, green_path, blue]) == ["Sedan", "SUV", "Truck"]
+
+def test_onnx_backend_loads_session_once(onnx_backend):
+    onnx_backend.warmup()
+    session = onnx_backend._session
+    onnx_backend.predict([Image.new("RGB", (10, 10), (255, 0, 0))])
+    assert onnx_backend._session is session
+
+def test_missing_model_raises_on_first_use(tmp_path):
+    pytest.importorskip("onnxruntime")
+    config = ClassifierConfig(backend="onnx", model_path=str(tmp_path / "missing.onnx"))
+    backend = get_classifier_backend(config)
+    with pytest.raises(FileNotFoundError):
+        backend.predict([Image.new("RGB", (10, 10))])
+
+def test_classify_car_image_uses_configured_backend(tmp_path):
+    image_path = tmp_path / "car.jpg"
+    Image.new("RGB", (64, 64), (10, 20, 30)).save(image_path)
+    get_classifier_backend(ClassifierConfig(backend="stub"))
+    assert classify_car_image(str(image_path)) in LABELS
+    assert asyncio.run(aclassify_car_image(str(image_path))) in LABELS
+    assert len(classify_car_images([str(image_path)] * 3)) == 3
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        get_classifier_backend(ClassifierConfig(backend="nope"))
+
+def photo(seed):
+    gradient = Image.linear_gradient("L").rotate(seed * 40)
+    noise = Image.effect_noise((256, 256), 60 + seed)
+    return Image.merge("RGB", (gradient, noise, gradient)).filter(ImageFilter.GaussianBlur(3))
+
+def test_dhash_is_stable_under_resize_and_recompression(tmp_path):
+    original = photo(1)
+    path = tmp_path / "repost.jpg"
+    original.resize((640, 640)).save(path, quality=60)
+
+    assert (dhash(original) ^ dhash(load_image(path))).bit_count() <= 4
+    assert (dhash(original) ^ dhash(photo(5))).bit_count() > 10
+
+def test_cached_predictions_skip_the_model(monkeypatch):
+    class CountingBackend(ClassifierBackend):
+        def __init__(self):
+            self.seen = 0
+
+        def predict(self, images):
+            self.seen += len(images)
+            return ["SUV"] * len(images)
+
+    backend = CountingBackend()
+    monkeypatch.setattr("src.image_classifier.get_classifier_backend", lambda: backend)
+    cache = PerceptualHashCache("test")
+    monkeypatch.setattr("src.image_classifier.get_classification_cache", lambda: cache)
+
+    assert classify_car_images([photo(1), photo(5)]) == ["SUV", "SUV"]
+    assert classify_car_image(photo(1).resize((128, 128))) == "SUV"
+    assert backend.seen == 2 and cache.stats()["hits"] == 1
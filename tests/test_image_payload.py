@@ -0,0 +1,79 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+from PIL import Image
+from src.config import ApplicationConfig, ImageOptimizationConfig
+from src.image_classifier import load_image
+from src.image_payload import encode_image, optimize_photo
+
+def test_small_image_stays_in_memory(tmp_path):
+    config = ApplicationConfig(temp_directory=str(tmp_path / "temp"))
+    payload = encode_image(Image.new("RGBA", (40, 30), (255, 0, 0, 128)), config)
+
+    assert payload.path is None and payload.filename.endswith(".jpeg")
+    assert not (tmp_path / "temp").exists()
+    data, filename = payload.as_attachment()
+    assert filename == payload.filename
+    assert Image.open(io.BytesIO(data)).format == "JPEG"
+    assert load_image(payload.source).size == (40, 30)
+
+def test_allowed_source_format_is_kept(tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+    upload = Image.open(io.BytesIO(buffer.getvalue()))
+
+    payload = encode_image(upload, ApplicationConfig(temp_directory=str(tmp_path)), ImageOptimizationConfig(format="keep"))
+    assert payload.filename.endswith(".png")
+    assert payload.read().startswith(b"\x89PNG")
+
+def test_large_image_spills_to_disk(tmp_path):
+    config = ApplicationConfig(temp_directory=str(tmp_path / "temp"), image_spill_bytes=100)
+    payload = encode_image(Image.effect_noise((64, 64), 50).convert("RGB"), config, ImageOptimizationConfig(enabled=False))
+
+    assert payload.data is None and payload.path.exists()
+    assert load_image(payload.source).size == (64, 64)
+    assert payload.read() == payload.path.read_bytes()
+    payload.cleanup()
+    assert not payload.path.exists()
+
+def jpeg_with_exif(size, orientation=1):
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").resize(size).convert("RGB").save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+def test_optimize_photo_downscales_and_strips_exif():
+    original = jpeg_with_exif((4000, 3000))
+    optimization = ImageOptimizationConfig(max_width=1000, max_height=1000, quality=70)
+
+    data, filename = optimize_photo(original, "car.png", optimization)
+    optimized = Image.open(io.BytesIO(data))
+
+    assert filename == "car.jpeg" and optimized.format == "JPEG"
+    assert optimized.size == (1000, 750)
+    assert not optimized.getexif() and len(data) < len(original)
+
+def test_optimize_photo_applies_orientation_before_stripping():
+    # Orientation 6 means the camera stored the photo rotated by 90 degrees
+    data, _ = optimize_photo(jpeg_with_exif((400, 200), orientation=6), "car.jpg", ImageOptimizationConfig())
+    assert Image.open(io.BytesIO(data)).size == (200, 400)
+
+def test_optimize_photo_webp_and_passthrough():
+    original = jpeg_with_exif((800, 600))
+    data, filename = optimize_photo(original, "car.jpg", ImageOptimizationConfig(format="webp", max_width=400))
+    assert filename == "car.webp" and Image.open(io.BytesIO(data)).size == (400, 300)
+
+    assert optimize_photo(original, "car.jpg", ImageOptimizationConfig(enabled=False)) == (original, "car.jpg")
+    assert optimize_photo(b"not an image", "car.jpg", ImageOptimizationConfig()) == (b"not an image", "car.jpg")
+
+def test_encode_image_leaves_upload_untouched(tmp_path):
+    upload = Image.new("RGB", (3200, 2400), (0, 128, 255))
+    payload = encode_image(upload, ApplicationConfig(temp_directory=str(tmp_path)), ImageOptimizationConfig())
+
+    assert upload.size == (3200, 2400)
+    assert Image.open(io.BytesIO(payload.read())).size == (1600, 1200)
@@ -0,0 +1,89 @@
+import asyncio
+import gc
+import os
+import sys
+import weakref
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from tests.fakes import FakeOpenAIServer
+from src.config import LlmConfig
+from src.llm_client import LLMClientRegistry
+from src.text_processor import aprocess_text, get_chain_stats, get_extraction_chain
+
+def llm_config(endpoint: str, **settings) -> LlmConfig:
+    return LlmConfig.model_validate({
+        "azure_endpoint": endpoint, "deployment_name": "gpt-test", "api_version": "2024-08-01-preview", "api_key": "test",
+        **settings
+    })
+
+@pytest.fixture
+def registry():
+    registry = LLMClientRegistry()
+    yield registry
+    registry.close()
+
+def test_close_releases_sync_and_async_pools(registry):
+    with FakeOpenAIServer(latency=0.0) as server:
+        llm = registry.get(llm_config(server.url))
+        assert llm.invoke("Ford Focus").content
+        listing = asyncio.run(aprocess_text("Ford Fiesta hatchback", llm))
+        assert listing["car"]["brand"] == "Ford"
+        registry.close()
+
+    assert llm.http_client.is_closed
+    assert llm.http_async_client.is_closed
+
+def test_close_from_a_running_loop_closes_async_pools_on_it(registry):
+    llm = registry.get(llm_config("https://example.openai.azure.com/"))
+
+    async def close():
+        registry.close()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return llm.http_async_client.is_closed
+
+    assert asyncio.run(close())
+    assert llm.http_client.is_closed
+
+def test_settings_change_replaces_stale_client(registry):
+    endpoint = "https://example.openai.azure.com/"
+    first = registry.get(llm_config(endpoint, api_key="old"))
+    other = registry.get(llm_config(endpoint, deployment_name="gpt-other"))
+    second = registry.get(llm_config(endpoint, api_key="new"))
+
+    assert second is not first
+    assert registry.get(llm_config(endpoint, api_key="new")) is second
+    assert registry.get(llm_config(endpoint, deployment_name="gpt-other")) is other
+    # All three share the endpoint's pool
+    assert second.http_client is first.http_client is other.http_client
+
+    # A pool no registered client uses is dropped, but not closed under requests still using it
+    registry.get(llm_config(endpoint, api_key="new", pool={"max_connections": 4}))
+    third = registry.get(llm_config(endpoint, deployment_name="gpt-other", pool={"max_connections": 4}))
+    assert third.http_client is not first.http_client
+    assert first.http_client not in registry._http_clients.values()
+    assert not first.http_client.is_closed and not first.http_async_client.is_closed
+
+def test_evicted_client_finishes_in_flight_work(registry):
+    with FakeOpenAIServer(latency=0.0) as server:
+        old = registry.get(llm_config(server.url))
+        registry.get(llm_config(server.url, pool={"max_connections": 4}))
+        # e.g. a bulk worker that picked up the client before the reload
+        assert old.invoke("Ford Focus").content
+        listing = asyncio.run(aprocess_text("Ford Ka hatchback", old))
+        assert listing["car"]["brand"] == "Ford"
+
+def test_evicted_client_is_not_kept_alive_by_its_chains(registry):
+    endpoint = "https://example.openai.azure.com/"
+    old = registry.get(llm_config(endpoint, api_key="old"))
+    get_extraction_chain(old)
+    cached = get_chain_stats()["cached"]
+    evicted = weakref.ref(old)
+    del old
+
+    get_extraction_chain(registry.get(llm_config(endpoint, api_key="new")))
+    gc.collect()
+    assert evicted() is None
+    assert get_chain_stats()["cached"] == cached
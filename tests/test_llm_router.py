@@ -0,0 +1,157 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from tests.fakes import FakeOpenAIServer
+from src.config import LlmConfig, LlmRoutingConfig
+from src.llm_client import close_llm_clients, get_llm
+from src.llm_router import CLOSED, OPEN, Deployment, LLMRouter
+from src.metrics import LLM_HEDGED_REQUESTS
+from src.text_processor import aprocess_text, get_extraction_chain
+
+@pytest.fixture(autouse=True)
+def fresh_router():
+    yield
+    close_llm_clients()
+
+def routed(deployments: dict[str, tuple[FakeOpenAIServer, float]], **routing) -> LLMRouter:
+    """Router over fake servers, given as name -> (server, weight); client retries are off so failures surface at once."""
+    first = next(iter(deployments.values()))[0]
+    llm_config = LlmConfig.model_validate({
+        "azure_endpoint": first.url, "deployment_name": "gpt-test", "api_version": "2024-08-01-preview", "api_key": "test",
+        "pool": {"max_retries": 0},
+        "deployments": [{"name": name, "azure_endpoint": server.url, "weight": weight}
+                        for name, (server, weight) in deployments.items()],
+        "routing": routing
+    })
+    router = get_llm(llm_config)
+    router._rng = random.Random(0)
+    return router
+
+def deployment(router: LLMRouter, name: str) -> Deployment:
+    return next(d for d in router.deployments if d.name == name)
+
+def test_routed_deployments_inherit_top_level_settings():
+    llm_config = LlmConfig.model_validate({
+        "azure_endpoint": "https://main.example.com", "deployment_name": "gpt-4o", "api_version": "2025-01-01-preview",
+        "api_key": "main-key", "temperature": 0.2,
+        "deployments": [{"name": "east"}, {"azure_endpoint": "https://west.example.com", "api_key": "west-key", "weight": 2}]
+    })
+    (east, east_weight, east_config), (west, west_weight, west_config) = llm_config.routed_deployments()
+
+    assert (east, east_weight, east_config.azure_endpoint, east_config.api_key) == ("east", 1.0, "https://main.example.com", "main-key")
+    assert (west, west_weight, west_config.azure_endpoint, west_config.api_key) == ("gpt-4o", 2.0, "https://west.example.com", "west-key")
+    assert west_config.temperature == 0.2 and west_config.deployments == ()
+
+def test_calls_are_balanced_by_weight():
+    with FakeOpenAIServer(latency=0.0) as heavy, FakeOpenAIServer(latency=0.0) as light:
+        router = routed({"heavy": (heavy, 3), "light": (light, 1)})
+        chain = get_extraction_chain(router)
+        for i in range(40):
+            assert chain.invoke({"description": f"Opel Astra #{i}"}).car.brand == "Opel"
+
+    assert heavy.requests + light.requests == 40
+    assert heavy.requests > light.requests > 0
+
+def test_failing_deployment_fails_over_and_opens_breaker():
+    with FakeOpenAIServer(latency=0.0, fail_status=500) as broken, FakeOpenAIServer(latency=0.0) as healthy:
+        router = routed({"broken": (broken, 10), "healthy": (healthy, 1)}, failure_threshold=2)
+        chain = get_extraction_chain(router)
+        results = [chain.invoke({"description": f"Fiat Punto #{i}"}) for i in range(8)]
+
+    assert all(result.car.brand == "Fiat" for result in results)
+    assert broken.requests == 2
+    assert healthy.requests == 8
+    assert deployment(router, "broken").breaker.state == OPEN
+
+def test_rate_limit_opens_breaker_until_retry_after():
+    with FakeOpenAIServer(latency=0.0, fail_status=429, retry_after=0.3) as limited, FakeOpenAIServer(latency=0.0) as spare:
+        router = routed({"limited": (limited, 10), "spare": (spare, 1)}, failure_threshold=5)
+        chain = get_extraction_chain(router)
+        for i in range(4):
+            assert chain.invoke({"description": f"Seat Ibiza #{i}"}).car.brand == "Seat"
+        # A single 429 is enough to stop sending calls there
+        assert limited.requests == 1
+        assert deployment(router, "limited").breaker.state == OPEN
+
+        limited.fail_status = None
+        time.sleep(0.35)
+        for i in range(4):
+            chain.invoke({"description": f"Seat Leon #{i}"})
+        assert limited.requests > 1
+        assert deployment(router, "limited").breaker.state == CLOSED
+
+def test_slow_calls_open_breaker():
+    with FakeOpenAIServer(latency=0.15) as sluggish, FakeOpenAIServer(latency=0.0) as quick:
+        router = routed({"sluggish": (sluggish, 10), "quick": (quick, 1)}, failure_threshold=2, slow_call_seconds=0.1)
+        chain = get_extraction_chain(router)
+        for i in range(6):
+            chain.invoke({"description": f"Skoda Octavia #{i}"})
+
+    assert sluggish.requests == 2
+    assert deployment(router, "sluggish").breaker.state == OPEN
+
+def test_hedged_request_returns_first_answer():
+    with FakeOpenAIServer(latency=0.6) as slow, FakeOpenAIServer(latency=0.0) as fast:
+        router = routed({"slow": (slow, 1000), "fast": (fast, 1)}, hedge=True, hedge_delay=0.05)
+        chain = get_extraction_chain(router)
+        hedge_wins = LLM_HEDGED_REQUESTS.value(winner="hedge")
+
+        start = time.perf_counter()
+        result = chain.invoke({"description": "Volvo V70 estate"})
+        assert time.perf_counter() - start < 0.5
+        assert result.car.brand == "Volvo"
+
+        start = time.perf_counter()
+        listing = asyncio.run(aprocess_text("Saab Aero with a sunroof", router))
+        assert time.perf_counter() - start < 0.5
+        assert listing["car"]["brand"] == "Saab"
+
+        assert LLM_HEDGED_REQUESTS.value(winner="hedge") - hedge_wins == 2
+        assert fast.requests == 2
+
+def test_hedge_delay_follows_observed_p95():
+    settings = LlmRoutingConfig(hedge=True, hedge_min_samples=10)
+    first, second = Deployment("a", 1, object(), settings), Deployment("b", 1, object(), settings)
+    router = LLMRouter([first, second], settings)
+
+    assert router.hedge_delay(first) is None
+    for i in range(1, 21):
+        first.succeeded(i / 100)
+    assert router.hedge_delay(first) == pytest.approx(0.20)
+    assert LLMRouter([first], settings).hedge_delay(first) is None
+
+def test_stream_fails_over_before_first_chunk():
+    with FakeOpenAIServer(latency=0.0, fail_status=503) as broken, FakeOpenAIServer(latency=0.0) as healthy:
+        router = routed({"broken": (broken, 1000), "healthy": (healthy, 1)})
+        chain = get_extraction_chain(router, method="function_calling")
+
+        async def collect():
+            return [chunk async for chunk in chain.astream({"description": "Lancia Delta hatchback"})]
+
+        chunks = asyncio.run(collect())
+
+    assert broken.requests == 1
+    assert len(chunks) > 1
+    assert chunks[-1].car.brand == "Lancia"
+
+def test_stream_is_hedged_on_first_chunk():
+    with FakeOpenAIServer(latency=0.6) as slow, FakeOpenAIServer(latency=0.0) as fast:
+        router = routed({"slow": (slow, 1000), "fast": (fast, 1)}, hedge=True, hedge_delay=0.05)
+        chain = get_extraction_chain(router, method="function_calling")
+
+        async def collect():
+            return [chunk async for chunk in chain.astream({"description": "Alfa Giulia sedan"})]
+
+        start = time.perf_counter()
+        chunks = asyncio.run(collect())
+        assert time.perf_counter() - start < 0.5
+
+    assert chunks[-1].car.brand == "Alfa"
+    assert (slow.requests, fast.requests) == (1, 1)
+    assert deployment(router, "slow").breaker.state == CLOSED
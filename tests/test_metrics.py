@@ -0,0 +1,67 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from src.cache import TTLCache
+from src.metrics import CACHE_LOOKUPS, STAGE_ERRORS, STAGE_IN_FLIGHT, STAGE_SECONDS, Counter, Gauge, Histogram, Registry, mount_metrics, stage
+
+def test_prometheus_text_format():
+    registry = Registry()
+    requests = Counter("app_requests", "Requests served.", ("route",), registry=registry)
+    in_flight = Gauge("app_in_flight", "Requests in flight.", registry=registry)
+    latency = Histogram("app_latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=registry)
+
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    in_flight.inc()
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    text = registry.render()
+    assert '# TYPE app_requests counter\napp_requests_total{route="/a\\"b"} 3' in text
+    assert "app_in_flight 1" in text
+    assert 'app_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'app_latency_seconds_bucket{le="1"} 2' in text
+    assert 'app_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "app_latency_seconds_sum 5.55" in text and "app_latency_seconds_count 3" in text
+    assert latency.count() == 3 and latency.sum() == pytest.approx(5.55)
+
+def test_labels_are_checked():
+    counter = Counter("checked", "Checked labels.", ("kind",), registry=Registry())
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+def test_stage_records_latency_errors_and_in_flight():
+    before = STAGE_SECONDS.count(stage="test_stage")
+    with stage("test_stage"):
+        assert STAGE_IN_FLIGHT.value(stage="test_stage") == 1
+    with pytest.raises(RuntimeError):
+        with stage("test_stage"):
+            raise RuntimeError("boom")
+
+    assert STAGE_SECONDS.count(stage="test_stage") == before + 2
+    assert STAGE_ERRORS.value(stage="test_stage") >= 1
+    assert STAGE_IN_FLIGHT.value(stage="test_stage") == 0
+
+def test_cache_lookups_are_counted():
+    cache = TTLCache("metrics_test")
+    cache.set("k", 1)
+    cache.get("k")
+    cache.get("missing")
+    assert CACHE_LOOKUPS.value(cache="metrics_test", result="hit") == 1
+    assert CACHE_LOOKUPS.value(cache="metrics_test", result="miss") == 1
+
+def test_metrics_endpoint():
+    fastapi = pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    app = fastapi.FastAPI()
+    mount_metrics(app, "/metrics")
+    with stage("endpoint_test"):
+        pass
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'autolister_stage_duration_seconds_count{stage="endpoint_test"} 1' in response.text
@@ -0,0 +1,35 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.rendering import render_html_details, render_text_email, render_markdown_summary
+
+CAR = {
+    "brand": "<script>alert(1)</script>",
+    "model": "Camry",
+    "motor_size_cc": 2500,
+    "tires": {"type": "Michelin", "manufactured_year": 2023},
+    "price": None,
+    "estimated_price": {"amount": 220000.0, "currency": "L.E"},
+    "notices": [{"type": "Collision", "description": "rear *bumper*"}, "needs wax"],
+}
+
+def test_all_formats_share_field_logic():
+    html = render_html_details({"car": CAR})
+    text = render_text_email({"car": CAR})
+    markdown = render_markdown_summary(CAR)
+    for output in (html, text, markdown):
+        assert "Estimated Price" in output
+        assert "220,000.00 L.E" in output
+        assert "2,500 cc" in output
+        assert "Michelin (Manufactured Year: 2023)" in output
+
+def test_values_are_escaped_per_format():
+    html = render_html_details({"car": CAR})
+    assert "<script>" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+
+    markdown = render_markdown_summary(CAR)
+    assert "rear \\*bumper\\*" in markdown
+    assert "• needs wax" in markdown
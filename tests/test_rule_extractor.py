@@ -0,0 +1,85 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.rule_extractor import extract_rules, merge_listing, partial_listing_schema
+from src.utils import CarListing
+
+def test_formulaic_description_is_fully_resolved():
+    rules = extract_rules("2020 Toyota Camry, red sedan, 2500cc, $25,000")
+
+    assert rules.values == {
+        "brand": "Toyota", "model": "Camry", "manufactured_year": 2020, "motor_size_cc": 2500, "color": "Red",
+        "body_type": "Sedan", "price": {"amount": 25000.0, "currency": "USD"}
+    }
+    assert min(rules.confidence.values()) >= 0.9
+    assert rules.coverage == 1.0
+    assert rules.is_complete(0.8, ("brand", "model", "manufactured_year", "price"))
+    assert rules.unresolved(0.8) == ("tires", "windows", "notices")
+
+def test_units_aliases_and_estimated_price():
+    rules = extract_rules("Selling my 2018 mercedes benz c200, black, 1.6L engine, worth about 900,000 L.E, new tires from 2022")
+
+    assert rules.values["brand"] == "Mercedes-Benz" and rules.values["model"] == "C200"
+    assert rules.values["motor_size_cc"] == 1600
+    assert rules.values["estimated_price"] == {"amount": 900000.0, "currency": "L.E"}
+    assert "price" not in rules.values
+    # The tire year is not mistaken for the car's
+    assert rules.values["manufactured_year"] == 2018
+    assert rules.values["tires"] == {"type": "New", "manufactured_year": 2022}
+
+def test_conflicts_and_unexplained_text_lower_confidence():
+    rules = extract_rules("2015 or 2016 Hyundai Elantra, 350k EGP, minor accident last year, tinted windows")
+
+    assert rules.confidence["manufactured_year"] < 0.8
+    assert "manufactured_year" in rules.unresolved(0.8)
+    assert rules.values["price"] == {"amount": 350000.0, "currency": "EGP"}
+    assert rules.coverage < 0.9
+    assert not rules.is_complete(0.8, ("brand",))
+
+    # A distinctive model name implies the brand; an unknown one is only a guess
+    assert extract_rules("Landcruiser 2012").values["brand"] == "Toyota"
+    guess = extract_rules("2019 Kia Stinger")
+    assert guess.values["model"] == "Stinger" and guess.confidence["model"] < 0.8
+
+def test_unexplained_damage_words_keep_the_llm_in_the_loop():
+    required = ("brand", "model", "manufactured_year", "price")
+    flooded = extract_rules("2020 Toyota Camry, red sedan, 2500cc, excellent condition, priced at $25,000, flooded")
+    rebuilt = extract_rules("BMW 320i 2018 black, 2.0L, price 1.2 million EGP, engine rebuilt")
+
+    # Nearly every word is understood, but the one that is not may be a notice
+    assert flooded.coverage > 0.9 and flooded.unexplained == ["flooded"]
+    assert rebuilt.coverage > 0.9 and rebuilt.unexplained == ["rebuilt"]
+    assert rebuilt.values["price"] == {"amount": 1200000.0, "currency": "EGP"}
+    for rules in (flooded, rebuilt):
+        assert all(unit in rules.resolved(0.8) for unit in required)
+        assert not rules.is_complete(0.8, required)
+        assert "notices" in rules.unresolved(0.8)
+
+def test_grouped_prices_stop_at_the_digits_and_keep_cents():
+    trailing_year = extract_rules("Toyota Camry red sedan 2500cc $25,000 2020")
+    assert trailing_year.values["price"] == {"amount": 25000.0, "currency": "USD"}
+    assert trailing_year.values["manufactured_year"] == 2020
+
+    assert extract_rules("Kia Rio $1,200.50").values["price"] == {"amount": 1200.5, "currency": "USD"}
+    assert extract_rules("Kia Rio EUR 12.500,00").values["price"] == {"amount": 12500.0, "currency": "EUR"}
+
+def test_merge_prefers_confident_rules_and_fills_defaults():
+    rules = extract_rules("2019 Kia Stinger, white, $30,000")
+    llm_car = {"brand": "KIA", "model": "Unknown", "manufactured_year": 2018, "windows": "Tinted",
+               "estimated_price": {"amount": 28000.0, "currency": "USD"}}
+
+    listing = merge_listing(rules, llm_car, 0.8)
+    car = listing["car"]
+    assert car["brand"] == "Kia" and car["manufactured_year"] == 2019
+    assert car["model"] == "Stinger"
+    assert car["windows"] == "Tinted"
+    assert car["price"] == {"amount": 30000.0, "currency": "USD"} and car["estimated_price"] is None
+    assert CarListing.model_validate(listing)
+
+def test_partial_schema_only_has_unresolved_fields():
+    schema = partial_listing_schema(("tires", "windows", "price"))
+    assert schema is partial_listing_schema(("tires", "windows", "price"))
+    car_schema = schema.model_json_schema()["$defs"]["PartialCar"]
+    assert set(car_schema["properties"]) == {"tires", "windows", "price", "estimated_price"}
@@ -0,0 +1,126 @@
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.smtp_pool import SMTPConnectionPool
+
+def make_message(recipient):
+    msg = EmailMessage()
+    msg['From'] = "dealer@example.com"
+    msg['To'] = recipient
+    msg['Subject'] = "Car Listing: Toyota Camry"
+    msg.set_content("2020 Toyota Camry")
+    return msg
+
+def test_sessions_are_reused_against_local_server(smtp_server):
+    host, port, sink = smtp_server
+    pool = SMTPConnectionPool(host, port, "", "", size=2, use_tls=False)
+    for i in range(5):
+        pool.send_message(make_message(f"buyer{i}@example.com"))
+    pool.close()
+
+    assert len(sink.messages) == 5
+    assert pool.stats["connects"] == 1
+    assert pool.stats["reuses"] == 4
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.drop_next = False
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        return (250, b"OK")
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        if self.drop_next:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(msg)
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+def test_transparent_reconnect_on_disconnect(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr("src.smtp_pool.smtplib.SMTP", FakeSMTP)
+    pool = SMTPConnectionPool("smtp.example.com", 587, "user", "pass", size=1)
+
+    pool.send_message(make_message("a@example.com"))
+    FakeSMTP.instances[0].drop_next = True
+    pool.send_message(make_message("b@example.com"))
+
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+    assert len(FakeSMTP.instances[1].sent) == 1
+    assert pool.stats["reconnects"] == 1
+
+def test_reconnect_opens_a_new_session_and_drops_idle_ones(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr("src.smtp_pool.smtplib.SMTP", FakeSMTP)
+    pool = SMTPConnectionPool("smtp.example.com", 587, "user", "pass", size=2)
+
+    # Two sessions end up idle in the pool
+    with pool.connection(), pool.connection():
+        pass
+    first, second = FakeSMTP.instances
+    # The server restarted, so both are dead
+    first.drop_next = second.drop_next = True
+    pool.send_message(make_message("a@example.com"))
+
+    assert len(FakeSMTP.instances) == 3
+    assert first.closed and second.closed
+    assert len(FakeSMTP.instances[2].sent) == 1
+    assert pool.stats["reconnects"] == 1
+
+def test_idle_sessions_expire(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr("src.smtp_pool.smtplib.SMTP", FakeSMTP)
+    now = [100.0]
+    monkeypatch.setattr("src.smtp_pool.time.monotonic", lambda: now[0])
+    pool = SMTPConnectionPool("smtp.example.com", 587, "user", "pass", idle_timeout=30)
+
+    pool.send_message(make_message("a@example.com"))
+    now[0] += 31
+    pool.send_message(make_message("b@example.com"))
+
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+
+class YieldingDict(dict):
+    """Dict that lets other threads run between reading and writing an entry."""
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        time.sleep(0)
+        return value
+
+def test_stats_are_exact_under_concurrent_sends(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr("src.smtp_pool.smtplib.SMTP", FakeSMTP)
+    pool = SMTPConnectionPool("smtp.example.com", 587, "user", "pass", size=4)
+    pool.stats = YieldingDict(pool.stats)
+    message = make_message("a@example.com")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: pool.send_message(message), range(500)))
+
+    assert pool.stats["connects"] + pool.stats["reuses"] == 500
+    assert pool.stats["connects"] == len(FakeSMTP.instances)
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def imported_state(module: str) -> str:
+    code = (
+        f"import logging, sys, {module}\n"
+        "heavy = [m for m in ('gradio', 'langchain_core', 'langchain_openai', 'httpx', 'onnxruntime') if m in sys.modules]\n"
+        "print(heavy, logging.getLogger().handlers)"
+    )
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+def test_library_imports_are_light_and_side_effect_free():
+    # Heavy dependencies load on first use, and logging is only configured by the entry points
+    for module in ("src.text_processor", "src.email_sender", "src.gradio", "src.bulk"):
+        assert imported_state(module) == "[] []", module
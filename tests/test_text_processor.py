@@ -0,0 +1,247 @@
+import asyncio
+import os
+import sys
+import threading
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+from src.text_processor import process_text, process_texts, aprocess_text, astream_text, get_extraction_chain, get_chain_stats, clear_chain_cache, warm_up_extraction
+from src.utils import CarListing
+from src.config import LlmConfig, get_config
+from src.llm_client import close_llm_clients, get_llm
+from tests.fakes import FakeOpenAIServer
+
+class FakeLLM:
+    """Stand-in for a chat model supporting with_structured_output()."""
+
+    def __init__(self, brand="Toyota"):
+        self.brand = brand
+        self.schema_builds = 0
+        self.calls = 0
+
+    def with_structured_output(self, schema):
+        self.schema_builds += 1
+        def respond(prompt_value):
+            self.calls += 1
+            return schema.model_validate({"car": {"brand": self.brand, "model": "Camry", "manufactured_year": 2020}})
+        return RunnableLambda(respond)
+
+def test_extraction_chain_is_built_once_per_llm():
+    clear_chain_cache()
+    llm = FakeLLM()
+    before = get_chain_stats()
+
+    first = get_extraction_chain(llm)
+    second = get_extraction_chain(llm)
+    assert first is second
+    assert llm.schema_builds == 1
+
+    stats = get_chain_stats()
+    assert stats["builds"] - before["builds"] == 1
+    assert stats["hits"] - before["hits"] == 1
+
+def test_process_text_reuses_cached_chain():
+    clear_chain_cache()
+    llm = FakeLLM()
+    for _ in range(3):
+        result = process_text("2020 Toyota Camry, red sedan", llm)
+        assert result["car"]["brand"] == "Toyota"
+    assert llm.schema_builds == 1
+    assert CarListing.model_validate(result)
+
+def test_repeat_description_is_served_from_cache():
+    llm = FakeLLM(brand="Kia")
+    first = process_text("2019 Kia Sportage, white SUV, 1600cc", llm)
+    first["car"]["body_type"] = "Coupe"
+    second = process_text("2019   Kia Sportage, white SUV, 1600cc", llm)
+
+    assert llm.calls == 1
+    assert second["car"]["brand"] == "Kia"
+    assert second["car"]["body_type"] != "Coupe"
+
+def test_process_texts_keeps_order_and_isolates_failures():
+    class FlakyLLM(FakeLLM):
+        def with_structured_output(self, schema):
+            def respond(prompt_value):
+                self.calls += 1
+                text = prompt_value.to_string()
+                if "broken" in text:
+                    raise RuntimeError("bad item")
+                brand = "BMW" if "BMW" in text else "Fiat"
+                return schema.model_validate({"car": {"brand": brand, "manufactured_year": 2018}})
+            return RunnableLambda(respond)
+
+    llm = FlakyLLM()
+    results = process_texts(
+        ["2018 BMW X5 batch", "broken listing", "", "2018 Fiat 500 batch", "2018 BMW X5 batch"],
+        llm,
+        max_concurrency=2
+    )
+
+    assert [r["car"]["brand"] for r in results] == ["BMW", "Unknown", "Unknown", "Fiat", "BMW"]
+    assert results[0] is not results[4]
+    assert llm.calls == 3
+
+def test_batch_retries_only_transient_failures(monkeypatch):
+    monkeypatch.setattr("src.text_processor._retryable_errors", lambda: (TimeoutError,))
+    monkeypatch.setattr("src.text_processor.time.sleep", lambda seconds: None)
+
+    class RateLimitedLLM(FakeLLM):
+        def with_structured_output(self, schema):
+            def respond(prompt_value):
+                self.calls += 1
+                if self.calls == 1:
+                    raise TimeoutError("429")
+                return schema.model_validate({"car": {"brand": "Seat", "manufactured_year": 2016}})
+            return RunnableLambda(respond)
+
+    llm = RateLimitedLLM()
+    results = process_texts(["2016 Seat Leon retry"], llm)
+    assert results[0]["car"]["brand"] == "Seat"
+    assert llm.calls == 2
+
+def test_aprocess_text_uses_ainvoke():
+    llm = FakeLLM(brand="Hyundai")
+    result = asyncio.run(aprocess_text("2021 Hyundai Elantra async", llm))
+    assert result["car"]["brand"] == "Hyundai"
+    assert llm.calls == 1
+
+class StreamingLLM:
+    """
+    Fake chat model whose structured output arrives in partial chunks.
+
+    Like OpenAI's, json_schema output is only parsed once complete; function
+    calling arguments are parsed as they stream in.
+    """
+
+    def __init__(self):
+        self.streams = 0
+        self.schema_builds = 0
+
+    def with_structured_output(self, schema, method=None):
+        self.schema_builds += 1
+        chunks = [
+            None,
+            {"car": {"brand": "Mazda"}},
+            {"car": {"brand": "Mazda"}},
+            {"car": {"brand": "Mazda", "model": "CX-5"}},
+            {"car": {"brand": "Mazda", "model": "CX-5", "manufactured_year": 2022}},
+        ]
+        if method != "function_calling":
+            chunks = chunks[-1:]
+        async def respond(inputs):
+            async for _ in inputs:
+                pass
+            self.streams += 1
+            for chunk in chunks:
+                yield schema.model_validate(chunk) if chunk else None
+        return RunnableGenerator(respond)
+
+def test_astream_text_yields_partial_listings():
+    llm = StreamingLLM()
+
+    async def collect(description):
+        return [listing async for listing in astream_text(description, llm)]
+
+    # Nothing here for the rule-based extractor, so every field comes from the stream
+    partials = asyncio.run(collect("Streamed listing, details to follow"))
+    assert [p["car"]["model"] for p in partials] == ["Unknown", "CX-5", "CX-5"]
+    assert len(partials[:-1]) > 1
+    assert partials[-1]["car"]["manufactured_year"] == 2022
+
+    # The final listing is cached, so a repeat yields it once without streaming
+    repeat = asyncio.run(collect("Streamed listing, details to follow"))
+    assert repeat == [partials[-1]] and llm.streams == 1
+
+def test_async_paths_keep_synchronous_work_off_the_event_loop(monkeypatch):
+    import src.text_processor as text_processor
+    threads = []
+    original_prepare, original_cache = text_processor.prepare_description, text_processor.get_extraction_cache
+    monkeypatch.setattr(text_processor, "prepare_description", lambda d: threads.append(threading.get_ident()) or original_prepare(d))
+    monkeypatch.setattr(text_processor, "get_extraction_cache", lambda: threads.append(threading.get_ident()) or original_cache())
+
+    async def run():
+        loop_thread = threading.get_ident()
+        await aprocess_text("Off-loop listing, details to follow", FakeLLM())
+        [listing async for listing in astream_text("Off-loop stream, details to follow", StreamingLLM())]
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 4 and loop_thread not in threads
+
+def test_warm_up_builds_the_chain_astream_text_uses(monkeypatch):
+    config = get_config()
+    compact = config.model_copy(update={"extraction": config.extraction.model_copy(update={"prompt_variant": "compact"})})
+    monkeypatch.setattr("src.text_processor.get_config", lambda: compact)
+    llm = StreamingLLM()
+    warm_up_extraction(llm)
+    assert llm.schema_builds == 1
+
+    async def collect(description):
+        return [listing async for listing in astream_text(description, llm)]
+
+    partials = asyncio.run(collect("Warmed listing, details to follow"))
+    assert partials[-1]["car"]["model"] == "CX-5"
+    assert llm.schema_builds == 1
+
+def test_astream_text_streams_partial_listings_from_the_api():
+    with FakeOpenAIServer(latency=0.0, stream_chunks=8) as server:
+        llm = get_llm(LlmConfig.model_validate({
+            "azure_endpoint": server.url, "deployment_name": "gpt-test", "api_version": "2024-08-01-preview", "api_key": "test"
+        }))
+
+        async def collect():
+            return [listing async for listing in astream_text("Lada Niva, details to follow", llm)]
+
+        try:
+            partials = asyncio.run(collect())
+        finally:
+            close_llm_clients()
+
+    assert server.requests == 1
+    assert partials[-1]["car"]["brand"] == "Lada" and partials[-1]["car"]["model"] == "Niva,"
+    # Several progressively fuller listings arrive before the final one
+    assert len(partials[:-1]) > 1
+    assert all(partial != partials[-1] for partial in partials[:-1])
+
+class SchemaRecordingLLM(FakeLLM):
+    """Fake chat model that records which schema fields it was asked for."""
+
+    def __init__(self):
+        super().__init__()
+        self.fields = []
+
+    def with_structured_output(self, schema, method=None):
+        car_schema = schema.model_fields["car"].annotation
+        self.fields.append(set(car_schema.model_fields))
+        def respond(prompt_value):
+            self.calls += 1
+            return schema.model_validate({"car": {"brand": "Wrong", "windows": "Tinted", "notices": [
+                {"type": "Collision", "description": "Minor accident"}]}})
+        return RunnableLambda(respond)
+
+def test_formulaic_description_skips_the_llm():
+    llm = SchemaRecordingLLM()
+    result = process_text("2020 Toyota Camry, red sedan, 2500cc, priced at $25,000", llm)
+
+    assert llm.calls == 0
+    assert result["car"]["model"] == "Camry" and result["car"]["price"]["amount"] == 25000.0
+    assert CarListing.model_validate(result)
+
+def test_llm_is_only_asked_for_unresolved_fields():
+    llm = SchemaRecordingLLM()
+    result = process_text("2020 Toyota Camry, red sedan, $25,000, minor accident, tinted windows", llm)
+
+    assert llm.calls == 1
+    assert llm.fields == [{"motor_size_cc", "tires", "windows", "notices"}]
+    assert result["car"]["brand"] == "Toyota"
+    assert result["car"]["windows"] == "Tinted" and result["car"]["notices"][0]["type"] == "Collision"
+
+def test_unexplained_words_are_left_to_the_llm_as_notices():
+    llm = SchemaRecordingLLM()
+    result = process_text("2020 Toyota Camry, red sedan, 2500cc, excellent condition, priced at $25,000, flooded", llm)
+
+    assert llm.calls == 1
+    assert "notices" in llm.fields[0]
+    assert result["car"]["brand"] == "Toyota" and result["car"]["notices"][0]["type"] == "Collision"
@@ -0,0 +1,62 @@
+import os
+import sys
+
+# Adjust the path to import from the src directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from src.metrics import REQUEST_TOKENS
+from src.templates import get_prompt_variant, register_prompt_variant, PROMPT_VARIANTS
+from src.tokens import compact_text, count_tokens, record_request_tokens, truncate_to_tokens
+from src.utils import CarListing
+
+class WordEncoding:
+    """Stand-in tiktoken encoding with one token per space-separated word."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+def test_approximate_counts_without_an_encoding():
+    assert count_tokens("") == 0
+    assert count_tokens("abcdefgh") == 2
+    assert count_tokens("abcdefghi") == 3
+
+def test_compaction_removes_repeats_and_whitespace():
+    text = "Toyota Camry 2020.  Very clean.\n\nVery clean. Call   now!"
+    assert compact_text(text) == "Toyota Camry 2020. Very clean. Call now!"
+
+def test_truncation_keeps_both_ends_within_budget(monkeypatch):
+    monkeypatch.setattr("src.tokens.get_encoding", lambda: WordEncoding())
+    words = [f"w{i}" for i in range(200)]
+    text = "2020 Toyota Camry " + " ".join(words) + " price 25000 USD"
+
+    assert truncate_to_tokens("short text", 50) == "short text"
+    truncated = truncate_to_tokens(text, 40)
+    assert count_tokens(truncated) <= 40
+    assert truncated.startswith("2020 Toyota Camry") and truncated.endswith("price 25000 USD")
+
+def test_request_tokens_are_recorded_per_part():
+    before = {part: REQUEST_TOKENS.count(part=part, variant="test") for part in ("prompt", "schema", "completion")}
+    output = CarListing.model_validate({"car": {"brand": "Kia"}})
+    record_request_tokens("test", "Extract: 2019 Kia", CarListing, output)
+
+    for part in ("prompt", "schema", "completion"):
+        assert REQUEST_TOKENS.count(part=part, variant="test") == before[part] + 1
+    # The schema is sent with every request and dwarfs a short prompt
+    assert REQUEST_TOKENS.sum(part="schema", variant="test") > REQUEST_TOKENS.sum(part="prompt", variant="test")
+
+def test_prompt_variant_registry():
+    assert "{description}" in get_prompt_variant("compact").full
+    assert count_tokens(get_prompt_variant("compact").full) < count_tokens(get_prompt_variant("default").full)
+    with pytest.raises(ValueError):
+        get_prompt_variant("missing")
+    with pytest.raises(ValueError):
+        register_prompt_variant("broken", "no placeholder")
+
+    variant = register_prompt_variant("test-variant", "Car: {description}")
+    try:
+        assert variant.partial == variant.full
+    finally:
+        PROMPT_VARIANTS.pop("test-variant")